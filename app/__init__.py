@@ -9,7 +9,6 @@ import os
 db = SQLAlchemy()
 jwt = JWTManager()
 migrate = Migrate()
-mail_cache = {}  # Temporary cache for OTP storage
 
 def create_app():
     """Application factory"""
@@ -34,6 +33,36 @@ def create_app():
     db.init_app(app)
     jwt.init_app(app)
     migrate.init_app(app, db)
+
+    from app.utils.query_counter import init_query_counter
+    init_query_counter(app)
+
+    from app.utils.response_cache import response_cache
+    response_cache.init_app(app)
+
+    from app.utils.password_hashing import init_password_hashing
+    init_password_hashing(app)
+
+    from app.utils.otp_store import otp_store
+    otp_store.init_app(app)
+
+    from app.utils.change_feed import change_feed
+    change_feed.init_app(app)
+
+    from app.utils.storage import file_storage
+    file_storage.init_app(app)
+
+    from app.utils.http_client import init_http_clients
+    init_http_clients(app)
+
+    from app.utils.mail_queue import init_mail_queue
+    init_mail_queue(app)
+
+    from app.utils.payment_reconciler import init_payment_reconciler
+    init_payment_reconciler(app)
+
+    from app.utils.image_variants import init_image_variants
+    init_image_variants(app)
     
     # Configure CORS
     origins = [o.strip() for o in app.config.get('CORS_ORIGINS', ['*']) if o.strip()]
@@ -57,12 +86,7 @@ def create_app():
     from app.routes.kyc import kyc_bp
     from app.routes.cities import cities_bp
     from app.routes.catalog import catalog_bp
-    # Register uploads blueprint only if google-cloud-storage is available
-    try:
-        from app.routes.uploads import uploads_bp
-        app.register_blueprint(uploads_bp)
-    except Exception:
-        app.logger.warning('Uploads blueprint not registered (GCS client may be missing or misconfigured)')
+    from app.routes.uploads import uploads_bp
     
     app.register_blueprint(auth_bp)
     app.register_blueprint(users_bp)
@@ -74,14 +98,13 @@ def create_app():
     app.register_blueprint(cities_bp)
     app.register_blueprint(catalog_bp)
     app.register_blueprint(feedbacks_bp)
+    app.register_blueprint(uploads_bp)
     
     
-    # Serve uploaded files
+    # Serve uploaded files (local and memory storage; GCS redirects to the bucket)
     @app.route('/uploads/<path:filepath>')
     def serve_upload(filepath):
-        from flask import send_from_directory
-        upload_dir = app.config.get('UPLOAD_DIR')
-        return send_from_directory(upload_dir, filepath, as_attachment=False)
+        return file_storage.serve(filepath)
     
     # Create tables and seed data only when explicitly enabled.
     # To enable automatic DB initialization set the environment variable AUTO_INIT_DB
@@ -7,6 +7,9 @@ from .feedback import Feedback
 from .kyc import KYCVerification
 from .city import City
 from .favorite import Favorite
+from .outbox import OutboxEmail
+from .webhook import PaymentWebhookEvent
+from .image_variant import ImageVariant
 
 __all__ = [
     'User', 'UserRole', 'Profile',
@@ -16,5 +19,8 @@ __all__ = [
     'AgencyKYC',
     'KYCVerification',
     'City',
-    'Favorite'
+    'Favorite',
+    'OutboxEmail',
+    'PaymentWebhookEvent',
+    'ImageVariant'
 ]
@@ -1,5 +1,7 @@
 from app import db
+from app.models.feedback import Feedback
 from datetime import datetime
+from sqlalchemy import func
 import uuid
 
 class Agency(db.Model):
@@ -48,3 +50,34 @@ class Agency(db.Model):
     # Metadata
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    @staticmethod
+    def adjust_stats(agency_id, vehicles=0, bookings=0, earnings=0.0):
+        """Add deltas to the agency counters with a single atomic UPDATE in the current transaction."""
+        if not agency_id:
+            return
+        values = {}
+        if vehicles:
+            values[Agency.total_vehicles] = func.coalesce(Agency.total_vehicles, 0) + vehicles
+        if bookings:
+            values[Agency.total_bookings] = func.coalesce(Agency.total_bookings, 0) + bookings
+        if earnings:
+            values[Agency.total_earnings] = func.coalesce(Agency.total_earnings, 0) + earnings
+        if not values:
+            return
+        # Counter bumps are not profile edits; keep updated_at as is
+        values[Agency.updated_at] = Agency.updated_at
+        Agency.query.filter_by(id=agency_id).update(values, synchronize_session=False)
+
+    @staticmethod
+    def refresh_rating(agency_id):
+        """Recompute average_rating from the agency's feedback in one UPDATE."""
+        if not agency_id:
+            return
+        average = db.session.query(func.avg(Feedback.rating)).filter(
+            Feedback.agency_id == agency_id
+        ).scalar_subquery()
+        Agency.query.filter_by(id=agency_id).update({
+            Agency.average_rating: func.coalesce(average, 0),
+            Agency.updated_at: Agency.updated_at,
+        }, synchronize_session=False)
@@ -1,9 +1,15 @@
 from app import db
+from app.models.agency import Agency
 from datetime import datetime
 import uuid
 
 class Booking(db.Model):
     __tablename__ = 'bookings'
+    __table_args__ = (
+        db.Index('ix_bookings_vehicle_dates_status', 'vehicle_id', 'start_date', 'end_date', 'status'),
+        db.Index('ix_bookings_agency_payment_start', 'agency_id', 'payment_status', 'start_date'),
+        db.Index('ix_bookings_customer_start', 'customer_id', 'start_date'),
+    )
     
     id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     
@@ -29,7 +35,7 @@ class Booking(db.Model):
     
     # Status
     status = db.Column(db.String(50), default='pending')  # 'pending', 'confirmed', 'active', 'completed', 'cancelled'
-    payment_status = db.Column(db.String(50), default='pending')  # 'pending', 'completed', 'refunded'
+    payment_status = db.Column(db.String(50), default='pending')  # 'pending', 'completed', 'failed', 'refund_pending', 'refunded'
     
     # Additional Details
     notes = db.Column(db.Text)
@@ -39,3 +45,10 @@ class Booking(db.Model):
     # Metadata
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def set_payment_status(self, payment_status):
+        """Change payment_status, moving the booking in or out of the agency's paid totals."""
+        delta = (payment_status == 'completed') - (self.payment_status == 'completed')
+        self.payment_status = payment_status
+        if delta:
+            Agency.adjust_stats(self.agency_id, bookings=delta, earnings=delta * (self.total_amount or 0))
@@ -5,6 +5,9 @@ import uuid
 
 class Feedback(db.Model):
     __tablename__ = 'feedbacks'
+    __table_args__ = (
+        db.Index('ix_feedbacks_agency_created', 'agency_id', 'created_at'),
+    )
 
     id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     booking_id = db.Column(db.String(36), db.ForeignKey('bookings.id'), nullable=False)
@@ -0,0 +1,31 @@
+from app import db
+from datetime import datetime
+import uuid
+
+
+class ImageVariant(db.Model):
+    """Resized, re-encoded copies of one stored image (vehicle photo or agency logo).
+
+    Keyed by the original's URL, so one row serves every VehicleImage, vehicle listing
+    column and agency that points at the same file. ``variants`` is JSON of
+    ``{size: {format: url}}``, e.g. ``{"card": {"webp": "...", "avif": "..."}}``.
+
+    status: 'pending' (waiting for next_attempt_at), 'processing' (claimed by a worker),
+    'ready', or 'failed' (gave up after max attempts; last_error says why).
+    """
+    __tablename__ = 'image_variants'
+    __table_args__ = (
+        db.Index('ix_image_variants_status_next_attempt', 'status', 'next_attempt_at'),
+    )
+
+    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    source_url = db.Column(db.String(255), unique=True, nullable=False)
+    variants = db.Column(db.Text)
+
+    status = db.Column(db.String(20), nullable=False, default='pending')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    locked_at = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    processed_at = db.Column(db.DateTime)
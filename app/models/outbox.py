@@ -0,0 +1,31 @@
+from app import db
+from datetime import datetime
+import uuid
+
+
+class OutboxEmail(db.Model):
+    """Outbound e-mail waiting to be delivered by the mail worker.
+
+    status: 'pending' (waiting for next_attempt_at), 'sending' (claimed by a worker),
+    'sent', or 'dead' (gave up after max_attempts or a permanent provider error).
+    """
+    __tablename__ = 'email_outbox'
+    __table_args__ = (
+        db.Index('ix_email_outbox_status_next_attempt', 'status', 'next_attempt_at'),
+    )
+
+    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    kind = db.Column(db.String(50), nullable=False)  # 'otp', 'activation', 'password_reset', 'feedback_request'
+    recipient = db.Column(db.String(120), nullable=False)
+    payload = db.Column(db.Text, nullable=False)  # ZeptoMail request body (JSON)
+
+    status = db.Column(db.String(20), nullable=False, default='pending')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=6)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    locked_at = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+    sent_at = db.Column(db.DateTime)
+
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -4,6 +4,9 @@ import uuid
 
 class Payment(db.Model):
     __tablename__ = 'payments'
+    __table_args__ = (
+        db.Index('ix_payments_idempotency_key', 'idempotency_key', unique=True),
+    )
 
     id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     booking_id = db.Column(db.String(36), db.ForeignKey('bookings.id'), nullable=False)
@@ -12,12 +15,14 @@ class Payment(db.Model):
     razorpay_signature = db.Column(db.String(255))
     amount = db.Column(db.Integer, nullable=False)  # stored in paise
     currency = db.Column(db.String(10), default='INR')
-    status = db.Column(db.String(50), default='created')  # created, paid, failed
+    status = db.Column(db.String(50), default='created')  # creating, created, paid, failed, expired, refund_pending
     method = db.Column(db.String(50))
     email = db.Column(db.String(120))
     contact = db.Column(db.String(30))
     notes = db.Column(db.Text)
     raw_response = db.Column(db.Text)
+    # Set while this row is the live order for a booking; see app/utils/payment_orders.py
+    idempotency_key = db.Column(db.String(100))
 
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -39,12 +39,16 @@ class User(db.Model):
     )
     
     def set_password(self, password):
-        from werkzeug.security import generate_password_hash
-        self.password_hash = generate_password_hash(password)
+        from app.utils.password_hashing import hash_password
+        self.password_hash = hash_password(password)
     
     def check_password(self, password):
-        from werkzeug.security import check_password_hash
-        return check_password_hash(self.password_hash, password)
+        from app.utils.password_hashing import verify_password
+        return verify_password(self.password_hash, password)
+    
+    def password_needs_rehash(self):
+        from app.utils.password_hashing import needs_rehash
+        return needs_rehash(self.password_hash)
 
 class Profile(db.Model):
     __tablename__ = 'profiles'
@@ -1,9 +1,14 @@
 from app import db
+from app.utils.geo import encode_geohash
 from datetime import datetime
 import uuid
 
 class Vehicle(db.Model):
     __tablename__ = 'vehicles'
+    __table_args__ = (
+        db.Index('ix_vehicles_available_created', 'is_available', 'created_at'),
+        db.Index('ix_vehicles_available_geohash', 'is_available', 'geohash'),
+    )
     
     id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     owner_id = db.Column(db.String(36), db.ForeignKey('users.id'), nullable=False)
@@ -53,6 +58,12 @@ class Vehicle(db.Model):
     location = db.Column(db.String(255))
     latitude = db.Column(db.Float)
     longitude = db.Column(db.Float)
+    geohash = db.Column(db.String(12))  # derived from latitude/longitude for radius search
+
+    # Listing cache (denormalized from VehicleImage/Agency, maintained on write)
+    primary_image_url = db.Column(db.String(255))  # '' when the vehicle has no images, NULL until computed
+    agency_name = db.Column(db.String(120))
+    agency_logo_url = db.Column(db.String(255))
     
     # Metadata
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -63,8 +74,40 @@ class Vehicle(db.Model):
     documents = db.relationship('VehicleDocument', backref='vehicle', cascade='all, delete-orphan')
     bookings = db.relationship('Booking', backref='vehicle', cascade='all, delete-orphan')
 
+    def refresh_primary_image(self, images):
+        """Recompute primary_image_url from VehicleImage rows (first primary, else first image).
+
+        A vehicle without images gets '' rather than NULL, so listings know the
+        cached value is current and do not look its images up again.
+        """
+        primary = next((img for img in images if img.is_primary), images[0] if images else None)
+        self.primary_image_url = primary.image_url if primary else ''
+
+    def refresh_geohash(self):
+        """Recompute the geohash from latitude/longitude."""
+        if self.latitude is None or self.longitude is None:
+            self.geohash = None
+        else:
+            self.geohash = encode_geohash(float(self.latitude), float(self.longitude))
+
+    def refresh_agency_summary(self, agency):
+        """Copy the agency display name and logo onto this vehicle."""
+        self.agency_name = agency.agency_name if agency else None
+        self.agency_logo_url = agency.business_photo_url if agency else None
+
+    @staticmethod
+    def sync_agency_summary(agency):
+        """Push an agency's display name and logo to all of its vehicles in one UPDATE."""
+        Vehicle.query.filter_by(agency_id=agency.id).update({
+            Vehicle.agency_name: agency.agency_name,
+            Vehicle.agency_logo_url: agency.business_photo_url,
+        }, synchronize_session=False)
+
 class VehicleImage(db.Model):
     __tablename__ = 'vehicle_images'
+    __table_args__ = (
+        db.Index('ix_vehicle_images_vehicle_primary', 'vehicle_id', 'is_primary'),
+    )
     
     id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     vehicle_id = db.Column(db.String(36), db.ForeignKey('vehicles.id'), nullable=False)
@@ -0,0 +1,30 @@
+from app import db
+from datetime import datetime
+import uuid
+
+
+class PaymentWebhookEvent(db.Model):
+    """Razorpay webhook delivery waiting to be applied by the payment reconciler.
+
+    status: 'pending' (waiting for next_attempt_at), 'processing' (claimed by a reconciler),
+    'processed' (applied or nothing to do), or 'failed' (gave up after max attempts;
+    last_error says why).
+    """
+    __tablename__ = 'payment_webhook_events'
+    __table_args__ = (
+        db.Index('ix_payment_webhook_events_status_next_attempt', 'status', 'next_attempt_at'),
+    )
+
+    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    # X-Razorpay-Event-Id; Razorpay retries deliveries with the same id
+    event_id = db.Column(db.String(100), unique=True, nullable=False)
+    event = db.Column(db.String(100), nullable=False)  # e.g. 'payment.captured', 'order.paid', 'payment.failed'
+    payload = db.Column(db.Text, nullable=False)
+
+    status = db.Column(db.String(20), nullable=False, default='pending')
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    locked_at = db.Column(db.DateTime)
+    last_error = db.Column(db.Text)
+    received_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    processed_at = db.Column(db.DateTime)
@@ -1,33 +1,28 @@
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from werkzeug.utils import secure_filename
 from app import db
 from app.models.agency import Agency
 from app.models.user import User, Profile
 from app.models.booking import Booking
 from app.models.vehicle import Vehicle
+from app.utils.image_variants import enqueue_image_variants
+from app.utils.pagination import keyset_paginate, wants_total, InvalidPagination
+from app.utils.response_cache import response_cache
+from app.utils.storage import FORM_OVERHEAD_BYTES, file_storage, limit_request_size, upload_max_bytes, validate_upload
 from datetime import datetime, timedelta
-import os
-import uuid
+from sqlalchemy import Numeric, and_, case, cast, func
 
 agencies_bp = Blueprint('agencies', __name__, url_prefix='/api/agencies')
 
 ALLOWED_EXTENSIONS = {'jpg', 'jpeg', 'png', 'webp', 'pdf'}
 
-def allowed_file(filename):
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
-
-def get_upload_folder():
-    base_upload = current_app.config.get('UPLOAD_DIR', os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'uploads'))
-    agency_folder = os.path.join(base_upload, 'agencies')
-    os.makedirs(agency_folder, exist_ok=True)
-    return agency_folder
-
 @agencies_bp.route('', methods=['GET'])
 def get_agencies():
     """Get all agencies"""
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 10, type=int)
+    cursor = request.args.get('cursor')
+    include_total = wants_total(request.args)
     city = request.args.get('city')
     
     query = Agency.query.filter_by(is_verified=True, is_active=True)
@@ -35,11 +30,23 @@ def get_agencies():
     if city:
         query = query.filter(Agency.city.ilike(f'%{city}%'))
     
-    agencies = query.paginate(page=page, per_page=per_page)
+    if cursor is not None:
+        try:
+            agencies = keyset_paginate(query, Agency.created_at, Agency.id, cursor, per_page, include_total=include_total)
+        except InvalidPagination as e:
+            return jsonify({'error': str(e)}), 400
+        pagination = agencies.to_dict(per_page)
+    else:
+        agencies = query.paginate(page=page, per_page=per_page, count=include_total)
+        pagination = {
+            'page': page,
+            'per_page': per_page,
+            'total': agencies.total,
+            'pages': agencies.pages
+        }
     
     result = []
     for agency in agencies.items:
-        user = User.query.get(agency.user_id)
         result.append({
             'id': agency.id,
             'agencyName': agency.agency_name,
@@ -56,12 +63,7 @@ def get_agencies():
     
     return jsonify({
         'agencies': result,
-        'pagination': {
-            'page': page,
-            'per_page': per_page,
-            'total': agencies.total,
-            'pages': agencies.pages
-        }
+        'pagination': pagination
     }), 200
 
 
@@ -109,6 +111,7 @@ def get_my_agency():
 
 @agencies_bp.route('/me', methods=['PUT'])
 @jwt_required()
+@limit_request_size(lambda: 2 * upload_max_bytes() + FORM_OVERHEAD_BYTES)
 def update_my_agency():
     """Update the agency profile for the authenticated user."""
     user_id = get_jwt_identity()
@@ -149,29 +152,18 @@ def update_my_agency():
         if 'longitude' in data:
             agency.longitude = data['longitude']
         
-        # Handle file uploads if multipart
+        # Handle file uploads if multipart; replaced files are deleted after the commit
+        superseded = []
         if is_multipart:
-            upload_folder = get_upload_folder()
-            
-            gst_doc = request.files.get('gstDoc')
-            if gst_doc and gst_doc.filename:
-                if not allowed_file(gst_doc.filename):
-                    return jsonify({'error': 'Invalid file type for gstDoc'}), 400
-                ext = gst_doc.filename.rsplit('.', 1)[1].lower()
-                filename = f"{user_id}_gstDoc_{uuid.uuid4().hex}.{ext}"
-                filepath = os.path.join(upload_folder, secure_filename(filename))
-                gst_doc.save(filepath)
-                agency.gst_doc_url = f"/uploads/agencies/{filename}"
-            
-            business_photo = request.files.get('businessPhoto')
-            if business_photo and business_photo.filename:
-                if not allowed_file(business_photo.filename):
-                    return jsonify({'error': 'Invalid file type for businessPhoto'}), 400
-                ext = business_photo.filename.rsplit('.', 1)[1].lower()
-                filename = f"{user_id}_businessPhoto_{uuid.uuid4().hex}.{ext}"
-                filepath = os.path.join(upload_folder, secure_filename(filename))
-                business_photo.save(filepath)
-                agency.business_photo_url = f"/uploads/agencies/{filename}"
+            for field, target in [('gstDoc', 'gst_doc_url'), ('businessPhoto', 'business_photo_url')]:
+                file = request.files.get(field)
+                if file and file.filename:
+                    ext, error = validate_upload(file, ALLOWED_EXTENSIONS, upload_max_bytes())
+                    if error:
+                        return jsonify({'error': f'{error} for {field}'}), 400
+                    url = file_storage.put(f"agencies/{user_id}/{field}", file.stream, ext, file.mimetype)
+                    superseded.append((getattr(agency, target), url))
+                    setattr(agency, target, url)
         
         # Handle bank details if provided
         bank_data = data.get('bankDetails')
@@ -183,7 +175,14 @@ def update_my_agency():
             if 'accountHolderName' in bank_data:
                 agency.bank_account_holder_name = bank_data['accountHolderName']
         
+        Vehicle.sync_agency_summary(agency)
         db.session.commit()
+        for old_url, url in superseded:
+            file_storage.delete_later(old_url, keep=(url,))
+        if any(url == agency.business_photo_url for _, url in superseded):
+            enqueue_image_variants([agency.business_photo_url])
+        # Vehicle detail embeds agency contact details
+        response_cache.invalidate('vehicles')
         
         return jsonify({'message': 'Agency profile updated successfully'}), 200
         
@@ -233,6 +232,7 @@ def get_agency(agency_id):
 
 @agencies_bp.route('', methods=['POST'])
 @jwt_required()
+@limit_request_size(lambda: 2 * upload_max_bytes() + FORM_OVERHEAD_BYTES)
 def create_agency():
     """Create agency with optional documents"""
     user_id = get_jwt_identity()
@@ -248,7 +248,6 @@ def create_agency():
         if agency_email:
             agency_email = agency_email.lower().strip()
 
-        upload_folder = get_upload_folder()
         gst_doc_url = None
         business_photo_url = None
 
@@ -256,13 +255,10 @@ def create_agency():
             for field, target in [('gstDoc', 'gst_doc_url'), ('businessPhoto', 'business_photo_url')]:
                 file = request.files.get(field)
                 if file and file.filename:
-                    if not allowed_file(file.filename):
-                        return jsonify({'error': f'Invalid file type for {field}'}), 400
-                    ext = file.filename.rsplit('.', 1)[1].lower()
-                    filename = f"{user_id}_{field}_{uuid.uuid4().hex}.{ext}"
-                    filepath = os.path.join(upload_folder, secure_filename(filename))
-                    file.save(filepath)
-                    url = f"/uploads/agencies/{filename}"
+                    ext, error = validate_upload(file, ALLOWED_EXTENSIONS, upload_max_bytes())
+                    if error:
+                        return jsonify({'error': f'{error} for {field}'}), 400
+                    url = file_storage.put(f"agencies/{user_id}/{field}", file.stream, ext, file.mimetype)
                     if target == 'gst_doc_url':
                         gst_doc_url = url
                     else:
@@ -289,6 +285,7 @@ def create_agency():
 
         db.session.add(agency)
         db.session.commit()
+        enqueue_image_variants([business_photo_url])
 
         return jsonify({
             'message': 'Agency created successfully',
@@ -341,7 +338,10 @@ def update_agency(agency_id):
             agency.bank_ifsc_code = bank_data.get('ifscCode', agency.bank_ifsc_code)
             agency.bank_account_holder_name = bank_data.get('accountHolderName', agency.bank_account_holder_name)
         
+        Vehicle.sync_agency_summary(agency)
         db.session.commit()
+        # Vehicle detail embeds agency contact details
+        response_cache.invalidate('vehicles')
         
         return jsonify({'message': 'Agency updated successfully'}), 200
         
@@ -395,54 +395,62 @@ def get_agency_earnings():
     now = datetime.utcnow()
     current_start, previous_start, previous_end = _get_range_dates(range_key, now)
 
-    # Base query: completed payments for this agency
-    base_query = Booking.query.filter_by(agency_id=agency.id, payment_status='completed')
-
-    current_bookings = base_query.filter(Booking.start_date >= current_start).all()
-    previous_bookings = base_query.filter(
-        Booking.start_date >= previous_start,
-        Booking.start_date < previous_end
-    ).all()
-
-    # Load vehicle metadata for current bookings
-    vehicle_ids = list({b.vehicle_id for b in current_bookings})
-    vehicles_map = {}
-    if vehicle_ids:
-        vehicles = Vehicle.query.filter(Vehicle.id.in_(vehicle_ids)).all()
-        vehicles_map = {v.id: v for v in vehicles}
-
-    def _safe_amount(booking: Booking) -> float:
-        return float(booking.total_amount or 0)
-
-    total_earnings = sum(_safe_amount(b) for b in current_bookings)
-    total_bookings = len(current_bookings)
+    # Aggregates over completed payments for this agency, computed in SQL. Amounts are
+    # summed as DECIMAL rounded to paise: total_amount is a single-precision FLOAT on
+    # MySQL, and SUM over it would add the float32 error that Python never saw (the
+    # driver hands back the shortest decimal form, e.g. 123.45)
+    amount = cast(func.coalesce(Booking.total_amount, 0), Numeric(14, 2))
+    completed = (Booking.agency_id == agency.id, Booking.payment_status == 'completed')
+    in_current = Booking.start_date >= current_start
+    in_previous = and_(Booking.start_date >= previous_start, Booking.start_date < previous_end)
+
+    current_sum, total_bookings, previous_sum = db.session.query(
+        func.sum(case((in_current, amount), else_=0)),
+        func.count(case((in_current, 1))),
+        func.sum(case((in_previous, amount), else_=0))
+    ).filter(*completed, Booking.start_date >= previous_start).one()
+
+    # Empty windows keep the integer 0 the per-row sums used to produce
+    total_earnings = float(current_sum) if total_bookings else 0
     average_per_booking = total_earnings / total_bookings if total_bookings else 0
 
-    previous_earnings = sum(_safe_amount(b) for b in previous_bookings)
+    previous_earnings = float(previous_sum or 0)
     if previous_earnings:
         growth_rate = ((total_earnings - previous_earnings) / previous_earnings) * 100
     else:
         growth_rate = 100.0 if total_earnings > 0 else 0.0
 
-    # Earnings by vehicle type and vehicle performance
+    # Earnings by vehicle type and vehicle performance, one row per booked vehicle.
+    # Ordered by first booking, then vehicle id: the old per-row loop left vehicles with
+    # equal earnings (and the top vehicle among them) in the database's scan order
+    vehicle_rows = db.session.query(
+        Booking.vehicle_id,
+        Vehicle.id,
+        Vehicle.make,
+        Vehicle.model,
+        Vehicle.vehicle_type,
+        func.count(Booking.id),
+        func.sum(amount)
+    ).outerjoin(Vehicle, Vehicle.id == Booking.vehicle_id).filter(
+        *completed, in_current
+    ).group_by(
+        Booking.vehicle_id, Vehicle.id, Vehicle.make, Vehicle.model, Vehicle.vehicle_type
+    ).order_by(func.min(Booking.start_date), Booking.vehicle_id).all()
+
     type_earnings = {}
     vehicle_stats = {}
-    for booking in current_bookings:
-        vehicle = vehicles_map.get(booking.vehicle_id)
-        v_type = (vehicle.vehicle_type if vehicle and vehicle.vehicle_type else 'other').lower()
-        name = f"{vehicle.make} {vehicle.model}" if vehicle else 'Unknown Vehicle'
-
-        type_earnings[v_type] = type_earnings.get(v_type, 0) + _safe_amount(booking)
-
-        if booking.vehicle_id not in vehicle_stats:
-            vehicle_stats[booking.vehicle_id] = {
-                'name': name,
-                'type': v_type,
-                'bookings': 0,
-                'earnings': 0.0,
-            }
-        vehicle_stats[booking.vehicle_id]['bookings'] += 1
-        vehicle_stats[booking.vehicle_id]['earnings'] += _safe_amount(booking)
+    for vehicle_id, found_id, make, model, vehicle_type, bookings, earnings in vehicle_rows:
+        v_type = (vehicle_type if found_id and vehicle_type else 'other').lower()
+        name = f"{make} {model}" if found_id else 'Unknown Vehicle'
+        earnings = float(earnings)
+
+        type_earnings[v_type] = type_earnings.get(v_type, 0) + earnings
+        vehicle_stats[vehicle_id] = {
+            'name': name,
+            'type': v_type,
+            'bookings': bookings,
+            'earnings': earnings,
+        }
 
     top_vehicle = None
     if vehicle_stats:
@@ -456,23 +464,30 @@ def get_agency_earnings():
           'avgPerBooking': round(top_data['earnings'] / top_data['bookings'], 2) if top_data['bookings'] else 0,
         }
 
-    # Monthly trend for last 6 months (including current), using all completed bookings
-    all_completed_bookings = base_query.all()
+    # Monthly trend for last 6 months (including current) as conditional sums in one query
     current_month_start = _month_start(now)
-    monthly_trend = []
+    months = []
     for offset in range(5, -1, -1):
         start = _add_months(current_month_start, -offset)
-        end = _add_months(start, 1)
-        month_earnings = 0.0
-        month_bookings = 0
-        for booking in all_completed_bookings:
-            if booking.start_date >= start and booking.start_date < end:
-                month_earnings += _safe_amount(booking)
-                month_bookings += 1
+        months.append((start, _add_months(start, 1)))
+
+    month_columns = []
+    for start, end in months:
+        in_month = and_(Booking.start_date >= start, Booking.start_date < end)
+        month_columns.append(func.sum(case((in_month, amount), else_=0)))
+        month_columns.append(func.count(case((in_month, 1))))
+    month_totals = db.session.query(*month_columns).filter(
+        *completed,
+        Booking.start_date >= months[0][0],
+        Booking.start_date < months[-1][1]
+    ).one()
+
+    monthly_trend = []
+    for index, (start, _) in enumerate(months):
         monthly_trend.append({
             'month': start.strftime('%b'),
-            'earnings': round(month_earnings, 2),
-            'bookings': month_bookings
+            'earnings': round(float(month_totals[2 * index] or 0), 2),
+            'bookings': month_totals[2 * index + 1]
         })
 
     # Build category distribution (2W/4W/Other)
@@ -5,9 +5,12 @@ from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
 from app import db
 from app.models.user import User, Profile, UserRoleModel
+from app.utils.google_auth import GoogleTokenError, verify_google_id_token
+from app.utils.otp_store import otp_store
+from app.utils.password_hashing import PasswordHashingBusy
+from app.utils.storage import file_storage
 from app.utils.mail import generate_otp, send_otp_email, send_activation_email, send_password_reset_email
 from datetime import datetime, timedelta
-import requests
 
 auth_bp = Blueprint('auth', __name__, url_prefix='/api/auth')
 
@@ -122,6 +125,9 @@ def register():
             }
         }), 201
         
+    except PasswordHashingBusy:
+        db.session.rollback()
+        raise
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
@@ -301,6 +307,9 @@ def reset_password():
         db.session.commit()
 
         return jsonify({'message': 'Password has been reset successfully'}), 200
+    except PasswordHashingBusy:
+        db.session.rollback()
+        raise
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
@@ -322,6 +331,15 @@ def login():
     if not user.is_active:
         return jsonify({'error': 'Account is not activated. Please verify your email.'}), 403
     
+    # Upgrade hashes made with older parameters while the plaintext is at hand
+    if user.password_needs_rehash():
+        try:
+            user.set_password(data['password'])
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.warning('Password rehash failed for user %s: %s', user.id, e)
+    
     access_token = create_access_token(identity=user.id)
     
     user_role = UserRoleModel.query.filter_by(user_id=user.id).first()
@@ -337,7 +355,7 @@ def login():
             'profile': {
                 'fullName': profile.full_name if profile else '',
                 'phone': profile.phone if profile else '',
-                'avatarUrl': profile.avatar_url if profile else None,
+                'avatarUrl': file_storage.access_url(profile.avatar_url) if profile else None,
                 'avatarLocked': profile.avatar_locked if profile else False,
             },
             'canListVehicles': bool(user.agency)
@@ -355,16 +373,15 @@ def login_with_google():
     if not id_token:
         return jsonify({'error': 'idToken is required'}), 400
 
-    # Verify token with Google's tokeninfo endpoint
+    # Verify signature, issuer, audience and expiry against Google's cached signing keys
     try:
-        resp = requests.get('https://oauth2.googleapis.com/tokeninfo', params={'id_token': id_token}, timeout=5)
-        if resp.status_code != 200:
-            return jsonify({'error': 'Invalid Google ID token'}), 401
-        info = resp.json()
+        info = verify_google_id_token(id_token)
+    except GoogleTokenError:
+        return jsonify({'error': 'Invalid Google ID token'}), 401
     except Exception as e:
         return jsonify({'error': 'Failed to verify token with Google', 'details': str(e)}), 500
 
-    # tokeninfo returns fields including 'email', 'sub' (user id), 'email_verified', 'name', 'picture'
+    # ID token claims include 'email', 'sub' (user id), 'email_verified', 'name', 'picture'
     email = (info.get('email') or '').lower().strip()
     provider_id = info.get('sub')
     email_verified = info.get('email_verified') in ('1', 'true', True)
@@ -422,7 +439,7 @@ def login_with_google():
                 'profile': {
                     'fullName': profile.full_name if profile else '',
                     'phone': profile.phone if profile else '',
-                    'avatarUrl': profile.avatar_url if profile else None,
+                    'avatarUrl': file_storage.access_url(profile.avatar_url) if profile else None,
                     'avatarLocked': profile.avatar_locked if profile else False,
                 },
                 'canListVehicles': bool(user.agency)
@@ -461,7 +478,7 @@ def get_current_user():
             'profile': {
                 'fullName': profile.full_name if profile else '',
                 'phone': profile.phone if profile else '',
-                'avatarUrl': profile.avatar_url if profile else None,
+                'avatarUrl': file_storage.access_url(profile.avatar_url) if profile else None,
                 'avatarLocked': profile.avatar_locked if profile else False,
             },
             'canListVehicles': bool(user.agency)
@@ -496,13 +513,7 @@ def send_otp_email_endpoint():
         # Generate OTP
         otp = generate_otp()
         
-        # Store OTP temporarily (in a real app, use Redis or similar)
-        # For now, we'll store in a temporary dict or cache
-        from app import mail_cache
-        mail_cache[email] = {
-            'otp': otp,
-            'expires_at': datetime.utcnow() + timedelta(minutes=10)
-        }
+        otp_store.issue(email, otp)
         
         # Send OTP email
         send_otp_email(email, otp)
@@ -528,25 +539,16 @@ def verify_email_otp():
     otp = data['otp']
     
     try:
-        from app import mail_cache
-        
-        if email not in mail_cache:
+        result = otp_store.verify(email, otp)
+        if result == 'missing':
             return jsonify({'error': 'No OTP found for this email. Please request a new OTP.'}), 400
-        
-        cached = mail_cache[email]
-        
-        # Check OTP expiry
-        if datetime.utcnow() > cached['expires_at']:
-            del mail_cache[email]
+        if result == 'expired':
             return jsonify({'error': 'OTP has expired. Please request a new OTP.'}), 400
-        
-        # Check OTP
-        if cached['otp'] != otp:
+        if result == 'locked':
+            return jsonify({'error': 'Too many invalid attempts. Please request a new OTP.'}), 429
+        if result == 'invalid':
             return jsonify({'error': 'Invalid OTP'}), 400
         
-        # Clear the OTP from cache
-        del mail_cache[email]
-        
         return jsonify({
             'message': 'Email verified successfully',
             'verified': True,
@@ -4,22 +4,30 @@ from app import db
 from app.models.booking import Booking
 from app.models.vehicle import Vehicle, VehicleImage
 from app.models.agency import Agency
-from app.models.user import User
+from app.models.user import User, Profile
 from app.models.payment import Payment
-from sqlalchemy import or_, and_
+from sqlalchemy import or_, and_, func
+from sqlalchemy.orm import aliased
 from datetime import datetime, timedelta
 import os
-import requests
 import hmac
 import hashlib
 import json
 from app.utils.mail import send_feedback_request
+from app.utils.availability import availability_index
+from app.utils.pagination import keyset_paginate, wants_total, InvalidPagination
+from app.utils.streaming import ndjson_response, stream_rows, wants_stream
+from app.utils.http_client import get_client
+from app.utils.payment_reconciler import record_webhook_event
+from app.utils.payment_orders import IdempotencyConflict, OrderInProgress, get_or_create_order, idempotency_key
 
 bookings_bp = Blueprint('bookings', __name__, url_prefix='/api/bookings')
 
 # Razorpay configuration (defaults to provided test keys; override via env vars)
 RAZORPAY_KEY_ID = os.getenv('RAZORPAY_KEY_ID', 'rzp_test_Id1p2FvmwenNvx')
 RAZORPAY_KEY_SECRET = os.getenv('RAZORPAY_KEY_SECRET', '3rlD8oSZROnayZdojYvkKtHO')
+RAZORPAY_API_URL = os.getenv('RAZORPAY_API_URL', 'https://api.razorpay.com/v1')
+RAZORPAY_WEBHOOK_SECRET = os.getenv('RAZORPAY_WEBHOOK_SECRET', '')
 
 
 def _create_razorpay_order(amount_paise: int, receipt: str, notes: dict | None = None):
@@ -31,8 +39,8 @@ def _create_razorpay_order(amount_paise: int, receipt: str, notes: dict | None =
         'notes': notes or {},
     }
     # Razorpay expects JSON so nested objects like notes remain a map
-    response = requests.post(
-        'https://api.razorpay.com/v1/orders',
+    response = get_client('razorpay').post(
+        f'{RAZORPAY_API_URL}/orders',
         auth=(RAZORPAY_KEY_ID, RAZORPAY_KEY_SECRET),
         json=payload,
     )
@@ -41,10 +49,144 @@ def _create_razorpay_order(amount_paise: int, receipt: str, notes: dict | None =
     return response.json()
 
 
+def _signature_matches(message: bytes, signature: str, secret: str) -> bool:
+    generated = hmac.new(secret.encode(), message, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(generated, signature or '')
+
+
 def _verify_signature(order_id: str, payment_id: str, signature: str) -> bool:
-    message = f"{order_id}|{payment_id}".encode()
-    generated = hmac.new(RAZORPAY_KEY_SECRET.encode(), message, hashlib.sha256).hexdigest()
-    return hmac.compare_digest(generated, signature)
+    return _signature_matches(f"{order_id}|{payment_id}".encode(), signature, RAZORPAY_KEY_SECRET)
+
+def _serialize_bookings(bookings, include_odometer=False):
+    """Serialize bookings with their vehicle and customer details.
+
+    Related rows are loaded with a fixed number of IN queries (vehicles, primary images,
+    customers joined to profiles) regardless of how many bookings are passed. The image
+    is the one flagged is_primary, or none; Vehicle.primary_image_url also falls back to
+    the first image, which listings want but bookings never showed.
+    """
+    vehicle_ids = {b.vehicle_id for b in bookings}
+    customer_ids = {b.customer_id for b in bookings}
+
+    vehicles = {}
+    if vehicle_ids:
+        vehicles = {
+            row.id: row for row in db.session.query(
+                Vehicle.id, Vehicle.make, Vehicle.model, Vehicle.vehicle_type
+            ).filter(Vehicle.id.in_(vehicle_ids)).all()
+        }
+
+    primary_images = {}
+    if vehicles:
+        for vehicle_id, image_url in db.session.query(VehicleImage.vehicle_id, VehicleImage.image_url).filter(
+            VehicleImage.vehicle_id.in_(list(vehicles)),
+            VehicleImage.is_primary.is_(True)
+        ).all():
+            primary_images.setdefault(vehicle_id, image_url)
+
+    customers = {}
+    if customer_ids:
+        customers = {
+            row.id: row for row in db.session.query(
+                User.id, User.email, Profile.id.label('profile_id'), Profile.full_name, Profile.phone
+            ).outerjoin(Profile, Profile.user_id == User.id).filter(User.id.in_(customer_ids)).all()
+        }
+
+    result = []
+    for booking in bookings:
+        vehicle = vehicles.get(booking.vehicle_id)
+        vehicle_image = primary_images.get(vehicle.id) if vehicle else None
+        result.append(_booking_dict(booking, vehicle, vehicle_image, customers.get(booking.customer_id), include_odometer))
+    return result
+
+
+def _booking_dict(booking, vehicle, vehicle_image, customer, include_odometer=False):
+    """``vehicle`` carries make/model/vehicle_type and ``customer`` email/profile_id/full_name/phone."""
+    has_profile = customer is not None and customer.profile_id is not None
+    item = {
+        'id': booking.id,
+        'vehicleId': booking.vehicle_id,
+        'vehicleName': f"{vehicle.make} {vehicle.model}" if vehicle else '',
+        'vehicleType': vehicle.vehicle_type if vehicle else None,
+        'vehicleImage': vehicle_image,
+        'customerId': booking.customer_id,
+        'agencyId': booking.agency_id,
+        'startDate': booking.start_date.isoformat(),
+        'endDate': booking.end_date.isoformat(),
+        'pickupLocation': booking.pickup_location,
+        'dropoffLocation': booking.dropoff_location,
+        'dailyRate': booking.daily_rate,
+        'numberOfDays': booking.number_of_days,
+        'subtotal': booking.subtotal,
+        'tax': booking.tax,
+        'discount': booking.discount,
+        'totalAmount': booking.total_amount,
+        'securityDeposit': booking.security_deposit,
+        'status': booking.status,
+        'paymentStatus': booking.payment_status,
+        'notes': booking.notes,
+        'customer': {
+            'id': booking.customer_id if customer else None,
+            'name': customer.full_name if has_profile else '',
+            'phone': customer.phone if has_profile else '',
+            'email': customer.email if customer else ''
+        },
+        'createdAt': booking.created_at.isoformat() if booking.created_at else None
+    }
+    if include_odometer:
+        item['odometerStart'] = booking.odometer_start
+        item['odometerEnd'] = booking.odometer_end
+    return item
+
+
+def _with_booking_relations(query):
+    """Add the vehicle/customer columns _stream_bookings needs to a bookings query.
+
+    Everything is fetched in the streamed statement itself (the primary image through a
+    correlated subquery, with the same is_primary-only rule as _serialize_bookings): MySQL
+    cannot run other queries on the connection while an unbuffered result is open.
+    """
+    # Aliased so the joins do not clash with ones the filters already added
+    vehicle = aliased(Vehicle)
+    customer = aliased(User)
+    profile = aliased(Profile)
+    primary_image = db.session.query(VehicleImage.image_url).filter(
+        VehicleImage.vehicle_id == Booking.vehicle_id,
+        VehicleImage.is_primary.is_(True)
+    ).limit(1).correlate(Booking).scalar_subquery()
+    # One profile per customer even where the table lacks the unique key on user_id,
+    # so a booking is never streamed twice
+    first_profile = db.session.query(func.min(Profile.id)).filter(
+        Profile.user_id == customer.id
+    ).correlate(customer).scalar_subquery()
+    return query.outerjoin(
+        vehicle, vehicle.id == Booking.vehicle_id
+    ).outerjoin(
+        customer, customer.id == Booking.customer_id
+    ).outerjoin(
+        profile, profile.id == first_profile
+    ).with_entities(
+        Booking,
+        vehicle.id.label('vehicle_found'),
+        vehicle.make,
+        vehicle.model,
+        vehicle.vehicle_type,
+        primary_image.label('vehicle_image'),
+        customer.id.label('customer_found'),
+        customer.email,
+        profile.id.label('profile_id'),
+        profile.full_name,
+        profile.phone
+    )
+
+
+def _stream_bookings(rows):
+    """Yield serialized bookings from a _with_booking_relations query via a server-side cursor."""
+    for row in stream_rows(rows):
+        vehicle = row if row.vehicle_found else None
+        customer = row if row.customer_found else None
+        yield _booking_dict(row.Booking, vehicle, row.vehicle_image if vehicle else None, customer)
+
 
 @bookings_bp.route('', methods=['GET'])
 @jwt_required()
@@ -57,6 +199,8 @@ def get_bookings():
     start_date = request.args.get('start_date')
     end_date = request.args.get('end_date')
     limit = request.args.get('limit', type=int)
+    cursor = request.args.get('cursor')
+    per_page = request.args.get('per_page', 50, type=int)
 
     agency = Agency.query.filter_by(user_id=user_id).first()
     agency_id = agency.id if agency else None
@@ -110,53 +254,36 @@ def get_bookings():
         except ValueError:
             return jsonify({'error': 'Invalid end_date format; use ISO-8601'}), 400
 
-    query = query.order_by(Booking.start_date.desc())
-    if limit:
-        query = query.limit(limit)
-    
-    bookings = query.all()
+    if wants_stream(request):
+        if cursor is not None:
+            return jsonify({'error': 'cursor cannot be combined with stream'}), 400
+        query = _with_booking_relations(query).order_by(Booking.start_date.desc())
+        if limit:
+            query = query.limit(limit)
+        return ndjson_response(_stream_bookings(query))
+
+    pagination = None
+    if cursor is not None:
+        # Keyset mode: ordered on (start_date, id), no OFFSET
+        try:
+            page = keyset_paginate(query, Booking.start_date, Booking.id, cursor, per_page,
+                                   include_total=wants_total(request.args))
+        except InvalidPagination as e:
+            return jsonify({'error': str(e)}), 400
+        bookings = page.items
+        pagination = page.to_dict(per_page)
+    else:
+        query = query.order_by(Booking.start_date.desc())
+        if limit:
+            query = query.limit(limit)
+        bookings = query.all()
     
-    result = []
-    for booking in bookings:
-        vehicle = Vehicle.query.get(booking.vehicle_id)
-        vehicle_image = VehicleImage.query.filter_by(
-            vehicle_id=booking.vehicle_id,
-            is_primary=True
-        ).first()
-        customer = User.query.get(booking.customer_id)
-        customer_profile = customer.profile if customer else None
-        result.append({
-            'id': booking.id,
-            'vehicleId': booking.vehicle_id,
-            'vehicleName': f"{vehicle.make} {vehicle.model}" if vehicle else '',
-            'vehicleType': vehicle.vehicle_type if vehicle else None,
-            'vehicleImage': vehicle_image.image_url if vehicle_image else None,
-            'customerId': booking.customer_id,
-            'agencyId': booking.agency_id,
-            'startDate': booking.start_date.isoformat(),
-            'endDate': booking.end_date.isoformat(),
-            'pickupLocation': booking.pickup_location,
-            'dropoffLocation': booking.dropoff_location,
-            'dailyRate': booking.daily_rate,
-            'numberOfDays': booking.number_of_days,
-            'subtotal': booking.subtotal,
-            'tax': booking.tax,
-            'discount': booking.discount,
-            'totalAmount': booking.total_amount,
-            'securityDeposit': booking.security_deposit,
-            'status': booking.status,
-            'paymentStatus': booking.payment_status,
-            'notes': booking.notes,
-            'customer': {
-                'id': customer.id if customer else None,
-                'name': customer_profile.full_name if customer_profile else '',
-                'phone': customer_profile.phone if customer_profile else '',
-                'email': customer.email if customer else ''
-            },
-            'createdAt': booking.created_at.isoformat() if booking.created_at else None
-        })
+    result = _serialize_bookings(bookings)
     
-    return jsonify({'bookings': result}), 200
+    response = {'bookings': result}
+    if pagination is not None:
+        response['pagination'] = pagination
+    return jsonify(response), 200
 
 
 @bookings_bp.route('/me', methods=['GET'])
@@ -181,49 +308,7 @@ def get_booking(booking_id):
     if booking.customer_id != user_id and (agency_id is None or booking.agency_id != agency_id):
         return jsonify({'error': 'Unauthorized'}), 403
     
-    vehicle = Vehicle.query.get(booking.vehicle_id)
-    vehicle_image = VehicleImage.query.filter_by(
-        vehicle_id=booking.vehicle_id,
-        is_primary=True
-    ).first()
-    customer = User.query.get(booking.customer_id)
-    customer_profile = customer.profile if customer else None
-    
-    return jsonify({
-        'booking': {
-            'id': booking.id,
-            'vehicleId': booking.vehicle_id,
-            'vehicleName': f"{vehicle.make} {vehicle.model}" if vehicle else '',
-            'vehicleType': vehicle.vehicle_type if vehicle else None,
-            'vehicleImage': vehicle_image.image_url if vehicle_image else None,
-            'customerId': booking.customer_id,
-            'agencyId': booking.agency_id,
-            'startDate': booking.start_date.isoformat(),
-            'endDate': booking.end_date.isoformat(),
-            'pickupLocation': booking.pickup_location,
-            'dropoffLocation': booking.dropoff_location,
-            'dailyRate': booking.daily_rate,
-            'numberOfDays': booking.number_of_days,
-            'subtotal': booking.subtotal,
-            'tax': booking.tax,
-            'discount': booking.discount,
-            'totalAmount': booking.total_amount,
-            'securityDeposit': booking.security_deposit,
-            'status': booking.status,
-            'paymentStatus': booking.payment_status,
-            'notes': booking.notes,
-            'odometerStart': booking.odometer_start,
-            'odometerEnd': booking.odometer_end,
-            'customer': {
-                'id': customer.id if customer else None,
-                'name': customer_profile.full_name if customer_profile else '',
-                'phone': customer_profile.phone if customer_profile else '',
-                'email': customer.email if customer else ''
-            },
-            'createdAt': booking.created_at.isoformat() if booking.created_at else None
-        }
-    }), 200
-
+    return jsonify({'booking': _serialize_bookings([booking], include_odometer=True)[0]}), 200
 
 @bookings_bp.route('/availability', methods=['GET'])
 @jwt_required()
@@ -335,12 +420,13 @@ def create_booking():
             total_amount=data['totalAmount'],
             security_deposit=data.get('securityDeposit', 0),
             notes=data.get('notes'),
-            status=data.get('status', 'pending'),
-            payment_status=data.get('paymentStatus', 'pending')
+            status=data.get('status', 'pending')
         )
+        booking.set_payment_status(data.get('paymentStatus', 'pending'))
 
         db.session.add(booking)
         db.session.commit()
+        availability_index.invalidate(booking.vehicle_id)
 
         return jsonify({
             'message': 'Booking created successfully',
@@ -369,6 +455,7 @@ def update_booking_status(booking_id):
     
     booking.status = data['status']
     db.session.commit()
+    availability_index.invalidate(booking.vehicle_id)
     # If booking is completed, send feedback request email to customer
     try:
         if data['status'] == 'completed':
@@ -395,8 +482,9 @@ def update_payment_status(booking_id):
     if booking.customer_id != user_id:
         return jsonify({'error': 'Unauthorized'}), 403
     
-    booking.payment_status = data['paymentStatus']
+    booking.set_payment_status(data['paymentStatus'])
     db.session.commit()
+    availability_index.invalidate(booking.vehicle_id)
     
     return jsonify({'message': 'Payment status updated'}), 200
 
@@ -415,9 +503,10 @@ def cancel_booking(booking_id):
     
     booking.status = 'cancelled'
     if booking.payment_status == 'completed':
-        booking.payment_status = 'refunded'
+        booking.set_payment_status('refunded')
     
     db.session.commit()
+    availability_index.invalidate(booking.vehicle_id)
     
     return jsonify({'message': 'Booking cancelled successfully'}), 200
 
@@ -444,42 +533,66 @@ def create_payment_order():
     if amount_paise <= 0:
         return jsonify({'error': 'Invalid booking amount'}), 400
 
+    key = idempotency_key(booking, amount_paise, request.headers.get('Idempotency-Key'))
     try:
         short_receipt = f"b_{booking.id}"[:40]
-        order_resp = _create_razorpay_order(
+        payment, order_resp = get_or_create_order(
+            booking,
             amount_paise,
-            receipt=short_receipt,
-            notes={
+            key,
+            _create_razorpay_order,
+            short_receipt,
+            {
                 'booking_id': booking.id,
                 'vehicle_id': booking.vehicle_id,
                 'customer_id': booking.customer_id,
             },
         )
 
-        # Persist payment record
-        payment = Payment(
-            booking_id=booking.id,
-            razorpay_order_id=order_resp.get('id'),
-            amount=amount_paise,
-            currency=order_resp.get('currency', 'INR'),
-            status=order_resp.get('status', 'created'),
-            notes=json.dumps(order_resp.get('notes', {})),
-            raw_response=json.dumps(order_resp),
-        )
-        db.session.add(payment)
-        booking.payment_status = 'pending'
-        db.session.commit()
+        if booking.payment_status != 'pending':
+            booking.set_payment_status('pending')
+            db.session.commit()
 
         return jsonify({
             'keyId': RAZORPAY_KEY_ID,
             'order': order_resp,
             'bookingId': booking.id,
         }), 200
+    except OrderInProgress as e:
+        db.session.rollback()
+        response = jsonify({'error': str(e)})
+        response.headers['Retry-After'] = '1'
+        return response, 409
+    except IdempotencyConflict as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 409
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
 
+@bookings_bp.route('/payment/webhook', methods=['POST'])
+def payment_webhook():
+    """Store a signed Razorpay webhook event; the payment reconciler applies it."""
+    if not RAZORPAY_WEBHOOK_SECRET:
+        return jsonify({'error': 'Webhook secret not configured'}), 503
+
+    body = request.get_data()
+    if not _signature_matches(body, request.headers.get('X-Razorpay-Signature', ''), RAZORPAY_WEBHOOK_SECRET):
+        return jsonify({'error': 'Invalid webhook signature'}), 400
+
+    try:
+        event = json.loads(body).get('event')
+    except (ValueError, AttributeError):
+        return jsonify({'error': 'Invalid webhook payload'}), 400
+    if not event:
+        return jsonify({'error': 'Invalid webhook payload'}), 400
+
+    event_id = request.headers.get('X-Razorpay-Event-Id') or hashlib.sha256(body).hexdigest()
+    stored = record_webhook_event(event_id, event, body.decode('utf-8'))
+    return jsonify({'received': True, 'duplicate': not stored}), 200
+
+
 @bookings_bp.route('/payment/verify', methods=['POST'])
 @jwt_required()
 def verify_payment():
@@ -522,10 +635,11 @@ def verify_payment():
     payment.contact = data.get('contact')
     payment.method = data.get('method')
 
-    booking.payment_status = 'completed'
+    booking.set_payment_status('completed')
     booking.status = 'confirmed'
 
     db.session.commit()
+    availability_index.invalidate(booking.vehicle_id)
 
     return jsonify({'message': 'Payment verified successfully'}), 200
 
@@ -569,9 +683,10 @@ def fail_payment():
     payment.contact = data.get('contact')
     payment.method = data.get('method')
 
-    booking.payment_status = 'failed'
+    booking.set_payment_status('failed')
     booking.status = 'cancelled'
 
     db.session.commit()
+    availability_index.invalidate(booking.vehicle_id)
 
     return jsonify({'message': 'Payment marked as failed; booking cancelled'}), 200
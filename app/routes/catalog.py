@@ -1,11 +1,13 @@
 from flask import Blueprint, request, jsonify
 from app.models.catalog import CatalogBrand, CatalogModel
 from app import db
+from app.utils.response_cache import cached_response
 
 catalog_bp = Blueprint('catalog', __name__, url_prefix='/api/catalog')
 
 
 @catalog_bp.route('/brands', methods=['GET'])
+@cached_response('catalog', ttl=3600)
 def list_brands():
     vehicle_type = request.args.get('vehicle_type')
     query = CatalogBrand.query
@@ -18,6 +20,7 @@ def list_brands():
 
 
 @catalog_bp.route('/models', methods=['GET'])
+@cached_response('catalog', ttl=3600)
 def list_models():
     brand_id = request.args.get('brand_id')
     if not brand_id:
@@ -29,6 +32,7 @@ def list_models():
 
 
 @catalog_bp.route('/brands/<string:brand_id>/models', methods=['GET'])
+@cached_response('catalog', ttl=3600)
 def list_models_for_brand(brand_id: str):
     models = CatalogModel.query.filter_by(brand_id=brand_id).order_by(CatalogModel.name.asc()).all()
     result = [{'id': m.id, 'name': m.name} for m in models]
@@ -1,10 +1,12 @@
 from flask import Blueprint, jsonify, request
 from app.models import City
+from app.utils.response_cache import cached_response
 
 cities_bp = Blueprint('cities', __name__, url_prefix='/api/cities')
 
 
 @cities_bp.route('', methods=['GET'])
+@cached_response('cities', ttl=3600)
 def list_cities():
     """Return all cities or filter by a search query."""
     search_term = request.args.get('q', type=str)
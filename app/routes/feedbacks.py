@@ -3,6 +3,8 @@ from flask_jwt_extended import jwt_required, get_jwt_identity
 from app import db
 from app.models.feedback import Feedback
 from app.models.booking import Booking
+from app.models.agency import Agency
+from app.utils.streaming import ndjson_response, stream_rows, wants_stream
 
 feedbacks_bp = Blueprint('feedbacks', __name__, url_prefix='/api/feedbacks')
 
@@ -42,6 +44,8 @@ def create_feedback():
             comment=comment
         )
         db.session.add(fb)
+        db.session.flush()
+        Agency.refresh_rating(fb.agency_id)
         db.session.commit()
         return jsonify({'message': 'Feedback submitted', 'feedback': fb.to_dict()}), 201
     except Exception as e:
@@ -51,7 +55,8 @@ def create_feedback():
 
 @feedbacks_bp.route('', methods=['GET'])
 def list_feedbacks():
-    """List feedbacks with optional filters: ?agency_id=&customer_id=&booking_id="""
+    """List feedbacks with optional filters: ?agency_id=&customer_id=&booking_id=
+    Pass stream=1 (or Accept: application/x-ndjson) for one feedback per line."""
     agency_id = request.args.get('agency_id')
     customer_id = request.args.get('customer_id')
     booking_id = request.args.get('booking_id')
@@ -64,5 +69,9 @@ def list_feedbacks():
     if booking_id:
         query = query.filter_by(booking_id=booking_id)
 
-    feedbacks = query.order_by(Feedback.created_at.desc()).all()
+    query = query.order_by(Feedback.created_at.desc())
+    if wants_stream(request):
+        return ndjson_response(f.to_dict() for f in stream_rows(query))
+
+    feedbacks = query.all()
     return jsonify({'feedbacks': [f.to_dict() for f in feedbacks]}), 200
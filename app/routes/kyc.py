@@ -1,32 +1,16 @@
 from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from werkzeug.utils import secure_filename
-import os
-import uuid
-import base64
 from datetime import datetime, date
 from app import db
 from app.models.kyc import KYCVerification
 from app.models.user import Profile
+from app.utils.storage import FORM_OVERHEAD_BYTES, file_storage, limit_request_size, validate_upload
 
 kyc_bp = Blueprint('kyc', __name__, url_prefix='/api/kyc')
 
 ALLOWED_EXTENSIONS = {'jpg', 'jpeg', 'png', 'webp', 'pdf'}
 MAX_FILE_SIZE = 5 * 1024 * 1024  # 5MB
 
-def allowed_file(filename):
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
-
-def get_upload_folder():
-    base_upload = current_app.config.get('UPLOAD_DIR', os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'uploads'))
-    kyc_folder = os.path.join(base_upload, 'kyc')
-    return kyc_folder
-
-def ensure_upload_folder():
-    folder = get_upload_folder()
-    os.makedirs(folder, exist_ok=True)
-    return folder
-
 
 def _parse_iso_date(value, field_name: str):
     """Parse ISO-8601 date strings to date objects for DB storage."""
@@ -43,12 +27,91 @@ def _parse_iso_date(value, field_name: str):
             raise ValueError(f"{field_name} must be a valid ISO-8601 date (YYYY-MM-DD)")
     raise ValueError(f"{field_name} must be a valid date string")
 
+def record_kyc_document(user_id, doc_type, document_url):
+    """Store ``document_url`` as the user's ``doc_type`` document and return the upload response."""
+    # Get or create KYC record
+    kyc = KYCVerification.query.filter_by(user_id=user_id).first()
+    if not kyc:
+        kyc = KYCVerification(user_id=user_id)
+        db.session.add(kyc)
+        db.session.flush()
+    
+    # If uploading Aadhaar and it's a fresh start (no Aadhaar URL exists yet),
+    # clear DL and Selfie from previous session to start fresh
+    superseded = []
+    if doc_type == 'aadhaar' and not kyc.aadhaar_document_url:
+        current_app.logger.debug('KYC: fresh upload session for user %s, clearing old DL and selfie', user_id)
+        superseded += [kyc.dl_document_url, kyc.selfie_document_url]
+        
+        # Clear the URLs from database
+        kyc.dl_document_url = None
+        kyc.selfie_document_url = None
+        kyc.documents_uploaded = False
+    
+    # Replace the document URL; the old file is deleted once this is committed
+    if doc_type == 'aadhaar':
+        superseded.append(kyc.aadhaar_document_url)
+        kyc.aadhaar_document_url = document_url
+    elif doc_type == 'dl':
+        superseded.append(kyc.dl_document_url)
+        kyc.dl_document_url = document_url
+    elif doc_type == 'selfie':
+        superseded.append(kyc.selfie_document_url)
+        kyc.selfie_document_url = document_url
+        # Also update profile avatar
+        profile = Profile.query.filter_by(user_id=user_id).first()
+        if not profile:
+            profile = Profile(user_id=user_id)
+            db.session.add(profile)
+        profile.avatar_url = document_url
+        profile.avatar_locked = True
+    
+    # Commit first to ensure the record is saved
+    db.session.commit()
+    for old_url in superseded:
+        file_storage.delete_later(old_url, keep=(document_url,))
+    
+    # Refresh from database to get latest values
+    db.session.refresh(kyc)
+    
+    # Check if all documents are uploaded - must have all 3 non-empty URLs
+    # Each URL must be a non-empty string
+    has_aadhaar = kyc.aadhaar_document_url is not None and str(kyc.aadhaar_document_url).strip() != ''
+    has_dl = kyc.dl_document_url is not None and str(kyc.dl_document_url).strip() != ''
+    has_selfie = kyc.selfie_document_url is not None and str(kyc.selfie_document_url).strip() != ''
+    
+    # All uploaded only if ALL 3 are present
+    all_uploaded = has_aadhaar and has_dl and has_selfie
+    
+    # Update the documents_uploaded flag
+    kyc.documents_uploaded = all_uploaded
+    db.session.commit()
+    
+    current_app.logger.debug(
+        'KYC: user %s stored %s (aadhaar=%s, dl=%s, selfie=%s)', user_id, doc_type, has_aadhaar, has_dl, has_selfie
+    )
+    
+    access_url = file_storage.access_url
+    return jsonify({
+        'message': 'File uploaded successfully',
+        'documentUrl': access_url(document_url),
+        'docType': doc_type,
+        'documentsUploaded': all_uploaded,
+        'verificationStatus': kyc.verification_status,
+        'progress': {
+            'aadhaar': has_aadhaar,
+            'dl': has_dl,
+            'selfie': has_selfie
+        }
+    }), 200
+
+
 @kyc_bp.route('/upload', methods=['POST'])
 @jwt_required()
+@limit_request_size(MAX_FILE_SIZE + FORM_OVERHEAD_BYTES)
 def upload_kyc_document():
     """Upload KYC document (Aadhaar, DL, or Selfie)"""
     user_id = get_jwt_identity()
-    ensure_upload_folder()
     
     if 'file' not in request.files:
         return jsonify({'error': 'No file provided'}), 400
@@ -62,139 +125,13 @@ def upload_kyc_document():
     if file.filename == '':
         return jsonify({'error': 'No file selected'}), 400
     
-    if not allowed_file(file.filename):
-        return jsonify({'error': 'File type not allowed'}), 400
-    
-    if len(file.read()) > MAX_FILE_SIZE:
-        file.seek(0)
-        return jsonify({'error': 'File size exceeds limit'}), 400
-    
-    file.seek(0)
+    ext, error = validate_upload(file, ALLOWED_EXTENSIONS, MAX_FILE_SIZE)
+    if error:
+        return jsonify({'error': error}), 400
     
     try:
-        upload_folder = ensure_upload_folder()
-        # Create unique filename
-        filename = f"{user_id}_{doc_type}_{uuid.uuid4().hex}.{file.filename.rsplit('.', 1)[1].lower()}"
-        filepath = os.path.join(upload_folder, filename)
-        
-        # Save file
-        file.save(filepath)
-        
-        # Get or create KYC record
-        kyc = KYCVerification.query.filter_by(user_id=user_id).first()
-        if not kyc:
-            kyc = KYCVerification(user_id=user_id)
-            db.session.add(kyc)
-            db.session.flush()
-        
-        # If uploading Aadhaar and it's a fresh start (no Aadhaar URL exists yet),
-        # clear DL and Selfie from previous session to start fresh
-        if doc_type == 'aadhaar' and not kyc.aadhaar_document_url:
-            print(f"[KYC] Fresh upload session detected, clearing old DL and Selfie")
-            # Delete old DL file
-            if kyc.dl_document_url:
-                try:
-                    old_dl_filename = kyc.dl_document_url.split('/')[-1]
-                    old_dl_filepath = os.path.join(ensure_upload_folder(), old_dl_filename)
-                    if os.path.exists(old_dl_filepath):
-                        os.remove(old_dl_filepath)
-                        print(f"[KYC] Deleted old DL file: {old_dl_filename}")
-                except Exception as e:
-                    print(f"[KYC] Error deleting old DL file: {str(e)}")
-            
-            # Delete old Selfie file
-            if kyc.selfie_document_url:
-                try:
-                    old_selfie_filename = kyc.selfie_document_url.split('/')[-1]
-                    old_selfie_filepath = os.path.join(ensure_upload_folder(), old_selfie_filename)
-                    if os.path.exists(old_selfie_filepath):
-                        os.remove(old_selfie_filepath)
-                        print(f"[KYC] Deleted old Selfie file: {old_selfie_filename}")
-                except Exception as e:
-                    print(f"[KYC] Error deleting old Selfie file: {str(e)}")
-            
-            # Clear the URLs from database
-            kyc.dl_document_url = None
-            kyc.selfie_document_url = None
-            kyc.documents_uploaded = False
-        
-        # Update the appropriate document URL
-        document_url = f"/uploads/kyc/{filename}"
-        
-        # Clear old document and file before updating with new one
-        old_url = None
-        if doc_type == 'aadhaar':
-            old_url = kyc.aadhaar_document_url
-            kyc.aadhaar_document_url = document_url
-        elif doc_type == 'dl':
-            old_url = kyc.dl_document_url
-            kyc.dl_document_url = document_url
-        elif doc_type == 'selfie':
-            old_url = kyc.selfie_document_url
-            kyc.selfie_document_url = document_url
-            # Also update profile avatar
-            profile = Profile.query.filter_by(user_id=user_id).first()
-            if not profile:
-                profile = Profile(user_id=user_id)
-                db.session.add(profile)
-            profile.avatar_url = document_url
-            profile.avatar_locked = True
-        
-        # Delete old file if exists
-        if old_url:
-            try:
-                old_filename = old_url.split('/')[-1]
-                old_filepath = os.path.join(ensure_upload_folder(), old_filename)
-                if os.path.exists(old_filepath):
-                    os.remove(old_filepath)
-                    print(f"[KYC] Deleted old {doc_type} file: {old_filename}")
-            except Exception as e:
-                print(f"[KYC] Error deleting old file: {str(e)}")
-        
-        # Commit first to ensure the record is saved
-        db.session.commit()
-        
-        # Refresh from database to get latest values
-        db.session.refresh(kyc)
-        
-        # Debug: Print raw values
-        print(f"[KYC Raw Values] Aadhaar: {repr(kyc.aadhaar_document_url)}, DL: {repr(kyc.dl_document_url)}, Selfie: {repr(kyc.selfie_document_url)}")
-        
-        # Check if all documents are uploaded - must have all 3 non-empty URLs
-        # Each URL must be a non-empty string
-        has_aadhaar = kyc.aadhaar_document_url is not None and str(kyc.aadhaar_document_url).strip() != ''
-        has_dl = kyc.dl_document_url is not None and str(kyc.dl_document_url).strip() != ''
-        has_selfie = kyc.selfie_document_url is not None and str(kyc.selfie_document_url).strip() != ''
-        
-        print(f"[KYC Boolean Checks] Aadhaar: {has_aadhaar}, DL: {has_dl}, Selfie: {has_selfie}")
-        
-        # All uploaded only if ALL 3 are present
-        all_uploaded = has_aadhaar and has_dl and has_selfie
-        
-        # Update the documents_uploaded flag
-        kyc.documents_uploaded = all_uploaded
-        db.session.commit()
-        
-        print(f"[KYC Upload Debug] User: {user_id}, DocType: {doc_type}, AllUploaded: {all_uploaded}")
-        print(f"[KYC Progress] Aadhaar: {has_aadhaar}, DL: {has_dl}, Selfie: {has_selfie}")
-        
-        return jsonify({
-            'message': 'File uploaded successfully',
-            'documentUrl': document_url,
-            'docType': doc_type,
-            'documentsUploaded': all_uploaded,
-            'verificationStatus': kyc.verification_status,
-            'progress': {
-                'aadhaar': has_aadhaar,
-                'dl': has_dl,
-                'selfie': has_selfie
-            },
-            'debug': {
-                'aadhaarUrl': kyc.aadhaar_document_url,
-                'dlUrl': kyc.dl_document_url,
-                'selfieUrl': kyc.selfie_document_url
-            }
-        }), 200
+        document_url = file_storage.put(f"kyc/{user_id}/{doc_type}", file.stream, ext, file.mimetype)
+        return record_kyc_document(user_id, doc_type, document_url)
         
     except Exception as e:
         import traceback
@@ -228,6 +165,8 @@ def get_kyc_status():
             }
         }), 200
     
+    # Stored URLs of private documents are swapped for short-lived signed ones
+    access_url = file_storage.access_url
     return jsonify({
         'kyc': {
             'id': kyc.id,
@@ -241,16 +180,16 @@ def get_kyc_status():
             'panVerified': kyc.pan_verified,
             'addressProofType': kyc.address_proof_type,
             'addressVerified': kyc.address_verified,
-            'aadhaarDocumentUrl': kyc.aadhaar_document_url,
-            'dlDocumentUrl': kyc.dl_document_url,
-            'selfieUrl': kyc.selfie_document_url,
+            'aadhaarDocumentUrl': access_url(kyc.aadhaar_document_url),
+            'dlDocumentUrl': access_url(kyc.dl_document_url),
+            'selfieUrl': access_url(kyc.selfie_document_url),
             'verificationStatus': kyc.verification_status,
             'rejectionReason': kyc.rejection_reason,
             'documentsUploaded': kyc.documents_uploaded,
             'debug': {
-                'aadhaarUrl': kyc.aadhaar_document_url,
-                'dlUrl': kyc.dl_document_url,
-                'selfieUrl': kyc.selfie_document_url,
+                'aadhaarUrl': access_url(kyc.aadhaar_document_url),
+                'dlUrl': access_url(kyc.dl_document_url),
+                'selfieUrl': access_url(kyc.selfie_document_url),
                 'rawAadhaar': repr(kyc.aadhaar_document_url),
                 'rawDl': repr(kyc.dl_document_url),
                 'rawSelfie': repr(kyc.selfie_document_url)
@@ -1,70 +1,226 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from werkzeug.utils import secure_filename
-import os
+from datetime import datetime
+import re
 import uuid
 
-# Attempt to import GCS client; if missing, defer error until runtime and allow app to start.
-try:
-    from google.cloud import storage  # type: ignore
-    _gcs_available = True
-except Exception as _e:
-    storage = None
-    _gcs_available = False
+from app import db
+from app.models.agency import Agency
+from app.models.vehicle import Vehicle, VehicleImage
+from app.routes.kyc import ALLOWED_EXTENSIONS as KYC_EXTENSIONS, MAX_FILE_SIZE as KYC_MAX_FILE_SIZE, record_kyc_document
+from app.utils.gcs import GCS_BUCKET, gcs_available, generate_upload_url, get_object_info, delete_object
+from app.utils.image_variants import enqueue_image_variants
+from app.utils.response_cache import response_cache
+from app.utils.storage import CONTENT_TYPES, MAGIC_CHECKS, file_storage, upload_max_bytes, validate_upload
+from app.utils.vehicle_search import vehicle_search_index
 
 uploads_bp = Blueprint('uploads', __name__, url_prefix='/api/uploads')
 
 ALLOWED_EXTENSIONS = {'jpg', 'jpeg', 'png', 'webp', 'pdf', 'avif'}
 
-GCS_BUCKET = os.getenv('GCS_BUCKET')
-GCS_SERVICE_ACCOUNT_FILE = os.getenv('GCS_SERVICE_ACCOUNT_FILE', os.path.join(os.path.dirname(os.path.dirname(__file__)), 'leafy-guide-474311-u3-0328c0e70b35.json'))
+# docType -> (bucket folder, allowed extensions, max bytes; None means UPLOAD_MAX_MB)
+SIGNED_UPLOAD_TYPES = {
+    'aadhaar': ('kyc', KYC_EXTENSIONS, KYC_MAX_FILE_SIZE),
+    'dl': ('kyc', KYC_EXTENSIONS, KYC_MAX_FILE_SIZE),
+    'selfie': ('kyc', KYC_EXTENSIONS, KYC_MAX_FILE_SIZE),
+    'gstDoc': ('agencies', {'jpg', 'jpeg', 'png', 'webp', 'pdf'}, None),
+    'businessPhoto': ('agencies', {'jpg', 'jpeg', 'png', 'webp'}, None),
+    'vehicleImage': ('vehicles', {'jpg', 'jpeg', 'png', 'webp', 'avif'}, None),
+}
 
-def allowed_file(filename):
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+def _storage_error():
+    if file_storage.backend.name != 'gcs':
+        return jsonify({'error': 'Direct uploads need STORAGE_BACKEND=gcs'}), 400
+    if not gcs_available:
+        return jsonify({'error': 'GCS client library not installed. Run the app with the project virtualenv or install google-cloud-storage.'}), 500
+    if not GCS_BUCKET:
+        return jsonify({'error': 'GCS_BUCKET is not configured'}), 500
+    return None
+
+def _max_bytes(limit):
+    return limit or upload_max_bytes()
 
 @uploads_bp.route('', methods=['POST'])
 @jwt_required()
 def upload_files():
-    """Accept multipart/form-data uploads and store files under uploads/vehicles/<user_id>/ and return public URLs."""
+    """Accept multipart/form-data uploads, store them under vehicles/<user_id>/<field>/ and return their URLs."""
     user_id = get_jwt_identity()
     if 'files' not in request.files and len(request.files) == 0:
         # allow arbitrary field names
         pass
 
-    if not _gcs_available:
-        return jsonify({'error': 'GCS client library not installed. Run the app with the project virtualenv or install google-cloud-storage.'}), 500
+    # Validate everything before uploading anything
+    pending = []
+    for field_name in request.files:
+        for file in request.files.getlist(field_name):
+            if file and file.filename:
+                ext, error = validate_upload(file, ALLOWED_EXTENSIONS, upload_max_bytes())
+                if error:
+                    return jsonify({'error': f'{error}: {file.filename}'}), 400
+                pending.append((field_name, ext, file))
 
-    if not GCS_BUCKET:
-        return jsonify({'error': 'GCS_BUCKET is not configured'}), 500
+    try:
+        urls = file_storage.put_many([
+            (f"vehicles/{user_id}/{secure_filename(field_name) or 'file'}", file.stream, ext, file.mimetype)
+            for field_name, ext, file in pending
+        ])
+        files_response = [
+            {
+                'field': field_name,
+                'filename': url.rsplit('/', 1)[1],
+                'url': url
+            }
+            for (field_name, _, _), url in zip(pending, urls)
+        ]
+        enqueue_image_variants(urls)
+        return jsonify({'files': files_response}), 201
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@uploads_bp.route('/signed-url', methods=['POST'])
+@jwt_required()
+def create_signed_upload():
+    """Issue a short-lived signed PUT URL so the client uploads straight to the bucket."""
+    user_id = get_jwt_identity()
+    data = request.get_json() or {}
+    doc_type = data.get('docType')
+    filename = data.get('filename') or ''
 
-    if GCS_SERVICE_ACCOUNT_FILE and os.path.exists(GCS_SERVICE_ACCOUNT_FILE):
-        client = storage.Client.from_service_account_json(GCS_SERVICE_ACCOUNT_FILE)
-    else:
-        client = storage.Client()
+    if doc_type not in SIGNED_UPLOAD_TYPES:
+        return jsonify({'error': 'Invalid document type'}), 400
+    folder, extensions, limit = SIGNED_UPLOAD_TYPES[doc_type]
+    ext = filename.rsplit('.', 1)[1].lower() if '.' in filename else ''
+    if ext not in extensions:
+        return jsonify({'error': 'File type not allowed'}), 400
+    max_bytes = _max_bytes(limit)
+    size = data.get('size')
+    if size is not None and (not isinstance(size, int) or size <= 0 or size > max_bytes):
+        return jsonify({'error': 'File size exceeds limit', 'maxBytes': max_bytes}), 400
 
-    bucket = client.bucket(GCS_BUCKET)
+    error = _storage_error()
+    if error:
+        return error
 
-    files_response = []
+    object_path = f"{folder}/{user_id}/{doc_type}_{uuid.uuid4().hex}.{ext}"
     try:
-        for field_name in request.files:
-            file_storage = request.files.getlist(field_name)
-            for file in file_storage:
-                if file and file.filename:
-                    if not allowed_file(file.filename):
-                        return jsonify({'error': f'Invalid file type: {file.filename}'}), 400
-                    ext = file.filename.rsplit('.', 1)[1].lower()
-                    filename = f"{field_name}_{uuid.uuid4().hex}.{ext}"
-                    blob_path = f"vehicles/{user_id}/{secure_filename(filename)}"
-                    blob = bucket.blob(blob_path)
-                    blob.upload_from_file(file, content_type=file.mimetype)
-                    blob.make_public()
-                    absolute_url = blob.public_url
-                    files_response.append({
-                        'field': field_name,
-                        'filename': filename,
-                        'url': absolute_url
-                    })
+        url, headers, expires_in = generate_upload_url(object_path, CONTENT_TYPES[ext], max_bytes)
+    except Exception as e:
+        current_app.logger.error('Could not sign upload URL for %s: %s', object_path, e)
+        return jsonify({'error': 'Could not create upload URL'}), 500
 
-        return jsonify({'files': files_response}), 201
+    return jsonify({
+        'uploadUrl': url,
+        'method': 'PUT',
+        'headers': headers,
+        'objectPath': object_path,
+        'maxBytes': max_bytes,
+        'expiresAt': (datetime.utcnow() + expires_in).isoformat() + 'Z'
+    }), 201
+
+
+@uploads_bp.route('/complete', methods=['POST'])
+@jwt_required()
+def complete_signed_upload():
+    """Validate an object uploaded through a signed URL and record its URL.
+
+    KYC documents go on the user's KYCVerification, gstDoc/businessPhoto on their
+    Agency, and vehicleImage on the vehicle given by vehicleId (without vehicleId the
+    checked URL is only returned, e.g. for a vehicle that is not created yet).
+    """
+    user_id = get_jwt_identity()
+    data = request.get_json() or {}
+    doc_type = data.get('docType')
+    object_path = data.get('objectPath') or ''
+
+    if doc_type not in SIGNED_UPLOAD_TYPES:
+        return jsonify({'error': 'Invalid document type'}), 400
+    folder, extensions, limit = SIGNED_UPLOAD_TYPES[doc_type]
+    # Only objects under this user's prefix from /signed-url are accepted
+    match = re.fullmatch(rf'{folder}/{re.escape(str(user_id))}/{doc_type}_[0-9a-f]{{32}}\.([a-z]+)', object_path)
+    if not match or match.group(1) not in extensions:
+        return jsonify({'error': 'Invalid object path'}), 400
+    ext = match.group(1)
+
+    vehicle = None
+    if doc_type == 'vehicleImage' and data.get('vehicleId'):
+        vehicle = Vehicle.query.get(data['vehicleId'])
+        if not vehicle:
+            return jsonify({'error': 'Vehicle not found'}), 404
+        if vehicle.owner_id != user_id:
+            return jsonify({'error': 'Unauthorized'}), 403
+    agency = None
+    if doc_type in ('gstDoc', 'businessPhoto'):
+        agency = Agency.query.filter_by(user_id=user_id).first()
+        if not agency:
+            return jsonify({'error': 'Agency not found'}), 404
+
+    error = _storage_error()
+    if error:
+        return error
+
+    try:
+        info = get_object_info(object_path)
+    except Exception as e:
+        current_app.logger.error('Could not read uploaded object %s: %s', object_path, e)
+        return jsonify({'error': 'Could not verify upload'}), 502
+    if info is None:
+        return jsonify({'error': 'Upload not found'}), 404
+    size, content_type, head, url = info
+
+    problem = None
+    if not size or size > _max_bytes(limit):
+        problem = 'File size exceeds limit' if size else 'File is empty'
+    elif content_type != CONTENT_TYPES[ext] or not MAGIC_CHECKS[ext](head):
+        problem = 'File content does not match its type'
+    if problem:
+        delete_object(object_path)
+        return jsonify({'error': problem}), 400
+
+    try:
+        if doc_type in ('aadhaar', 'dl', 'selfie'):
+            return record_kyc_document(user_id, doc_type, url)
+
+        if agency is not None:
+            target = 'gst_doc_url' if doc_type == 'gstDoc' else 'business_photo_url'
+            old_url = getattr(agency, target)
+            setattr(agency, target, url)
+            Vehicle.sync_agency_summary(agency)
+            db.session.commit()
+            file_storage.delete_later(old_url, keep=(url,))
+            if doc_type == 'businessPhoto':
+                enqueue_image_variants([url])
+            # Vehicle detail embeds agency contact details
+            response_cache.invalidate('vehicles')
+            return jsonify({'message': 'File uploaded successfully', 'docType': doc_type, 'url': url}), 200
+
+        if vehicle is not None:
+            images = list(vehicle.images)
+            is_primary = bool(data.get('isPrimary')) or not images
+            if is_primary:
+                for image in images:
+                    image.is_primary = False
+            vehicle_image = VehicleImage(
+                vehicle_id=vehicle.id,
+                image_url=url,
+                image_type=data.get('imageType'),
+                is_primary=is_primary
+            )
+            vehicle.images.append(vehicle_image)
+            vehicle.refresh_primary_image(vehicle.images)
+            db.session.commit()
+            vehicle_search_index.update(vehicle)
+            response_cache.invalidate(f'vehicle:{vehicle.id}')
+            enqueue_image_variants([url])
+            return jsonify({
+                'message': 'File uploaded successfully',
+                'docType': doc_type,
+                'url': url,
+                'imageId': vehicle_image.id
+            }), 201
+
+        return jsonify({'message': 'File uploaded successfully', 'docType': doc_type, 'url': url}), 200
     except Exception as e:
+        db.session.rollback()
         return jsonify({'error': str(e)}), 500
@@ -1,17 +1,24 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
+from sqlalchemy import func
 from app import db
 from app.models.user import User, Profile
+from app.models.vehicle import Vehicle
+from app.models.booking import Booking
+from app.utils.gcs import is_private
+from app.utils.response_cache import response_cache
+from app.utils.storage import file_storage
 
 users_bp = Blueprint('users', __name__, url_prefix='/api/users')
 
 
 def _build_profile_payload(user, profile):
-    vehicles = user.vehicles or []
-    bookings = user.bookings_as_customer or []
+    # Counted in SQL rather than loading the vehicles/bookings relationships
+    vehicle_count = db.session.query(func.count(Vehicle.id)).filter(Vehicle.owner_id == user.id).scalar()
+    booking_count = db.session.query(func.count(Booking.id)).filter(Booking.customer_id == user.id).scalar()
     agency = user.agency
-    loyalty_score = min(100, 45 + len(bookings) * 4)
-    next_milestone = max(0, 5 - (len(bookings) % 5)) if bookings else 5
+    loyalty_score = min(100, 45 + booking_count * 4)
+    next_milestone = max(0, 5 - (booking_count % 5)) if booking_count else 5
 
     agency_details = None
     if agency:
@@ -45,13 +52,13 @@ def _build_profile_payload(user, profile):
             'fullName': profile.full_name if profile and profile.full_name else '',
             'email': user.email,
             'phone': profile.phone if profile and profile.phone else '',
-            'avatarUrl': profile.avatar_url if profile else None,
+            'avatarUrl': file_storage.access_url(profile.avatar_url) if profile else None,
             'avatarLocked': profile.avatar_locked if profile else False,
             'memberSince': user.created_at.isoformat() if user.created_at else None
         },
         'metrics': {
-            'vehiclesListed': len(vehicles),
-            'completedTrips': len(bookings),
+            'vehiclesListed': vehicle_count,
+            'completedTrips': booking_count,
             'loyaltyScore': loyalty_score,
             'nextMilestoneTrips': next_milestone
         },
@@ -62,8 +69,8 @@ def _build_profile_payload(user, profile):
             'isVerified': agency.is_verified if agency else False,
             'canManageFleet': agency is not None,
             'stats': {
-                'listedVehicles': (agency.total_vehicles if agency and agency.total_vehicles is not None else len(vehicles)),
-                'lifetimeBookings': (agency.total_bookings if agency and agency.total_bookings is not None else len(bookings)),
+                'listedVehicles': (agency.total_vehicles if agency and agency.total_vehicles is not None else vehicle_count),
+                'lifetimeBookings': (agency.total_bookings if agency and agency.total_bookings is not None else booking_count),
                 'lifetimeEarnings': (agency.total_earnings if agency and agency.total_earnings is not None else 0)
             }
         },
@@ -108,6 +115,9 @@ def update_profile():
         profile.avatar_url = new_avatar
     
     db.session.commit()
+    if db.session.query(Vehicle.id).filter(Vehicle.owner_id == user_id).first():
+        # Vehicle detail embeds the owner's name and phone
+        response_cache.invalidate('vehicles')
     
     payload = _build_profile_payload(user, profile)
     payload['message'] = 'Profile updated successfully'
@@ -121,6 +131,10 @@ def get_user(user_id):
         return jsonify({'error': 'User not found'}), 404
     
     profile = Profile.query.filter_by(user_id=user_id).first()
+    avatar_url = profile.avatar_url if profile else None
+    # A KYC selfie used as the avatar is only shown to its owner
+    if avatar_url and is_private(file_storage.backend.key_for_url(avatar_url) or ''):
+        avatar_url = None
     
     return jsonify({
         'user': {
@@ -129,7 +143,7 @@ def get_user(user_id):
             'profile': {
                 'fullName': profile.full_name if profile else '',
                 'phone': profile.phone if profile else '',
-                'avatarUrl': profile.avatar_url if profile else None
+                'avatarUrl': avatar_url
             }
         }
     }), 200
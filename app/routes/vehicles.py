@@ -1,4 +1,4 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity, verify_jwt_in_request
 from app import db
 from app.models.vehicle import Vehicle, VehicleImage, VehicleDocument
@@ -6,8 +6,15 @@ from app.models.user import User
 from app.models.agency import Agency
 from app.models.booking import Booking
 from app.models.favorite import Favorite
+from app.utils.availability import availability_index
+from app.utils.pagination import keyset_paginate, wants_total, InvalidPagination
+from app.utils.vehicle_search import vehicle_search_index, rank_expression
+from app.utils.geo import bounding_box, covering_prefixes, haversine_km
+from app.utils.image_variants import enqueue_image_variants, pick_variant, variant_urls
+from app.utils.response_cache import cached_response, response_cache
 from datetime import datetime, date, timedelta
-from sqlalchemy import or_, and_
+from sqlalchemy import or_, and_, func
+import math
 
 vehicles_bp = Blueprint('vehicles', __name__, url_prefix='/api/vehicles')
 
@@ -24,6 +31,14 @@ def _absolute_url(path: str) -> str:
     return path
 
 
+def _variant_urls_json(variants, url):
+    """``{size: {format: absolute url}}`` for the ready variants of ``url``, or None."""
+    sizes = variants.get(url)
+    if not sizes:
+        return None
+    return {size: {fmt: _absolute_url(u) for fmt, u in by_format.items()} for size, by_format in sizes.items()}
+
+
 def _parse_iso_date(value, field_name: str):
     """Parse ISO-8601 date/datetime strings to date objects."""
     if value is None or value == '':
@@ -39,12 +54,73 @@ def _parse_iso_date(value, field_name: str):
             raise ValueError(f"{field_name} must be a valid ISO-8601 date (YYYY-MM-DD)")
     raise ValueError(f"{field_name} must be a valid date string")
 
+
+def _load_listing_relations(vehicles, include_agencies=True):
+    """Batch-load primary image URLs and agency summaries for a page of vehicles.
+
+    Returns ``(primary_images, agencies)`` where ``primary_images`` maps vehicle id
+    to the primary image URL (falling back to the first image) and ``agencies``
+    maps agency id to a row with ``agency_name`` and ``business_photo_url``.
+    Issues at most one query per relation regardless of page size.
+    """
+    vehicle_ids = [v.id for v in vehicles]
+    primary_images = {}
+    if vehicle_ids:
+        rows = db.session.query(
+            VehicleImage.vehicle_id,
+            VehicleImage.image_url,
+            VehicleImage.is_primary
+        ).filter(VehicleImage.vehicle_id.in_(vehicle_ids)).all()
+        for vehicle_id, image_url, is_primary in rows:
+            if vehicle_id not in primary_images:
+                primary_images[vehicle_id] = (image_url, is_primary)
+            elif is_primary and not primary_images[vehicle_id][1]:
+                primary_images[vehicle_id] = (image_url, is_primary)
+        primary_images = {vid: url for vid, (url, _) in primary_images.items()}
+
+    agencies = {}
+    agency_ids = {v.agency_id for v in vehicles if v.agency_id}
+    if include_agencies and agency_ids:
+        rows = db.session.query(
+            Agency.id,
+            Agency.agency_name,
+            Agency.business_photo_url
+        ).filter(Agency.id.in_(agency_ids)).all()
+        agencies = {row.id: row for row in rows}
+
+    return primary_images, agencies
+
+def _vehicles_near(query, lat, lng, radius_km):
+    """Return [(distance_km, vehicle_id)] for rows of ``query`` within ``radius_km``, nearest first.
+
+    Candidates come from geohash prefix range scans plus a bounding-box check;
+    the exact haversine distance decides membership and order.
+    """
+    min_lat, min_lng, max_lat, max_lng = bounding_box(lat, lng, radius_km)
+    prefixes = covering_prefixes(min_lat, min_lng, max_lat, max_lng)
+    # Prefix match as a range ('{' sorts right after 'z') so any backend can use the index
+    rows = query.filter(
+        or_(*[and_(Vehicle.geohash >= prefix, Vehicle.geohash < prefix + '{') for prefix in prefixes]),
+        Vehicle.latitude.between(min_lat, max_lat),
+        Vehicle.longitude.between(min_lng, max_lng)
+    ).with_entities(Vehicle.id, Vehicle.latitude, Vehicle.longitude).order_by(None).all()
+
+    hits = []
+    for vehicle_id, v_lat, v_lng in rows:
+        distance = haversine_km(lat, lng, v_lat, v_lng)
+        if distance <= radius_km:
+            hits.append((distance, vehicle_id))
+    hits.sort()
+    return hits
+
 @vehicles_bp.route('', methods=['GET'])
 def get_vehicles():
     """Get all available vehicles"""
     print('[BACKEND] GET /api/vehicles called')
     page = request.args.get('page', 1, type=int)
     per_page = request.args.get('per_page', 12, type=int)
+    cursor = request.args.get('cursor')
+    include_total = wants_total(request.args)
     vehicle_type = request.args.get('type')
     wheelers = request.args.get('wheelers')  # expected: 2, 4, two, four, 2w, 4w
     search_term = request.args.get('q')
@@ -56,6 +132,8 @@ def get_vehicles():
     pickup_time = request.args.get('pickup_time')
     drop_date = request.args.get('drop_date')
     drop_time = request.args.get('drop_time')
+    near = request.args.get('near')  # "lat,lng"
+    radius_km = request.args.get('radius_km', 10, type=float)
     
     print(f'[BACKEND] Params: page={page}, per_page={per_page}, type={vehicle_type}, wheelers={wheelers}, q={search_term}, location={location}, favorite={favorite_only}')
 
@@ -68,6 +146,24 @@ def get_vehicles():
     
     query = Vehicle.query.filter_by(is_available=True)
 
+    near_point = None
+    if near:
+        try:
+            near_lat, near_lng = (float(part) for part in near.split(','))
+        except ValueError:
+            return jsonify({'error': 'near must be "lat,lng"'}), 400
+        if not (-90 <= near_lat <= 90 and -180 <= near_lng <= 180):
+            return jsonify({'error': 'near is out of range'}), 400
+        max_radius = current_app.config.get('NEAR_MAX_RADIUS_KM', 100)
+        if radius_km is None or radius_km <= 0 or radius_km > max_radius:
+            return jsonify({'error': f'radius_km must be between 0 and {max_radius}'}), 400
+        if cursor is not None:
+            return jsonify({'error': 'cursor pagination is not supported with near'}), 400
+        # Near results are sliced in Python, where a page below 1 would wrap to the tail
+        if page is None or page < 1 or per_page is None or per_page < 1:
+            return jsonify({'error': 'page and per_page must be at least 1'}), 400
+        near_point = (near_lat, near_lng)
+
     # Optional availability window: exclude vehicles that have overlapping bookings
     if (pickup_date and drop_date) or (start_date and end_date):
         try:
@@ -85,17 +181,22 @@ def get_vehicles():
         if end_dt <= start_dt:
             return jsonify({'error': 'end_date/drop_time must be after start_date/pickup_time'}), 400
 
-        cutoff = datetime.utcnow() - timedelta(minutes=2)
-        blocking_statuses = ['confirmed', 'active']
-        overlapping = Booking.query.filter(
-            or_(
-                Booking.status.in_(blocking_statuses),
-                and_(Booking.status == 'pending', Booking.created_at >= cutoff)
-            ),
-            Booking.start_date < end_dt,
-            Booking.end_date > start_dt
-        ).with_entities(Booking.vehicle_id).distinct()
-        query = query.filter(~Vehicle.id.in_(overlapping))
+        blocked_ids = availability_index.blocked_vehicle_ids(start_dt, end_dt)
+        if blocked_ids is None:
+            # Window outside the in-memory horizon: fall back to the SQL overlap filter
+            cutoff = datetime.utcnow() - timedelta(minutes=2)
+            blocking_statuses = ['confirmed', 'active']
+            overlapping = Booking.query.filter(
+                or_(
+                    Booking.status.in_(blocking_statuses),
+                    and_(Booking.status == 'pending', Booking.created_at >= cutoff)
+                ),
+                Booking.start_date < end_dt,
+                Booking.end_date > start_dt
+            ).with_entities(Booking.vehicle_id).distinct()
+            query = query.filter(~Vehicle.id.in_(overlapping))
+        elif blocked_ids:
+            query = query.filter(~Vehicle.id.in_(blocked_ids))
 
     # Wheelers filter maps to vehicle_type buckets
     if wheelers:
@@ -117,45 +218,108 @@ def get_vehicles():
         query = query.filter_by(vehicle_type=vehicle_type)
 
     if location:
-        query = query.filter(Vehicle.location.ilike(f'%{location}%'))
+        location_ids = vehicle_search_index.match(location, fields=('location',))
+        if location_ids is None:
+            query = query.filter(Vehicle.location.ilike(f'%{location}%'))
+        else:
+            query = query.filter(Vehicle.id.in_(location_ids))
 
+    corrected_term = None
     if search_term:
-        like_term = f"%{search_term}%"
-        query = query.filter(
-            or_(
-                Vehicle.make.ilike(like_term),
-                Vehicle.model.ilike(like_term),
-                Vehicle.location.ilike(like_term)
+        matched_ids = vehicle_search_index.match(search_term)
+        if matched_ids == set():
+            # Nothing contains the term; retry with the closest catalog brand/model name
+            corrected_term = vehicle_search_index.suggest(search_term)
+            if corrected_term:
+                matched_ids = vehicle_search_index.match(corrected_term)
+                if matched_ids:
+                    search_term = corrected_term
+                else:
+                    corrected_term = None
+                    matched_ids = set()
+        if matched_ids is None:
+            like_term = f"%{search_term}%"
+            query = query.filter(
+                or_(
+                    Vehicle.make.ilike(like_term),
+                    Vehicle.model.ilike(like_term),
+                    Vehicle.location.ilike(like_term)
+                )
             )
-        )
-
-    order_column = getattr(Vehicle, 'created_at', Vehicle.id)
-    vehicles = query.order_by(order_column.desc()).paginate(page=page, per_page=per_page)
+        else:
+            query = query.filter(Vehicle.id.in_(matched_ids))
+
+    distances = {}
+    if near_point:
+        # Nearest first; the other filters are already applied to `query`
+        hits = _vehicles_near(query, near_point[0], near_point[1], radius_km)
+        page_hits = hits[(page - 1) * per_page:page * per_page]
+        distances = {vehicle_id: distance for distance, vehicle_id in page_hits}
+        by_id = {}
+        if distances:
+            by_id = {v.id: v for v in Vehicle.query.filter(Vehicle.id.in_(list(distances))).all()}
+        page_items = [by_id[vehicle_id] for _, vehicle_id in page_hits if vehicle_id in by_id]
+        pagination = {
+            'page': page,
+            'per_page': per_page,
+            'total': len(hits),
+            'pages': math.ceil(len(hits) / per_page) if per_page else 0
+        }
+    elif cursor is not None:
+        # Keyset mode: ordered on (created_at, id), no OFFSET
+        try:
+            vehicles = keyset_paginate(query, Vehicle.created_at, Vehicle.id, cursor, per_page, include_total=include_total)
+        except InvalidPagination as e:
+            return jsonify({'error': str(e)}), 400
+        page_items = vehicles.items
+        pagination = vehicles.to_dict(per_page)
+    else:
+        order_column = getattr(Vehicle, 'created_at', Vehicle.id)
+        # id breaks created_at ties, so rows sharing a timestamp cannot shift between pages
+        if search_term:
+            query = query.order_by(rank_expression(search_term), order_column.desc(), Vehicle.id.desc())
+        else:
+            query = query.order_by(order_column.desc(), Vehicle.id.desc())
+        vehicles = query.paginate(page=page, per_page=per_page, count=include_total)
+        page_items = vehicles.items
+        pagination = {
+            'page': page,
+            'per_page': per_page,
+            'total': vehicles.total,
+            'pages': vehicles.pages
+        }
     favorite_ids = set()
-    if current_user_id and vehicles.items:
+    if current_user_id and page_items:
         favs = Favorite.query.filter(
             Favorite.user_id == current_user_id,
-            Favorite.vehicle_id.in_([v.id for v in vehicles.items])
+            Favorite.vehicle_id.in_([v.id for v in page_items])
         ).all()
         favorite_ids = {f.vehicle_id for f in favs}
-    print(f'[BACKEND] Found {len(vehicles.items)} vehicles')
+    print(f'[BACKEND] Found {len(page_items)} vehicles')
     
+    # Listing fields come from the cached columns; rows never backfilled (NULL) fall back to a batched lookup
+    stale = [v for v in page_items if v.primary_image_url is None or (v.agency_id and v.agency_name is None)]
+    primary_images, agencies = _load_listing_relations(stale)
+
+    listing_images = []
+    for vehicle in page_items:
+        primary_image = vehicle.primary_image_url or primary_images.get(vehicle.id)
+        agency_name = vehicle.agency_name
+        # Business photo doubles as the agency logo
+        agency_logo = vehicle.agency_logo_url
+        agency = agencies.get(vehicle.agency_id) if vehicle.agency_id and agency_name is None else None
+        if agency:
+            agency_name = agency.agency_name
+            agency_logo = agency.business_photo_url
+        listing_images.append((vehicle, primary_image, agency_name, agency_logo))
+    # Cards get the resized WebP variants once they are ready, else the originals
+    variants = variant_urls([url for _, image, _, logo in listing_images for url in (image, logo)])
+
     result = []
-    for vehicle in vehicles.items:
-        images = VehicleImage.query.filter_by(vehicle_id=vehicle.id).all()
-        primary_image = None
-        if images:
-            primary_image = next((img for img in images if img.is_primary), images[0])
-
-        agency_name = None
-        agency_logo = None
-        if vehicle.agency_id:
-            agency = Agency.query.get(vehicle.agency_id)
-            # Agency model stores the field as agency_name
-            agency_name = agency.agency_name if agency else None
-            # Use business photo as logo placeholder when available
-            agency_logo = getattr(agency, 'business_photo_url', None) if agency else None
-        
+    for vehicle, primary_image, agency_name, agency_logo in listing_images:
+        agency_logo = pick_variant(variants, agency_logo, 'thumb')
+        card_image = pick_variant(variants, primary_image, 'card')
+
         result.append({
             'id': vehicle.id,
             'make': vehicle.make,
@@ -171,7 +335,8 @@ def get_vehicles():
             'weeklyRate': vehicle.weekly_rate,
             'monthlyRate': vehicle.monthly_rate,
             'location': vehicle.location,
-            'imageUrl': _absolute_url(primary_image.image_url) if primary_image else None,
+            'imageUrl': _absolute_url(card_image) if card_image else None,
+            'imageVariants': _variant_urls_json(variants, primary_image),
             'seatingCapacity': vehicle.seating_capacity,
             'transmission': vehicle.transmission,
             'isAvailable': vehicle.is_available,
@@ -187,19 +352,20 @@ def get_vehicles():
             'timings': vehicle.timings,
             'isFavorite': vehicle.id in favorite_ids,
         })
+        if near_point:
+            result[-1]['distanceKm'] = round(distances[vehicle.id], 2)
     
     print(f'[BACKEND] Returning {len(result)} vehicles')
-    return jsonify({
+    response = {
         'vehicles': result,
-        'pagination': {
-            'page': page,
-            'per_page': per_page,
-            'total': vehicles.total,
-            'pages': vehicles.pages
-        }
-    }), 200
+        'pagination': pagination
+    }
+    if corrected_term:
+        response['correctedQuery'] = corrected_term
+    return jsonify(response), 200
 
 @vehicles_bp.route('/<vehicle_id>', methods=['GET'])
+@cached_response('vehicles', scope=lambda vehicle_id: f'vehicle:{vehicle_id}')
 def get_vehicle(vehicle_id):
     """Get vehicle details"""
     vehicle = Vehicle.query.get(vehicle_id)
@@ -214,6 +380,7 @@ def get_vehicle(vehicle_id):
     owner_profile = owner.profile if owner else None
 
     agency = Agency.query.get(vehicle.agency_id) if vehicle.agency_id else None
+    variants = variant_urls(img.image_url for img in images)
 
     
     return jsonify({
@@ -255,6 +422,7 @@ def get_vehicle(vehicle_id):
             'images': [{
                 'id': img.id,
                 'imageUrl': _absolute_url(img.image_url),
+                'imageVariants': _variant_urls_json(variants, img.image_url),
                 'imageType': img.image_type,
                 'isPrimary': img.is_primary
             } for img in images],
@@ -335,6 +503,7 @@ def create_vehicle():
         
         # Add images
         images = data.get('images', [])
+        vehicle_images = []
         for idx, image in enumerate(images):
             vehicle_image = VehicleImage(
                 vehicle_id=vehicle.id,
@@ -343,6 +512,12 @@ def create_vehicle():
                 is_primary=image.get('isPrimary', idx == 0)
             )
             db.session.add(vehicle_image)
+            vehicle_images.append(vehicle_image)
+        vehicle.refresh_primary_image(vehicle_images)
+        vehicle.refresh_geohash()
+        if vehicle.agency_id:
+            vehicle.refresh_agency_summary(Agency.query.get(vehicle.agency_id))
+            Agency.adjust_stats(vehicle.agency_id, vehicles=1)
         
         # Add documents
         documents = data.get('documents', [])
@@ -357,6 +532,9 @@ def create_vehicle():
             db.session.add(vehicle_doc)
         
         db.session.commit()
+        vehicle_search_index.update(vehicle)
+        response_cache.invalidate(f'vehicle:{vehicle.id}')
+        enqueue_image_variants([image.image_url for image in vehicle_images])
         
         return jsonify({
             'message': 'Vehicle created successfully',
@@ -412,9 +590,13 @@ def update_vehicle(vehicle_id):
         vehicle.location = data.get('location', vehicle.location)
         vehicle.latitude = data.get('latitude', vehicle.latitude)
         vehicle.longitude = data.get('longitude', vehicle.longitude)
+        vehicle.refresh_geohash()
         agency_id = data.get('agencyId') or data.get('agency_id')
-        if agency_id:
+        if agency_id and agency_id != vehicle.agency_id:
+            Agency.adjust_stats(vehicle.agency_id, vehicles=-1)
+            Agency.adjust_stats(agency_id, vehicles=1)
             vehicle.agency_id = agency_id
+            vehicle.refresh_agency_summary(Agency.query.get(agency_id))
         vehicle.insurance_number = data.get('insuranceNumber', vehicle.insurance_number)
         vehicle.insurance_expiry = insurance_expiry
         vehicle.registration_expiry = registration_expiry
@@ -425,6 +607,7 @@ def update_vehicle(vehicle_id):
         if 'images' in data:
             VehicleImage.query.filter_by(vehicle_id=vehicle.id).delete()
             images = data.get('images', []) or []
+            vehicle_images = []
             for idx, image in enumerate(images):
                 vehicle_image = VehicleImage(
                     vehicle_id=vehicle.id,
@@ -433,6 +616,8 @@ def update_vehicle(vehicle_id):
                     is_primary=image.get('isPrimary', idx == 0)
                 )
                 db.session.add(vehicle_image)
+                vehicle_images.append(vehicle_image)
+            vehicle.refresh_primary_image(vehicle_images)
 
         # Replace documents when provided
         if 'documents' in data:
@@ -449,6 +634,10 @@ def update_vehicle(vehicle_id):
                 db.session.add(vehicle_doc)
 
         db.session.commit()
+        vehicle_search_index.update(vehicle)
+        response_cache.invalidate(f'vehicle:{vehicle.id}')
+        if 'images' in data:
+            enqueue_image_variants([image.image_url for image in vehicle_images])
         
         return jsonify({'message': 'Vehicle updated successfully'}), 200
         
@@ -492,6 +681,7 @@ def update_availability(vehicle_id):
         new_avail = _to_bool(data.get('isAvailable'), vehicle.is_available)
         vehicle.is_available = new_avail
         db.session.commit()
+        response_cache.invalidate(f'vehicle:{vehicle_id}')
         return jsonify({'message': 'Availability updated successfully'}), 200
     except Exception as e:
         db.session.rollback()
@@ -511,8 +701,20 @@ def delete_vehicle(vehicle_id):
     if vehicle.owner_id != user_id:
         return jsonify({'error': 'Unauthorized'}), 403
     
+    # Paid bookings go with the vehicle, so take them out of the agency totals too
+    paid = db.session.query(
+        Booking.agency_id, func.count(Booking.id), func.sum(Booking.total_amount)
+    ).filter(
+        Booking.vehicle_id == vehicle_id,
+        Booking.payment_status == 'completed'
+    ).group_by(Booking.agency_id).all()
     db.session.delete(vehicle)
+    Agency.adjust_stats(vehicle.agency_id, vehicles=-1)
+    for agency_id, count, earnings in paid:
+        Agency.adjust_stats(agency_id, bookings=-count, earnings=-(earnings or 0))
     db.session.commit()
+    vehicle_search_index.remove(vehicle_id)
+    response_cache.invalidate(f'vehicle:{vehicle_id}')
     
     return jsonify({'message': 'Vehicle deleted successfully'}), 200
 
@@ -552,12 +754,16 @@ def get_owner_vehicles(owner_id):
     """Get all vehicles of an owner"""
     vehicles = Vehicle.query.filter_by(owner_id=owner_id).all()
 
+    stale = [v for v in vehicles if v.primary_image_url is None]
+    primary_images, _ = _load_listing_relations(stale, include_agencies=False)
+
+    images = {vehicle.id: vehicle.primary_image_url or primary_images.get(vehicle.id) for vehicle in vehicles}
+    variants = variant_urls(images.values())
+
     result = []
     for vehicle in vehicles:
-        images = VehicleImage.query.filter_by(vehicle_id=vehicle.id).all()
-        primary_image = None
-        if images:
-            primary_image = next((img for img in images if img.is_primary), images[0])
+        primary_image = images[vehicle.id]
+        card_image = pick_variant(variants, primary_image, 'card')
 
         result.append({
             'id': vehicle.id,
@@ -569,7 +775,8 @@ def get_owner_vehicles(owner_id):
             'dailyRate': vehicle.daily_rate,
             'isAvailable': vehicle.is_available,
             'status': vehicle.status,
-            'imageUrl': _absolute_url(primary_image.image_url) if primary_image else None
+            'imageUrl': _absolute_url(card_image) if card_image else None,
+            'imageVariants': _variant_urls_json(variants, primary_image)
         })
 
     return jsonify({'vehicles': result}), 200
@@ -0,0 +1,68 @@
+from sqlalchemy import func
+
+from app import db
+from app.models.agency import Agency
+from app.models.booking import Booking
+from app.models.feedback import Feedback
+from app.models.vehicle import Vehicle
+
+
+def reconcile_agency_stats(batch_size: int = 500) -> int:
+    """Recompute total_vehicles/total_bookings/total_earnings/average_rating for every agency.
+
+    The live counters are bumped incrementally by the write paths; this rebuilds them
+    from the source tables with one GROUP BY per statistic and fixes any drift.
+    total_bookings/total_earnings cover bookings whose payment is completed.
+    Returns the number of agencies whose counters changed.
+    """
+    vehicle_counts = dict(
+        db.session.query(Vehicle.agency_id, func.count(Vehicle.id))
+        .filter(Vehicle.agency_id.isnot(None))
+        .group_by(Vehicle.agency_id)
+        .all()
+    )
+    booking_totals = {
+        agency_id: (count, float(earnings or 0))
+        for agency_id, count, earnings in db.session.query(
+            Booking.agency_id, func.count(Booking.id), func.sum(Booking.total_amount)
+        ).filter(Booking.payment_status == 'completed').group_by(Booking.agency_id).all()
+    }
+    ratings = dict(
+        db.session.query(Feedback.agency_id, func.avg(Feedback.rating))
+        .filter(Feedback.agency_id.isnot(None))
+        .group_by(Feedback.agency_id)
+        .all()
+    )
+
+    changed = 0
+    last_id = None
+    while True:
+        query = Agency.query.order_by(Agency.id.asc())
+        if last_id is not None:
+            query = query.filter(Agency.id > last_id)
+        agencies = query.limit(batch_size).all()
+        if not agencies:
+            break
+
+        updates = []
+        for agency in agencies:
+            bookings, earnings = booking_totals.get(agency.id, (0, 0.0))
+            rating = float(ratings.get(agency.id) or 0)
+            expected = (vehicle_counts.get(agency.id, 0), bookings, earnings, rating)
+            current = (agency.total_vehicles, agency.total_bookings, agency.total_earnings, agency.average_rating)
+            if current != expected:
+                updates.append({
+                    'id': agency.id,
+                    'total_vehicles': expected[0],
+                    'total_bookings': expected[1],
+                    'total_earnings': expected[2],
+                    'average_rating': expected[3],
+                    'updated_at': agency.updated_at,
+                })
+        if updates:
+            db.session.bulk_update_mappings(Agency, updates)
+        db.session.commit()
+        changed += len(updates)
+        last_id = agencies[-1].id
+
+    return changed
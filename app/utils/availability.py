@@ -0,0 +1,221 @@
+"""
+In-memory availability index for date-range vehicle search.
+
+Keeps the booked intervals of every vehicle that can block a search inside a
+rolling horizon, so ``GET /api/vehicles`` can exclude unavailable vehicles
+without a NOT IN subquery over the bookings table. Blocking rules match the
+SQL overlap filter: 'confirmed'/'active' bookings always block, 'pending'
+bookings block only for PENDING_HOLD after creation.
+
+The index is rebuilt lazily: fully after AVAILABILITY_INDEX_TTL_SECONDS, and per
+vehicle whenever a booking transition calls ``invalidate(vehicle_id)``. Invalidations
+go out on the change feed (app/utils/change_feed.py), so with a shared feed every
+process reloads the vehicle before its next search. Without one, a write is only
+seen by other processes after their TTL, so when gunicorn runs more than one worker
+(WEB_WORKERS) searches use the SQL overlap filter instead. Several instances need
+CHANGE_FEED_BACKEND=redis for the same reason.
+
+Rebuilds query the database without holding the index lock; searches keep using
+the previous snapshot until the new one is swapped in. Every invalidation bumps a
+generation counter, so one that lands while a rebuild is querying is not cleared
+by that rebuild and the vehicle is reloaded on the next search.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import and_, or_
+
+from app import db
+from app.models.booking import Booking
+from app.utils.change_feed import FULL, change_feed
+
+BLOCKING_STATUSES = ('confirmed', 'active')
+PENDING_HOLD = timedelta(minutes=2)
+FEED = 'availability'
+
+
+def overlapping_bookings(vehicle_id, start, end, exclude_booking_id=None):
+    """Query for bookings that block ``vehicle_id`` somewhere in [start, end), by the rules above."""
+    cutoff = datetime.utcnow() - PENDING_HOLD
+    query = Booking.query.filter(
+        Booking.vehicle_id == vehicle_id,
+        or_(
+            Booking.status.in_(BLOCKING_STATUSES),
+            and_(Booking.status == 'pending', Booking.created_at >= cutoff)
+        ),
+        Booking.start_date < end,
+        Booking.end_date > start
+    )
+    if exclude_booking_id is not None:
+        query = query.filter(Booking.id != exclude_booking_id)
+    return query
+
+
+class _VehicleIntervals:
+    """Booked intervals of one vehicle, sorted by start with a running max of ends."""
+
+    __slots__ = ('starts', 'max_ends', 'pending')
+
+    def __init__(self, blocking, pending):
+        blocking.sort()
+        self.starts = [start for start, _ in blocking]
+        self.max_ends = []
+        running = None
+        for _, end in blocking:
+            running = end if running is None or end > running else running
+            self.max_ends.append(running)
+        # (start, end, created_at) of pending bookings; short-lived so kept unsorted
+        self.pending = pending
+
+    def overlaps(self, start, end, cutoff):
+        # Intervals starting before `end` are a prefix; one of them overlaps iff its end > start
+        idx = bisect_left(self.starts, end)
+        if idx and self.max_ends[idx - 1] > start:
+            return True
+        return any(
+            p_start < end and p_end > start and created_at is not None and created_at >= cutoff
+            for p_start, p_end, created_at in self.pending
+        )
+
+
+class AvailabilityIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._vehicles = {}
+        self._horizon_start = None
+        self._horizon_end = None
+        self._built_at = None
+        self._feed_version = None
+        # vehicle id -> generation of its latest invalidation
+        self._dirty = {}
+        self._generation = 0
+        # Generation of the latest invalidate() without an id
+        self._reset_generation = 0
+
+    def invalidate(self, vehicle_id=None):
+        """Mark one vehicle (or the whole index when no id is given) for reload, here
+        and, through the change feed, in every other process."""
+        with self._lock:
+            self._generation += 1
+            if vehicle_id is None:
+                self._built_at = None
+                self._reset_generation = self._generation
+            else:
+                self._dirty[vehicle_id] = self._generation
+        change_feed.publish(FEED, vehicle_id or FULL)
+
+    def blocked_vehicle_ids(self, start, end):
+        """Return ids of vehicles booked somewhere in [start, end), or None if the
+        caller should query SQL: the window falls outside the indexed horizon, or
+        several processes serve requests without a shared change feed."""
+        if start.tzinfo is not None or end.tzinfo is not None:
+            return None
+        if not change_feed.shared and current_app.config.get('WEB_WORKERS', 1) > 1:
+            return None
+        self._refresh()
+        with self._lock:
+            vehicles, horizon_start, horizon_end = self._vehicles, self._horizon_start, self._horizon_end
+        if start < horizon_start or end > horizon_end:
+            return None
+        # Snapshots are replaced, never changed in place, so this runs without the lock
+        cutoff = datetime.utcnow() - PENDING_HOLD
+        return [
+            vehicle_id for vehicle_id, intervals in vehicles.items()
+            if intervals.overlaps(start, end, cutoff)
+        ]
+
+    def _pending_work(self):
+        """Return ``(full, dirty ids, feed version, generation)``; full is None when nothing is due."""
+        ttl = current_app.config.get('AVAILABILITY_INDEX_TTL_SECONDS', 30)
+        with self._lock:
+            expired = self._built_at is None or time.monotonic() - self._built_at > ttl
+            dirty = set(self._dirty)
+            since = self._feed_version
+            generation = self._generation
+        version, changed = change_feed.changes(FEED, since)
+        if changed is None:
+            expired = True
+        else:
+            dirty |= changed
+        if not expired and not dirty:
+            return None, dirty, version, generation
+        return expired, dirty, version, generation
+
+    def _refresh(self):
+        full, dirty, version, generation = self._pending_work()
+        if full is None:
+            return
+        # A TTL rebuild with no known changes can wait for whoever is already building
+        blocking = self._built_at is None or bool(dirty)
+        if not self._build_lock.acquire(blocking=blocking):
+            return
+        try:
+            full, dirty, version, generation = self._pending_work()
+            if full is None:
+                return
+            # The database is queried without holding self._lock; searches keep using the old snapshot
+            if full:
+                horizon_days = current_app.config.get('AVAILABILITY_HORIZON_DAYS', 180)
+                now = datetime.utcnow()
+                # A day of slack so searches starting earlier today are still served from memory
+                horizon_start = now - timedelta(days=1)
+                horizon_end = now + timedelta(days=horizon_days)
+                vehicles = self._load(self._query(horizon_start, horizon_end))
+            else:
+                horizon_start, horizon_end = self._horizon_start, self._horizon_end
+                loaded = self._load(self._query(horizon_start, horizon_end).filter(Booking.vehicle_id.in_(dirty)))
+                vehicles = {vid: intervals for vid, intervals in self._vehicles.items() if vid not in dirty}
+                vehicles.update(loaded)
+            with self._lock:
+                self._vehicles = vehicles
+                self._horizon_start, self._horizon_end = horizon_start, horizon_end
+                # Invalidations newer than the snapshot came in while the query ran and
+                # may not be in its result; they stay due for the next request
+                if full and self._reset_generation <= generation:
+                    self._built_at = time.monotonic()
+                for vehicle_id in dirty:
+                    if self._dirty.get(vehicle_id, generation + 1) <= generation:
+                        del self._dirty[vehicle_id]
+                self._feed_version = version
+        finally:
+            self._build_lock.release()
+
+    def _query(self, horizon_start, horizon_end):
+        # Pending holds already past PENDING_HOLD can never block again until their status changes
+        cutoff = datetime.utcnow() - PENDING_HOLD
+        return db.session.query(
+            Booking.vehicle_id,
+            Booking.start_date,
+            Booking.end_date,
+            Booking.status,
+            Booking.created_at
+        ).filter(
+            or_(
+                Booking.status.in_(BLOCKING_STATUSES),
+                and_(Booking.status == 'pending', Booking.created_at >= cutoff)
+            ),
+            Booking.start_date < horizon_end,
+            Booking.end_date > horizon_start
+        )
+
+    @staticmethod
+    def _load(query):
+        blocking = {}
+        pending = {}
+        for vehicle_id, start, end, status, created_at in query.all():
+            if status == 'pending':
+                pending.setdefault(vehicle_id, []).append((start, end, created_at))
+            else:
+                blocking.setdefault(vehicle_id, []).append((start, end))
+        return {
+            vehicle_id: _VehicleIntervals(blocking.get(vehicle_id, []), pending.get(vehicle_id, []))
+            for vehicle_id in set(blocking) | set(pending)
+        }
+
+
+availability_index = AvailabilityIndex()
@@ -0,0 +1,93 @@
+"""
+Cross-process change feed for the in-memory indexes.
+
+The availability and vehicle search indexes live in each worker process. A write
+in any worker calls ``publish(feed, item_id)``; readers call ``changes(feed,
+since)`` before serving from their index and reload only the ids that changed
+since the version they last saw, so a booking made in one worker is visible to
+searches in every other worker on their next request.
+
+Each feed is a version counter plus one short-lived key per change
+(CHANGE_FEED_RETENTION_SECONDS). A reader that falls more than
+CHANGE_FEED_MAX_GAP versions behind, or finds a change key already expired, gets
+None and rebuilds in full. Publishing ``FULL`` asks every reader to rebuild.
+
+Backends (CHANGE_FEED_BACKEND):
+    local   - nothing is shared (default). Indexes are only exact within one
+              process; see ``shared``
+    redis   - via CHANGE_FEED_REDIS_URL; startup fails if it cannot connect
+    fake    - the shared feed over an in-process fake client, for tests
+"""
+
+from flask import current_app
+
+from app.utils.response_cache import FakeRedis, connect_redis
+
+FULL = '*'
+
+
+def _text(value):
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def _build_client(app):
+    kind = (app.config.get('CHANGE_FEED_BACKEND') or 'local').lower()
+    if kind == 'redis':
+        return connect_redis(app.config.get('CHANGE_FEED_REDIS_URL'), 'CHANGE_FEED_BACKEND')
+    if kind == 'fake':
+        return FakeRedis()
+    return None
+
+
+class ChangeFeed:
+    def init_app(self, app):
+        app.extensions['change_feed'] = _build_client(app)
+
+    @property
+    def client(self):
+        return current_app.extensions.get('change_feed')
+
+    @property
+    def shared(self):
+        """True when writes in other processes reach this one through the feed."""
+        return self.client is not None
+
+    def publish(self, feed, item_id):
+        """Record that ``item_id`` (or ``FULL``) changed in ``feed``."""
+        client = self.client
+        if client is None:
+            return
+        try:
+            version = client.incr(f'feed:{feed}:version')
+            client.set(f'feed:{feed}:{version}', item_id,
+                       ex=current_app.config.get('CHANGE_FEED_RETENTION_SECONDS', 600))
+        except Exception as e:
+            # The write itself succeeded; other processes pick it up on their TTL rebuild
+            current_app.logger.error('Could not publish %s change for %s: %s', feed, item_id, e)
+
+    def changes(self, feed, since):
+        """Return ``(version, ids)`` for the changes after ``since``.
+
+        ``ids`` is None when the reader must rebuild in full: it is too far behind,
+        part of the log already expired or someone published ``FULL``. If the feed is
+        unreachable no changes are reported and readers fall back on their TTL.
+        """
+        client = self.client
+        if client is None:
+            return since, set()
+        try:
+            version = int(_text(client.get(f'feed:{feed}:version')) or 0)
+            if version == since:
+                return version, set()
+            if since is None or version < since or version - since > current_app.config.get('CHANGE_FEED_MAX_GAP', 1000):
+                return version, None
+            ids = {_text(item_id) for item_id in client.mget([f'feed:{feed}:{n}' for n in range(since + 1, version + 1)])}
+            if None in ids or FULL in ids:
+                return version, None
+            return version, ids
+        except Exception as e:
+            current_app.logger.error('Could not read %s changes: %s', feed, e)
+            return since, set()
+
+
+change_feed = ChangeFeed()
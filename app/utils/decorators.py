@@ -3,16 +3,28 @@ Utilities for Flask application
 """
 
 from functools import wraps
-from flask_jwt_extended import verify_jwt_in_request, get_jwt
+from flask_jwt_extended import verify_jwt_in_request, get_jwt, get_jwt_identity
 from flask import jsonify
 
+def _current_role():
+    """Role from the token claims, or from the user's role row for tokens issued without one.
+
+    The login routes issue tokens with the user id alone, so without the lookup
+    both decorators below would turn every user away.
+    """
+    claims = get_jwt()
+    if claims.get('role'):
+        return claims['role']
+    from app.models.user import UserRoleModel
+    user_role = UserRoleModel.query.filter_by(user_id=get_jwt_identity()).first()
+    return user_role.role if user_role else None
+
 def admin_required(fn):
     """Decorator to check if user is admin"""
     @wraps(fn)
     def wrapper(*args, **kwargs):
         verify_jwt_in_request()
-        claims = get_jwt()
-        if claims.get('role') != 'admin':
+        if _current_role() != 'admin':
             return jsonify({'error': 'Admin access required'}), 403
         return fn(*args, **kwargs)
     return wrapper
@@ -22,8 +34,7 @@ def agency_required(fn):
     @wraps(fn)
     def wrapper(*args, **kwargs):
         verify_jwt_in_request()
-        claims = get_jwt()
-        if claims.get('role') not in ['agency', 'admin']:
+        if _current_role() not in ['agency', 'admin']:
             return jsonify({'error': 'Agency access required'}), 403
         return fn(*args, **kwargs)
     return wrapper
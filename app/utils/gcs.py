@@ -0,0 +1,236 @@
+"""
+Shared Google Cloud Storage access.
+
+The storage client (and its authorized HTTP session) is built once per process on
+first use instead of per request, so the service-account JSON is read once and
+connections to storage.googleapis.com are reused.
+
+``upload_files`` sends several files concurrently on a bounded thread pool
+(GCS_UPLOAD_WORKERS). Each object is made public in the upload request itself
+(GCS_UPLOAD_ACL, default publicRead) rather than with a second ACL call; set
+GCS_UPLOAD_ACL to an empty string for buckets that grant public read through
+uniform bucket-level access. Files up to GCS_UPLOAD_CHUNK_SIZE_MB go up in a single
+multipart request; larger ones are streamed as a resumable upload in chunks of that
+size, so one upload never buffers more than a chunk in memory.
+
+``generate_upload_url`` signs a V4 PUT URL so clients can send file bytes straight
+to the bucket; ``get_object_info`` reads back what actually arrived. Signing uses the
+service-account key when there is one, otherwise the IAM signBlob API with the
+runtime service account's access token.
+
+Objects under PRIVATE_PREFIXES (identity documents under kyc/) are uploaded with a
+private ACL on both paths and read through ``generate_download_url``, a signed GET
+valid for GCS_PRIVATE_URL_EXPIRY_SECONDS. Buckets with uniform bucket-level access
+(GCS_UPLOAD_ACL empty) cannot set per-object ACLs, so they must not grant public
+read at all. ``make_private`` revokes public access from objects uploaded earlier.
+
+Setting STORAGE_EMULATOR_HOST points the client at a local fake GCS server.
+"""
+
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from flask import current_app
+
+# Attempt to import GCS client; if missing, defer error until runtime and allow app to start.
+try:
+    from google.cloud import storage  # type: ignore
+    from google.auth.credentials import Signing  # type: ignore
+    from google.auth.transport.requests import Request as AuthRequest  # type: ignore
+    gcs_available = True
+except Exception:
+    storage = None
+    Signing = AuthRequest = None
+    gcs_available = False
+
+GCS_BUCKET = os.getenv('GCS_BUCKET')
+GCS_SERVICE_ACCOUNT_FILE = os.getenv('GCS_SERVICE_ACCOUNT_FILE', os.path.join(os.path.dirname(os.path.dirname(__file__)), 'leafy-guide-474311-u3-0328c0e70b35.json'))
+
+CHUNK_ALIGNMENT = 256 * 1024
+PRIVATE_PREFIXES = ('kyc/',)
+
+_client = None
+_bucket = None
+_executor = None
+_lock = threading.Lock()
+
+
+def get_bucket():
+    """Return the process-wide Bucket for GCS_BUCKET, creating the client on first use."""
+    global _client, _bucket
+    if _bucket is None:
+        with _lock:
+            if _bucket is None:
+                if GCS_SERVICE_ACCOUNT_FILE and os.path.exists(GCS_SERVICE_ACCOUNT_FILE) and not os.getenv('STORAGE_EMULATOR_HOST'):
+                    _client = storage.Client.from_service_account_json(GCS_SERVICE_ACCOUNT_FILE)
+                else:
+                    _client = storage.Client()
+                _bucket = _client.bucket(GCS_BUCKET)
+    return _bucket
+
+
+def _pool():
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=current_app.config.get('GCS_UPLOAD_WORKERS', 8),
+                    thread_name_prefix='gcs-upload'
+                )
+    return _executor
+
+
+def _stream_size(stream):
+    try:
+        position = stream.tell()
+        stream.seek(0, os.SEEK_END)
+        size = stream.tell() - position
+        stream.seek(position)
+        return size
+    except (AttributeError, OSError, ValueError):
+        return None
+
+
+def is_private(blob_path):
+    return blob_path.startswith(PRIVATE_PREFIXES)
+
+
+def _acl_for(blob_path):
+    acl = current_app.config.get('GCS_UPLOAD_ACL', 'publicRead')
+    # An empty ACL means uniform bucket-level access, where objects cannot carry their own
+    if acl and is_private(blob_path):
+        return 'private'
+    return acl
+
+
+def _upload_one(bucket, blob_path, stream, content_type, acl, chunk_size, skip_existing):
+    size = _stream_size(stream)
+    # Multipart uploads are read into memory whole, so anything over one chunk is resumable
+    blob = bucket.blob(blob_path, chunk_size=chunk_size if size is None or size > chunk_size else None)
+    if not (skip_existing and blob.exists()):
+        blob.upload_from_file(stream, size=size, content_type=content_type, predefined_acl=acl or None)
+    return blob.public_url
+
+
+def upload_files(items, skip_existing=False):
+    """Upload ``(blob_path, stream, content_type)`` items concurrently.
+
+    Returns the public URLs in the same order. With ``skip_existing`` objects that
+    are already in the bucket are left as they are. If any upload fails the first
+    error is raised after the others finish.
+    """
+    config = current_app.config
+    bucket = get_bucket()
+    chunk_mb = config.get('GCS_UPLOAD_CHUNK_SIZE_MB', 8)
+    chunk_size = max(CHUNK_ALIGNMENT, int(chunk_mb * 1024 * 1024) // CHUNK_ALIGNMENT * CHUNK_ALIGNMENT)
+
+    if len(items) == 1:
+        blob_path, stream, content_type = items[0]
+        return [_upload_one(bucket, blob_path, stream, content_type, _acl_for(blob_path), chunk_size, skip_existing)]
+
+    futures = [
+        _pool().submit(_upload_one, bucket, blob_path, stream, content_type, _acl_for(blob_path), chunk_size,
+                       skip_existing)
+        for blob_path, stream, content_type in items
+    ]
+    urls = []
+    error = None
+    for future in futures:
+        try:
+            urls.append(future.result())
+        except Exception as e:
+            error = error or e
+    if error is not None:
+        raise error
+    return urls
+
+
+def _xml_acl(acl):
+    """Translate a JSON API predefined ACL (publicRead) to its XML header form (public-read)."""
+    return re.sub(r'(?<!^)(?=[A-Z])', '-', acl).lower()
+
+
+def _signing_kwargs():
+    credentials = _client._credentials
+    if isinstance(credentials, Signing):
+        return {}
+    # Metadata-server credentials cannot sign locally; let GCS sign through IAM signBlob
+    with _lock:
+        if not credentials.valid:
+            credentials.refresh(AuthRequest())
+    return {'service_account_email': credentials.service_account_email, 'access_token': credentials.token}
+
+
+def generate_upload_url(blob_path, content_type, max_bytes):
+    """Return ``(url, headers, expires_at)`` for a signed V4 PUT of ``blob_path``.
+
+    The client must send exactly ``headers`` with the PUT; GCS rejects a different
+    Content-Type or a body larger than ``max_bytes``.
+    """
+    config = current_app.config
+    bucket = get_bucket()
+    expires_in = timedelta(seconds=config.get('GCS_SIGNED_URL_EXPIRY_SECONDS', 900))
+    headers = {
+        'Content-Type': content_type,
+        'x-goog-content-length-range': f'0,{max_bytes}',
+    }
+    acl = _acl_for(blob_path)
+    if acl:
+        headers['x-goog-acl'] = _xml_acl(acl)
+
+    kwargs = _signing_kwargs()
+    emulator = os.getenv('STORAGE_EMULATOR_HOST')
+    if emulator:
+        kwargs['api_access_endpoint'] = emulator
+    url = bucket.blob(blob_path).generate_signed_url(
+        version='v4',
+        method='PUT',
+        expiration=expires_in,
+        content_type=content_type,
+        headers={k: v for k, v in headers.items() if k != 'Content-Type'},
+        **kwargs
+    )
+    return url, headers, expires_in
+
+
+def generate_download_url(blob_path):
+    """Return ``(url, expires_in)`` for a signed V4 GET of ``blob_path``."""
+    bucket = get_bucket()
+    expires_in = timedelta(seconds=current_app.config.get('GCS_PRIVATE_URL_EXPIRY_SECONDS', 300))
+    kwargs = _signing_kwargs()
+    emulator = os.getenv('STORAGE_EMULATOR_HOST')
+    if emulator:
+        kwargs['api_access_endpoint'] = emulator
+    url = bucket.blob(blob_path).generate_signed_url(version='v4', method='GET', expiration=expires_in, **kwargs)
+    return url, expires_in
+
+
+def make_private(prefix):
+    """Apply the private ACL to every object under ``prefix``; returns how many were changed."""
+    count = 0
+    for blob in get_bucket().list_blobs(prefix=prefix):
+        blob.make_private()
+        count += 1
+    return count
+
+
+def get_object_info(blob_path, sniff_bytes=16):
+    """Return ``(size, content_type, head_bytes, public_url)`` for an object, or None if absent."""
+    blob = get_bucket().get_blob(blob_path)
+    if blob is None:
+        return None
+    # Read the metadata first: a download refreshes blob properties from its response headers
+    size, content_type = blob.size, blob.content_type
+    head = blob.download_as_bytes(start=0, end=sniff_bytes - 1) if size else b''
+    return size, content_type, head, blob.public_url
+
+
+def delete_object(blob_path):
+    try:
+        get_bucket().blob(blob_path).delete()
+    except Exception as e:
+        current_app.logger.warning('Could not delete gs://%s/%s: %s', GCS_BUCKET, blob_path, e)
@@ -0,0 +1,172 @@
+"""
+Google ID token verification.
+
+Tokens are verified in process: the RS256 signature is checked against Google's
+published signing keys (GOOGLE_CERTS_URL), then the issuer, audience
+(GOOGLE_CLIENT_IDS) and expiry. The keys are cached for as long as the
+Cache-Control max-age on the certs response allows, so a login on a warm cache makes
+no external call. A token signed with a key id we have not seen triggers an early
+refresh (at most once per KEY_REFRESH_MIN_INTERVAL seconds) to pick up rotations.
+
+If the keys cannot be fetched and nothing is cached, or RS256 support
+(``cryptography``) is not installed, verification falls back to Google's tokeninfo
+endpoint. GOOGLE_TOKEN_VERIFICATION=tokeninfo forces the fallback.
+"""
+
+import re
+import threading
+import time
+
+import jwt
+from flask import current_app
+from jwt.algorithms import has_crypto
+
+from app.utils.http_client import get_client
+
+GOOGLE_ISSUERS = ('accounts.google.com', 'https://accounts.google.com')
+TOKENINFO_URL = 'https://oauth2.googleapis.com/tokeninfo'
+DEFAULT_KEYS_MAX_AGE = 3600
+KEY_REFRESH_MIN_INTERVAL = 60
+CLOCK_SKEW_SECONDS = 60
+
+_MAX_AGE_RE = re.compile(r'max-age=(\d+)')
+_audience_warning_logged = False
+
+
+class GoogleTokenError(Exception):
+    """The ID token is malformed, expired, or not issued by Google for this app."""
+
+
+class SigningKeysUnavailable(Exception):
+    """Google's signing keys could not be fetched and none are cached."""
+
+
+class GoogleKeyCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._keys = {}
+        self._expires_at = 0.0
+        self._fetched_at = None
+
+    def get_key(self, kid, certs_url):
+        key = self._keys.get(kid)
+        if key is not None and time.monotonic() < self._expires_at:
+            return key
+
+        with self._lock:
+            now = time.monotonic()
+            key = self._keys.get(kid)
+            expired = now >= self._expires_at
+            if key is not None and not expired:
+                return key
+            # An unknown kid only forces a refresh once per interval, so a stream of
+            # forged tokens cannot turn into a stream of requests to Google
+            recently_fetched = self._fetched_at is not None and now - self._fetched_at < KEY_REFRESH_MIN_INTERVAL
+            if expired or not recently_fetched:
+                try:
+                    self._refresh(certs_url)
+                except Exception as e:
+                    if not self._keys:
+                        raise SigningKeysUnavailable(str(e)) from e
+                    current_app.logger.warning('Refreshing Google signing keys failed, using cached keys: %s', e)
+            key = self._keys.get(kid)
+
+        if key is None:
+            raise GoogleTokenError('Unknown signing key')
+        return key
+
+    def _refresh(self, certs_url):
+        resp = get_client('google').get(certs_url)
+        resp.raise_for_status()
+        keys = {}
+        for jwk in resp.json().get('keys', []):
+            if jwk.get('kty') == 'RSA' and jwk.get('kid'):
+                keys[jwk['kid']] = jwt.PyJWK(jwk, algorithm='RS256').key
+
+        max_age = DEFAULT_KEYS_MAX_AGE
+        match = _MAX_AGE_RE.search(resp.headers.get('Cache-Control', ''))
+        if match:
+            max_age = int(match.group(1))
+        try:
+            max_age -= int(resp.headers.get('Age', 0))
+        except ValueError:
+            pass
+
+        now = time.monotonic()
+        self._keys = keys
+        self._fetched_at = now
+        self._expires_at = now + max(0, max_age)
+
+    def clear(self):
+        with self._lock:
+            self._keys = {}
+            self._expires_at = 0.0
+            self._fetched_at = None
+
+
+key_cache = GoogleKeyCache()
+
+
+def _audiences():
+    return [c.strip() for c in current_app.config.get('GOOGLE_CLIENT_IDS', '').split(',') if c.strip()]
+
+
+def _check_audience(aud):
+    global _audience_warning_logged
+    audiences = _audiences()
+    if not audiences:
+        if not _audience_warning_logged:
+            current_app.logger.warning('GOOGLE_CLIENT_IDS is not set; Google ID token audience is not checked')
+            _audience_warning_logged = True
+        return
+    if aud not in audiences:
+        raise GoogleTokenError('Token was issued for another client')
+
+
+def _verify_locally(id_token):
+    try:
+        header = jwt.get_unverified_header(id_token)
+    except jwt.PyJWTError as e:
+        raise GoogleTokenError(str(e)) from e
+    if header.get('alg') != 'RS256':
+        raise GoogleTokenError('Unexpected signing algorithm')
+
+    key = key_cache.get_key(header.get('kid'), current_app.config['GOOGLE_CERTS_URL'])
+    try:
+        claims = jwt.decode(
+            id_token,
+            key,
+            algorithms=['RS256'],
+            leeway=CLOCK_SKEW_SECONDS,
+            options={'verify_aud': False, 'require': ['exp', 'iat', 'iss', 'aud', 'sub']}
+        )
+    except jwt.PyJWTError as e:
+        raise GoogleTokenError(str(e)) from e
+
+    if claims.get('iss') not in GOOGLE_ISSUERS:
+        raise GoogleTokenError('Token was not issued by Google')
+    _check_audience(claims.get('aud'))
+    return claims
+
+
+def _verify_with_tokeninfo(id_token):
+    resp = get_client('google').get(TOKENINFO_URL, params={'id_token': id_token})
+    if resp.status_code != 200:
+        raise GoogleTokenError('Rejected by tokeninfo')
+    claims = resp.json()
+    _check_audience(claims.get('aud'))
+    return claims
+
+
+def verify_google_id_token(id_token):
+    """Return the claims of a valid Google ID token (email, sub, email_verified, name, picture, ...).
+
+    Raises GoogleTokenError for an invalid token; network errors from the tokeninfo
+    fallback propagate.
+    """
+    if current_app.config.get('GOOGLE_TOKEN_VERIFICATION', 'local') == 'local' and has_crypto:
+        try:
+            return _verify_locally(id_token)
+        except SigningKeysUnavailable as e:
+            current_app.logger.warning('Google signing keys unavailable, falling back to tokeninfo: %s', e)
+    return _verify_with_tokeninfo(id_token)
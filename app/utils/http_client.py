@@ -0,0 +1,273 @@
+"""
+Shared outbound HTTP clients.
+
+Each external service (ZeptoMail, Razorpay, Google) gets one long-lived
+``requests.Session`` whose connection pool keeps TLS connections to the host
+alive between calls, instead of a new handshake per ``requests.post``. On top of
+the session every ``ServiceClient`` adds:
+
+* default (connect, read) timeouts, so no call can pin a worker thread forever;
+* retries with a budget: each request earns a fraction of a retry token and a
+  retry spends a whole one, so retries stay below HTTP_RETRY_BUDGET_RATIO of
+  traffic even while the service is struggling. Non-idempotent requests are
+  retried only when the connection was never established;
+* a circuit breaker that fails fast with CircuitOpenError after
+  HTTP_CIRCUIT_FAILURE_THRESHOLD consecutive failures (connection errors,
+  timeouts, 5xx) and lets a single probe through after HTTP_CIRCUIT_RESET_SECONDS;
+* per-host latency histograms, served to admins at GET /api/health/http.
+"""
+
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from flask import current_app, jsonify
+
+from app.utils.decorators import admin_required
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+
+IDEMPOTENT_METHODS = frozenset({'GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'})
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+# Per-service defaults; timeouts are (connect, read) seconds
+SERVICES = {
+    'zeptomail': {'read_timeout': 10, 'max_retries': 1},
+    'razorpay': {'read_timeout': 15, 'max_retries': 1},
+    'google': {'read_timeout': 5, 'max_retries': 2},
+}
+
+
+class CircuitOpenError(requests.ConnectionError):
+    """Raised instead of calling a service whose circuit breaker is open."""
+
+
+class LatencyHistogram:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self._total = 0
+        self._sum_ms = 0.0
+
+    def observe(self, elapsed_ms):
+        index = len(LATENCY_BUCKETS_MS)
+        for i, bound in enumerate(LATENCY_BUCKETS_MS):
+            if elapsed_ms <= bound:
+                index = i
+                break
+        with self._lock:
+            self._counts[index] += 1
+            self._total += 1
+            self._sum_ms += elapsed_ms
+
+    def snapshot(self):
+        with self._lock:
+            counts = list(self._counts)
+            total = self._total
+            sum_ms = self._sum_ms
+        buckets = {f'le_{bound}ms': counts[i] for i, bound in enumerate(LATENCY_BUCKETS_MS)}
+        buckets['gt_10000ms'] = counts[-1]
+        return {
+            'count': total,
+            'avg_ms': round(sum_ms / total, 2) if total else 0,
+            'buckets': buckets,
+        }
+
+
+class RetryBudget:
+    """Token bucket: every request deposits ``ratio`` tokens, every retry withdraws one."""
+
+    def __init__(self, ratio, max_tokens=10.0):
+        self._lock = threading.Lock()
+        self._ratio = ratio
+        self._max_tokens = max_tokens
+        self._tokens = max_tokens
+
+    def deposit(self):
+        with self._lock:
+            self._tokens = min(self._max_tokens, self._tokens + self._ratio)
+
+    def try_withdraw(self):
+        with self._lock:
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold, reset_seconds):
+        self._lock = threading.Lock()
+        self._failure_threshold = failure_threshold
+        self._reset_seconds = reset_seconds
+        self._failures = 0
+        self._opened_at = None
+        self._probe_in_flight = False
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._opened_at is None:
+                return 'closed'
+            if time.monotonic() - self._opened_at >= self._reset_seconds:
+                return 'half_open'
+            return 'open'
+
+    def before_call(self, service):
+        with self._lock:
+            if self._opened_at is None:
+                return
+            if time.monotonic() - self._opened_at < self._reset_seconds or self._probe_in_flight:
+                raise CircuitOpenError(f'{service} circuit is open')
+            self._probe_in_flight = True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._probe_in_flight or self._failures >= self._failure_threshold:
+                self._opened_at = time.monotonic()
+            self._probe_in_flight = False
+
+    def release_probe(self):
+        """End a half-open probe whose outcome says nothing about the service."""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def snapshot(self):
+        state = self.state
+        with self._lock:
+            return {'state': state, 'consecutive_failures': self._failures}
+
+
+def _never_connected(exc):
+    if isinstance(exc, requests.ConnectTimeout):
+        return True
+    reason = getattr(exc.args[0], 'reason', None) if exc.args else None
+    return isinstance(reason, NewConnectionError)
+
+
+class ServiceClient:
+    def __init__(self, name, connect_timeout, read_timeout, max_retries, pool_maxsize,
+                 budget_ratio, failure_threshold, reset_seconds):
+        self.name = name
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_maxsize, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.budget = RetryBudget(budget_ratio)
+        self.breaker = CircuitBreaker(failure_threshold, reset_seconds)
+        self._histograms = {}
+        self._histograms_lock = threading.Lock()
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def request(self, method, url, **kwargs):
+        method = method.upper()
+        kwargs.setdefault('timeout', self.timeout)
+        histogram = self._histogram(urlsplit(url).netloc)
+        self.budget.deposit()
+        attempt = 0
+        while True:
+            self.breaker.before_call(self.name)
+            started = time.monotonic()
+            try:
+                response = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as exc:
+                histogram.observe((time.monotonic() - started) * 1000)
+                self.breaker.record_failure()
+                retryable = method in IDEMPOTENT_METHODS or _never_connected(exc)
+                if retryable and self._may_retry(attempt):
+                    attempt += 1
+                    continue
+                raise
+            except requests.RequestException:
+                # e.g. a truncated or undecodable body: the service misbehaved
+                histogram.observe((time.monotonic() - started) * 1000)
+                self.breaker.record_failure()
+                raise
+            except BaseException:
+                # Not the service's fault (bad arguments, interrupted), but the probe must not stay claimed
+                self.breaker.release_probe()
+                raise
+            histogram.observe((time.monotonic() - started) * 1000)
+
+            if response.status_code >= 500:
+                self.breaker.record_failure()
+                if method in IDEMPOTENT_METHODS and self._may_retry(attempt):
+                    response.close()
+                    attempt += 1
+                    continue
+            else:
+                self.breaker.record_success()
+            return response
+
+    def _may_retry(self, attempt):
+        if attempt >= self.max_retries or not self.budget.try_withdraw():
+            return False
+        time.sleep(min(1.0, 0.1 * 2 ** attempt))
+        return True
+
+    def _histogram(self, host):
+        histogram = self._histograms.get(host)
+        if histogram is None:
+            with self._histograms_lock:
+                histogram = self._histograms.setdefault(host, LatencyHistogram())
+        return histogram
+
+    def stats(self):
+        with self._histograms_lock:
+            hosts = dict(self._histograms)
+        return {
+            'circuit': self.breaker.snapshot(),
+            'hosts': {host: histogram.snapshot() for host, histogram in hosts.items()},
+        }
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_client(name):
+    """Return the shared client for service ``name`` (one of SERVICES)."""
+    client = _clients.get(name)
+    if client is not None:
+        return client
+    with _clients_lock:
+        client = _clients.get(name)
+        if client is None:
+            config = current_app.config
+            defaults = SERVICES[name]
+            client = ServiceClient(
+                name,
+                connect_timeout=config.get('HTTP_CONNECT_TIMEOUT_SECONDS', 3.05),
+                read_timeout=defaults['read_timeout'],
+                max_retries=defaults['max_retries'],
+                pool_maxsize=config.get('HTTP_POOL_MAXSIZE', 10),
+                budget_ratio=config.get('HTTP_RETRY_BUDGET_RATIO', 0.2),
+                failure_threshold=config.get('HTTP_CIRCUIT_FAILURE_THRESHOLD', 5),
+                reset_seconds=config.get('HTTP_CIRCUIT_RESET_SECONDS', 30),
+            )
+            _clients[name] = client
+    return client
+
+
+def init_http_clients(app):
+    @app.route('/api/health/http', methods=['GET'])
+    @admin_required
+    def http_client_stats():
+        with _clients_lock:
+            clients = dict(_clients)
+        return jsonify({name: client.stats() for name, client in clients.items()}), 200
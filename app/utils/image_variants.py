@@ -0,0 +1,355 @@
+"""
+Resized WebP/AVIF variants of vehicle photos and agency logos.
+
+Listing cards show images a few hundred pixels wide, so serving the uploaded
+original makes mobile clients download multi-MB photos. When an image is stored,
+``enqueue_image_variants`` records its URL in ``image_variants``. Variant workers
+(IMAGE_VARIANT_THREADS per process, or ``flask image-variants``) claim pending rows
+in batches, decode and re-encode the originals in parallel on a process pool of
+IMAGE_VARIANT_PROCESSES (0 renders inline), store the results next to each
+original under ``<folder>/variants/<size>/`` and mark the row ready.
+
+Sizes (IMAGE_VARIANT_SIZES, longest edge in pixels, never upscaled) default to
+thumb:320, card:640 and full:1600. Formats (IMAGE_VARIANT_FORMATS) default to webp
+and avif; avif is skipped when Pillow was built without it. ``variant_urls`` looks
+up the ready variants for a page of images in one query.
+
+Needs Pillow; without it nothing is queued and listings keep the originals.
+"""
+
+import io
+import json
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import and_, or_
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+from app.models.agency import Agency
+from app.models.image_variant import ImageVariant
+from app.models.vehicle import VehicleImage
+from app.utils.response_cache import response_cache
+from app.utils.storage import file_storage
+
+try:
+    from PIL import Image, ImageOps, features  # type: ignore
+    pil_available = True
+except Exception:
+    Image = ImageOps = features = None
+    pil_available = False
+
+IMAGE_EXTENSIONS = frozenset({'jpg', 'jpeg', 'png', 'webp', 'avif'})
+ENCODER_OPTIONS = {
+    'webp': {'method': 4},
+    'avif': {'speed': 8},
+}
+
+_wakeup = threading.Event()
+_workers = []
+_workers_lock = threading.Lock()
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _sizes(config):
+    sizes = []
+    for item in config.get('IMAGE_VARIANT_SIZES', 'thumb:320,card:640,full:1600').split(','):
+        name, _, px = item.strip().partition(':')
+        if name and px:
+            sizes.append((name, int(px)))
+    return sizes
+
+
+def _formats(config):
+    formats = [f.strip().lower() for f in config.get('IMAGE_VARIANT_FORMATS', 'webp,avif').split(',') if f.strip()]
+    available = []
+    for fmt in formats:
+        try:
+            if features.check(fmt):
+                available.append(fmt)
+        except ValueError:
+            current_app.logger.warning('Unknown image variant format %s; skipping it', fmt)
+    return available
+
+
+def render_variants(data, sizes, formats, quality):
+    """Decode ``data`` once and return ``{size name: {format: encoded bytes}}``.
+
+    Runs in a pool process. Each size is scaled down from the previous, larger one.
+    """
+    with Image.open(io.BytesIO(data)) as original:
+        largest = max(px for _, px in sizes)
+        # JPEGs can decode at a reduced scale, which is much faster for large photos
+        original.draft('RGB', (largest, largest))
+        image = ImageOps.exif_transpose(original)
+        if image.mode not in ('RGB', 'RGBA'):
+            has_alpha = 'A' in image.getbands() or 'transparency' in image.info
+            image = image.convert('RGBA' if has_alpha else 'RGB')
+
+        rendered = {}
+        for name, px in sorted(sizes, key=lambda size: size[1], reverse=True):
+            image = image.copy()
+            image.thumbnail((px, px), Image.LANCZOS)
+            rendered[name] = {}
+            for fmt in formats:
+                buf = io.BytesIO()
+                image.save(buf, format=fmt.upper(), quality=quality, **ENCODER_OPTIONS.get(fmt, {}))
+                rendered[name][fmt] = buf.getvalue()
+        return rendered
+
+
+def _pool(workers):
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                # spawn for the same reason as password hashing: forking a threaded process can copy held locks
+                _executor = ProcessPoolExecutor(
+                    max_workers=workers,
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+    return _executor
+
+
+def _reset_pool(broken):
+    global _executor
+    with _executor_lock:
+        if _executor is broken:
+            _executor = None
+    broken.shutdown(wait=False)
+
+
+def _render_all(sources, sizes, formats, quality):
+    """Render ``{row id: original bytes}``; returns ``{row id: variants or the exception}``."""
+    workers = current_app.config.get('IMAGE_VARIANT_PROCESSES', 2)
+    results = {}
+    if workers <= 0:
+        for row_id, data in sources.items():
+            try:
+                results[row_id] = render_variants(data, sizes, formats, quality)
+            except Exception as e:
+                results[row_id] = e
+        return results
+
+    executor = _pool(workers)
+    futures = {row_id: executor.submit(render_variants, data, sizes, formats, quality) for row_id, data in sources.items()}
+    for row_id, future in futures.items():
+        try:
+            results[row_id] = future.result()
+        except BrokenProcessPool as e:
+            current_app.logger.warning('Image variant pool broke; recreating it')
+            _reset_pool(executor)
+            results[row_id] = e
+        except Exception as e:
+            results[row_id] = e
+    return results
+
+
+def enqueue_image_variants(urls):
+    """Queue variant generation for the stored images among ``urls``. Returns how many were new.
+
+    URLs outside the configured storage, non-image files and URLs already queued are
+    skipped. Call it after the request's own commit; a failure here is logged, not raised.
+    """
+    if not pil_available:
+        return 0
+    backend = file_storage.backend
+    urls = {
+        url for url in urls
+        if url and len(url) <= 255 and backend.key_for_url(url)
+        and url.rsplit('.', 1)[-1].lower() in IMAGE_EXTENSIONS
+    }
+    if not urls:
+        return 0
+    added = 0
+    try:
+        known = {url for (url,) in db.session.query(ImageVariant.source_url).filter(ImageVariant.source_url.in_(urls))}
+        for url in urls - known:
+            try:
+                with db.session.begin_nested():
+                    db.session.add(ImageVariant(source_url=url))
+                added += 1
+            except IntegrityError:
+                # Queued by a concurrent request
+                pass
+        db.session.commit()
+    except Exception as e:
+        # The image itself is stored; listings fall back to it
+        db.session.rollback()
+        current_app.logger.warning('Could not queue image variants: %s', e)
+        return 0
+    if added:
+        _wakeup.set()
+    return added
+
+
+def backfill_image_variants():
+    """Queue every vehicle image and agency logo that has no variants yet."""
+    urls = {url for (url,) in db.session.query(VehicleImage.image_url).distinct()}
+    urls |= {url for (url,) in db.session.query(Agency.business_photo_url).filter(Agency.business_photo_url.isnot(None))}
+    urls = sorted(urls)
+    return sum(enqueue_image_variants(urls[i:i + 500]) for i in range(0, len(urls), 500))
+
+
+def variant_urls(urls):
+    """Return ``{source url: {size: {format: url}}}`` for the ready variants among ``urls``."""
+    urls = {url for url in urls if url}
+    if not urls:
+        return {}
+    rows = db.session.query(ImageVariant.source_url, ImageVariant.variants).filter(
+        ImageVariant.source_url.in_(urls), ImageVariant.status == 'ready'
+    ).all()
+    return {source_url: json.loads(variants) for source_url, variants in rows if variants}
+
+
+def pick_variant(variants, url, size, fmt='webp'):
+    """URL of the ``size`` variant of ``url`` (``fmt`` preferred), or ``url`` itself when there is none."""
+    by_format = (variants.get(url) or {}).get(size) or {}
+    return by_format.get(fmt) or next(iter(by_format.values()), None) or url
+
+
+def _claimable(now):
+    stale = now - timedelta(seconds=current_app.config.get('IMAGE_VARIANT_LOCK_TIMEOUT_SECONDS', 600))
+    return or_(
+        and_(ImageVariant.status == 'pending', ImageVariant.next_attempt_at <= now),
+        and_(ImageVariant.status == 'processing', ImageVariant.locked_at < stale)
+    )
+
+
+def _claim_batch(limit):
+    now = datetime.utcnow()
+    candidates = db.session.query(ImageVariant.id).filter(
+        _claimable(now)
+    ).order_by(ImageVariant.next_attempt_at.asc()).limit(limit).all()
+
+    claimed = []
+    for (row_id,) in candidates:
+        updated = ImageVariant.query.filter(
+            ImageVariant.id == row_id, _claimable(now)
+        ).update({
+            ImageVariant.status: 'processing',
+            ImageVariant.locked_at: now,
+        }, synchronize_session=False)
+        if updated:
+            claimed.append(row_id)
+    db.session.commit()
+    return claimed
+
+
+def process_image_variants(batch_size=None):
+    """Render and store variants for one batch of queued images. Returns the number claimed."""
+    config = current_app.config
+    claimed = _claim_batch(batch_size or config.get('IMAGE_VARIANT_BATCH_SIZE', 16))
+    if not claimed:
+        return 0
+
+    rows = ImageVariant.query.filter(ImageVariant.id.in_(claimed)).all()
+    now = datetime.utcnow()
+    max_attempts = config.get('IMAGE_VARIANT_MAX_ATTEMPTS', 3)
+    retry_seconds = config.get('IMAGE_VARIANT_RETRY_SECONDS', 60)
+
+    def retry_later(row, error, permanent=False):
+        row.last_error = error
+        if permanent or row.attempts >= max_attempts:
+            row.status = 'failed'
+        else:
+            row.status = 'pending'
+            row.next_attempt_at = now + timedelta(seconds=retry_seconds * row.attempts)
+
+    backend = file_storage.backend
+    ready = False
+    keys = {}
+    sources = {}
+    for row in rows:
+        row.attempts = (row.attempts or 0) + 1
+        row.locked_at = None
+        key = backend.key_for_url(row.source_url)
+        if key is None:
+            retry_later(row, 'Image is not in the configured storage', permanent=True)
+            continue
+        try:
+            sources[row.id] = backend.read(key)
+            keys[row.id] = key
+        except Exception as e:
+            retry_later(row, f'Could not read original: {e}')
+
+    sizes = _sizes(config)
+    rendered = _render_all(sources, sizes, _formats(config), config.get('IMAGE_VARIANT_QUALITY', 80))
+    sources.clear()
+
+    for row in rows:
+        result = rendered.get(row.id)
+        if result is None:
+            continue
+        if isinstance(result, Exception):
+            # Undecodable or oversized images will not get better on retry
+            permanent = isinstance(result, (Image.UnidentifiedImageError, Image.DecompressionBombError))
+            retry_later(row, f'Could not render variants: {result}', permanent=permanent)
+            continue
+        folder = keys[row.id].rsplit('/', 1)[0]
+        names = [(name, fmt) for name, by_format in result.items() for fmt in by_format]
+        try:
+            urls = file_storage.put_many([
+                (f'{folder}/variants/{name}', io.BytesIO(result[name][fmt]), fmt, f'image/{fmt}')
+                for name, fmt in names
+            ])
+        except Exception as e:
+            retry_later(row, f'Could not store variants: {e}')
+            continue
+        variants = {}
+        for (name, fmt), url in zip(names, urls):
+            variants.setdefault(name, {})[fmt] = url
+        row.variants = json.dumps(variants)
+        row.status = 'ready'
+        row.processed_at = now
+        row.last_error = None
+        ready = True
+    db.session.commit()
+    if ready:
+        # Vehicle detail embeds the variant URLs
+        response_cache.invalidate('vehicles')
+    return len(claimed)
+
+
+def run_image_variants(app, stop_event=None):
+    """Process queued images until ``stop_event`` is set."""
+    poll = app.config.get('IMAGE_VARIANT_POLL_SECONDS', 5)
+    while stop_event is None or not stop_event.is_set():
+        with app.app_context():
+            try:
+                processed = process_image_variants()
+            except Exception:
+                app.logger.exception('Image variant batch failed')
+                processed = 0
+            finally:
+                db.session.remove()
+        if not processed:
+            _wakeup.wait(poll)
+            _wakeup.clear()
+
+
+def init_image_variants(app):
+    """Start IMAGE_VARIANT_THREADS variant workers in this process on its first request."""
+    threads = app.config.get('IMAGE_VARIANT_THREADS', 1)
+    if threads <= 0 or not pil_available:
+        return
+
+    @app.before_request
+    def _start_image_variant_workers():
+        if len(_workers) >= threads:
+            return
+        with _workers_lock:
+            while len(_workers) < threads:
+                worker = threading.Thread(
+                    target=run_image_variants,
+                    args=(app,),
+                    name=f'image-variants-{len(_workers) + 1}',
+                    daemon=True
+                )
+                worker.start()
+                _workers.append(worker)
@@ -0,0 +1,41 @@
+from app import db
+from app.models.agency import Agency
+from app.models.vehicle import Vehicle, VehicleImage
+
+
+def backfill_vehicle_listing_cache(batch_size: int = 500) -> int:
+    """Populate Vehicle.primary_image_url/agency_name/agency_logo_url/geohash for every vehicle.
+
+    Works through the vehicles table in id order, loading images and agencies for
+    each batch with IN queries. Returns the number of vehicles processed.
+    """
+    processed = 0
+    last_id = None
+    while True:
+        query = Vehicle.query.order_by(Vehicle.id.asc())
+        if last_id is not None:
+            query = query.filter(Vehicle.id > last_id)
+        vehicles = query.limit(batch_size).all()
+        if not vehicles:
+            break
+
+        vehicle_ids = [v.id for v in vehicles]
+        images_by_vehicle = {}
+        for image in VehicleImage.query.filter(VehicleImage.vehicle_id.in_(vehicle_ids)).all():
+            images_by_vehicle.setdefault(image.vehicle_id, []).append(image)
+
+        agency_ids = {v.agency_id for v in vehicles if v.agency_id}
+        agencies = {}
+        if agency_ids:
+            agencies = {a.id: a for a in Agency.query.filter(Agency.id.in_(agency_ids)).all()}
+
+        for vehicle in vehicles:
+            vehicle.refresh_primary_image(images_by_vehicle.get(vehicle.id, []))
+            vehicle.refresh_agency_summary(agencies.get(vehicle.agency_id))
+            vehicle.refresh_geohash()
+
+        db.session.commit()
+        processed += len(vehicles)
+        last_id = vehicle_ids[-1]
+
+    return processed
@@ -1,319 +1,203 @@
+"""
+Outbound e-mail through the ZeptoMail API.
+
+The ``send_*`` helpers render a message and add it to the e-mail outbox
+(see app.utils.mail_queue); request handlers never wait on the provider.
+``deliver_email`` performs the actual API call and is used by the mail worker.
+"""
+
+import json
 import random
 import string
 import requests
-from datetime import datetime, timedelta
 from flask import current_app
 
+from app.utils.http_client import get_client
+from app.utils.mail_queue import enqueue_email
+
+# Provider responses that will not succeed on retry
+PERMANENT_FAILURE_STATUSES = {400, 401, 403, 404, 422}
+
+
 def generate_otp():
     """Generate a 6-digit OTP"""
     return ''.join(random.choices(string.digits, k=6))
 
-def send_otp_email(email, otp):
-    """Send OTP to user email using ZeptoMail API"""
-    try:
-        api_url = current_app.config.get('ZEPTOMAIL_API_URL')
-        api_key = current_app.config.get('ZEPTOMAIL_API_KEY')
-        from_email = current_app.config.get('ZEPTOMAIL_FROM_EMAIL')
-
-        # Trim whitespace/newlines from API key loaded from env
-        if api_key:
-            api_key = api_key.strip()
 
-        if not api_key:
-            current_app.logger.warning('ZeptoMail API key not configured')
-            return False
-        
-        headers = {
-            'Authorization': api_key,
-            'Content-Type': 'application/json'
-        }
-        
-        payload = {
-            'from': {
-                'address': from_email,
-                'name': 'Ride India Rentals'
-            },
-            'to': [
-                {
-                    'email_address': {
-                        'address': email
-                    }
-                }
-            ],
-            'subject': 'Ride India Rentals - Email Verification',
-            'htmlbody': f"""
-            <html>
-                <body style="font-family: Arial, sans-serif; line-height: 1.6;">
-                    <div style="max-width: 600px; margin: 0 auto; padding: 20px;">
-                        <h2 style="color: #333;">Welcome to Ride India Rentals</h2>
-                        
-                        <p>Hello,</p>
-                        
-                        <p>Thank you for registering with us! To activate your account, please use the following OTP:</p>
-                        
-                        <div style="background-color: #f0f0f0; padding: 20px; text-align: center; margin: 20px 0; border-radius: 5px;">
-                            <h1 style="color: #2196F3; letter-spacing: 5px; margin: 0;">{otp}</h1>
-                        </div>
-                        
-                        <p><strong>This OTP is valid for 10 minutes only.</strong></p>
-                        
-                        <p>If you did not create this account, please ignore this email.</p>
-                        
-                        <hr style="border: none; border-top: 1px solid #ddd; margin: 20px 0;">
-                        
-                        <p style="color: #666; font-size: 12px;">
-                            Ride India Rentals<br>
-                            Email: support@rideindiarentals.com<br>
-                            © 2025 All rights reserved.
-                        </p>
-                    </div>
-                </body>
-            </html>
-            """
-        }
-        
-        response = requests.post(api_url, json=payload, headers=headers, timeout=10)
+def _api_key():
+    api_key = current_app.config.get('ZEPTOMAIL_API_KEY')
+    # Trim whitespace/newlines from API key loaded from env
+    return api_key.strip() if api_key else None
 
-        # Log detailed response for debugging deliverability issues
-        try:
-            body_text = response.text
-        except Exception:
-            body_text = '<no body>'
 
-        if response.status_code in (200, 201):
-            current_app.logger.info('OTP email accepted by ZeptoMail (%s) for %s', response.status_code, email)
-            current_app.logger.debug('ZeptoMail response: %s', body_text)
-            return True
-        else:
-            current_app.logger.error('Error sending OTP email: %s - %s', response.status_code, body_text)
-            return False
-            
-    except Exception as e:
-        print(f"Error sending email: {str(e)}")
+def _enqueue(kind, email, subject, htmlbody):
+    if not _api_key():
+        current_app.logger.warning('ZeptoMail API key not configured')
         return False
-
-def send_activation_email(email, name):
-    """Send account activation confirmation email using ZeptoMail API"""
-    try:
-        api_url = current_app.config.get('ZEPTOMAIL_API_URL')
-        api_key = current_app.config.get('ZEPTOMAIL_API_KEY')
-        from_email = current_app.config.get('ZEPTOMAIL_FROM_EMAIL')
-
-        if api_key:
-            api_key = api_key.strip()
-
-        if not api_key:
-            current_app.logger.warning('ZeptoMail API key not configured')
-            return False
-        
-        headers = {
-            'Authorization': api_key,
-            'Content-Type': 'application/json'
-        }
-        
-        payload = {
-            'from': {
-                'address': from_email,
-                'name': 'Ride India Rentals'
-            },
-            'to': [
-                {
-                    'email_address': {
-                        'address': email
-                    }
+    payload = {
+        'from': {
+            'address': current_app.config.get('ZEPTOMAIL_FROM_EMAIL'),
+            'name': 'Ride India Rentals'
+        },
+        'to': [
+            {
+                'email_address': {
+                    'address': email
                 }
-            ],
-            'subject': 'Account Activated - Ride India Rentals',
-            'htmlbody': f"""
-            <html>
-                <body style="font-family: Arial, sans-serif; line-height: 1.6;">
-                    <div style="max-width: 600px; margin: 0 auto; padding: 20px;">
-                        <h2 style="color: #333;">Account Activated Successfully</h2>
-                        
-                        <p>Hello {name},</p>
-                        
-                        <p>Congratulations! Your account has been activated successfully. You can now log in and start booking vehicles.</p>
-                        
-                        <p style="margin: 20px 0;">
-                            <a href="http://localhost:8080/login" style="background-color: #2196F3; color: white; padding: 10px 20px; text-decoration: none; border-radius: 5px; display: inline-block;">
-                                Go to Login
-                            </a>
-                        </p>
-                        
-                        <p>Happy renting!</p>
-                        
-                        <hr style="border: none; border-top: 1px solid #ddd; margin: 20px 0;">
-                        
-                        <p style="color: #666; font-size: 12px;">
-                            Ride India Rentals<br>
-                            Email: support@rideindiarentals.com<br>
-                            © 2025 All rights reserved.
-                        </p>
-                    </div>
-                </body>
-            </html>
-            """
-        }
-        
-        response = requests.post(api_url, json=payload, headers=headers, timeout=10)
-        try:
-            body_text = response.text
-        except Exception:
-            body_text = '<no body>'
-
-        if response.status_code in (200, 201):
-            current_app.logger.info('Activation email accepted by ZeptoMail (%s) for %s', response.status_code, email)
-            current_app.logger.debug('ZeptoMail response: %s', body_text)
-            return True
-        else:
-            current_app.logger.error('Error sending activation email: %s - %s', response.status_code, body_text)
-            return False
-            
-    except Exception as e:
-        print(f"Error sending email: {str(e)}")
-        return False
-
-def send_password_reset_email(email, reset_link):
-    """Send password reset link to user email"""
+            }
+        ],
+        'subject': subject,
+        'htmlbody': htmlbody
+    }
+    return enqueue_email(kind, email, json.dumps(payload))
+
+
+def deliver_email(payload):
+    """POST one message to ZeptoMail.
+
+    Returns (delivered, error, retryable); ``retryable`` is False for provider
+    responses that will fail the same way again.
+    """
+    api_key = _api_key()
+    if not api_key:
+        return False, 'ZeptoMail API key not configured', True
+
+    headers = {
+        'Authorization': api_key,
+        'Content-Type': 'application/json'
+    }
+    client = get_client('zeptomail')
+    timeout = (client.timeout[0], current_app.config.get('ZEPTOMAIL_TIMEOUT_SECONDS', 10))
     try:
-        api_url = current_app.config.get('ZEPTOMAIL_API_URL')
-        api_key = current_app.config.get('ZEPTOMAIL_API_KEY')
-        from_email = current_app.config.get('ZEPTOMAIL_FROM_EMAIL')
+        response = client.post(current_app.config.get('ZEPTOMAIL_API_URL'), data=payload.encode('utf-8'), headers=headers, timeout=timeout)
+    except requests.RequestException as e:
+        return False, str(e), True
 
-        if api_key:
-            api_key = api_key.strip()
+    try:
+        body_text = response.text
+    except Exception:
+        body_text = '<no body>'
 
-        if not api_key:
-            current_app.logger.warning('ZeptoMail API key not configured')
-            return False
+    if response.status_code in (200, 201):
+        current_app.logger.debug('ZeptoMail response: %s', body_text)
+        return True, None, False
+    error = f'{response.status_code} - {body_text}'
+    return False, error, response.status_code not in PERMANENT_FAILURE_STATUSES
 
-        headers = {
-            'Authorization': api_key,
-            'Content-Type': 'application/json'
-        }
 
-        payload = {
-            'from': {
-                'address': from_email,
-                'name': 'Ride India Rentals'
-            },
-            'to': [
-                {
-                    'email_address': {
-                        'address': email
-                    }
-                }
-            ],
-            'subject': 'Reset your Ride India Rentals password',
-            'htmlbody': f"""
-            <html>
-                <body style="font-family: Arial, sans-serif; line-height: 1.6;">
-                    <div style="max-width: 600px; margin: 0 auto; padding: 20px;">
-                        <h2 style="color: #333;">Password reset requested</h2>
-                        <p>Hello,</p>
-                        <p>We received a request to reset the password associated with this email address. Click the button below to choose a new password.</p>
-                        <p><strong>This link is valid for 15 minutes.</strong></p>
-                        <p>If you did not request a password reset, you can safely ignore this email.</p>
-                        <p style="margin: 20px 0;">
-                            <a href="{reset_link}" style="background-color: #2196F3; color: white; padding: 10px 20px; text-decoration: none; border-radius: 5px; display: inline-block;">
-                                Reset password
-                            </a>
-                        </p>
-                        <p style="font-size: 12px; color: #555; word-break: break-all;">
-                            Or copy and paste this link into your browser:<br />
-                            {reset_link}
-                        </p>
-                        <hr style="border: none; border-top: 1px solid #ddd; margin: 20px 0;">
-                        <p style="color: #666; font-size: 12px;">
-                            Ride India Rentals<br>
-                            Email: support@rideindiarentals.com<br>
-                            © 2025 All rights reserved.
-                        </p>
+def send_otp_email(email, otp):
+    """Queue the OTP email for the user"""
+    htmlbody = f"""
+        <html>
+            <body style="font-family: Arial, sans-serif; line-height: 1.6;">
+                <div style="max-width: 600px; margin: 0 auto; padding: 20px;">
+                    <h2 style="color: #333;">Welcome to Ride India Rentals</h2>
+                    
+                    <p>Hello,</p>
+                    
+                    <p>Thank you for registering with us! To activate your account, please use the following OTP:</p>
+                    
+                    <div style="background-color: #f0f0f0; padding: 20px; text-align: center; margin: 20px 0; border-radius: 5px;">
+                        <h1 style="color: #2196F3; letter-spacing: 5px; margin: 0;">{otp}</h1>
                     </div>
-                </body>
-            </html>
-            """
-        }
-
-        response = requests.post(api_url, json=payload, headers=headers, timeout=10)
-        try:
-            body_text = response.text
-        except Exception:
-            body_text = '<no body>'
-
-        if response.status_code in (200, 201):
-            current_app.logger.info('Password reset email accepted by ZeptoMail (%s) for %s', response.status_code, email)
-            current_app.logger.debug('ZeptoMail response: %s', body_text)
-            return True
-        else:
-            current_app.logger.error('Error sending password reset email: %s - %s', response.status_code, body_text)
-            return False
-
-    except Exception as e:
-        print(f"Error sending email: {str(e)}")
-        return False
-
+                    
+                    <p><strong>This OTP is valid for 10 minutes only.</strong></p>
+                    
+                    <p>If you did not create this account, please ignore this email.</p>
+                    
+                    <hr style="border: none; border-top: 1px solid #ddd; margin: 20px 0;">
+                    
+                    <p style="color: #666; font-size: 12px;">
+                        Ride India Rentals<br>
+                        Email: support@rideindiarentals.com<br>
+                        © 2025 All rights reserved.
+                    </p>
+                </div>
+            </body>
+        </html>
+        """
+    return _enqueue('otp', email, 'Ride India Rentals - Email Verification', htmlbody)
 
-def send_feedback_request(email, booking_id):
-    """Send a feedback request email to the customer when booking is completed."""
-    try:
-        api_url = current_app.config.get('ZEPTOMAIL_API_URL')
-        api_key = current_app.config.get('ZEPTOMAIL_API_KEY')
-        from_email = current_app.config.get('ZEPTOMAIL_FROM_EMAIL')
-
-        if api_key:
-            api_key = api_key.strip()
 
-        if not api_key:
-            current_app.logger.warning('ZeptoMail API key not configured')
-            return False
-
-        headers = {
-            'Authorization': api_key,
-            'Content-Type': 'application/json'
-        }
+def send_activation_email(email, name):
+    """Queue the account activation confirmation email"""
+    htmlbody = f"""
+        <html>
+            <body style="font-family: Arial, sans-serif; line-height: 1.6;">
+                <div style="max-width: 600px; margin: 0 auto; padding: 20px;">
+                    <h2 style="color: #333;">Account Activated Successfully</h2>
+                    
+                    <p>Hello {name},</p>
+                    
+                    <p>Congratulations! Your account has been activated successfully. You can now log in and start booking vehicles.</p>
+                    
+                    <p style="margin: 20px 0;">
+                        <a href="http://localhost:8080/login" style="background-color: #2196F3; color: white; padding: 10px 20px; text-decoration: none; border-radius: 5px; display: inline-block;">
+                            Go to Login
+                        </a>
+                    </p>
+                    
+                    <p>Happy renting!</p>
+                    
+                    <hr style="border: none; border-top: 1px solid #ddd; margin: 20px 0;">
+                    
+                    <p style="color: #666; font-size: 12px;">
+                        Ride India Rentals<br>
+                        Email: support@rideindiarentals.com<br>
+                        © 2025 All rights reserved.
+                    </p>
+                </div>
+            </body>
+        </html>
+        """
+    return _enqueue('activation', email, 'Account Activated - Ride India Rentals', htmlbody)
 
-        feedback_url = current_app.config.get('FRONTEND_BASE_URL', '') + f"/bookings/{booking_id}/feedback"
 
-        payload = {
-            'from': {
-                'address': from_email,
-                'name': 'Ride India Rentals'
-            },
-            'to': [
-                {
-                    'email_address': {
-                        'address': email
-                    }
-                }
-            ],
-            'subject': 'How was your ride? Please provide feedback',
-            'htmlbody': f"""
-            <html>
-                <body>
-                    <p>Hi,</p>
-                    <p>Thank you for completing your booking. We'd love to know how your experience was.</p>
-                    <p>Please click the link below to submit your feedback:</p>
-                    <p><a href=\"{feedback_url}\">Leave feedback</a></p>
-                    <p>Thanks,<br/>Ride India Rentals Team</p>
-                </body>
-            </html>
-            """
-        }
+def send_password_reset_email(email, reset_link):
+    """Queue the password reset link email"""
+    htmlbody = f"""
+        <html>
+            <body style="font-family: Arial, sans-serif; line-height: 1.6;">
+                <div style="max-width: 600px; margin: 0 auto; padding: 20px;">
+                    <h2 style="color: #333;">Password reset requested</h2>
+                    <p>Hello,</p>
+                    <p>We received a request to reset the password associated with this email address. Click the button below to choose a new password.</p>
+                    <p><strong>This link is valid for 15 minutes.</strong></p>
+                    <p>If you did not request a password reset, you can safely ignore this email.</p>
+                    <p style="margin: 20px 0;">
+                        <a href="{reset_link}" style="background-color: #2196F3; color: white; padding: 10px 20px; text-decoration: none; border-radius: 5px; display: inline-block;">
+                            Reset password
+                        </a>
+                    </p>
+                    <p style="font-size: 12px; color: #555; word-break: break-all;">
+                        Or copy and paste this link into your browser:<br />
+                        {reset_link}
+                    </p>
+                    <hr style="border: none; border-top: 1px solid #ddd; margin: 20px 0;">
+                    <p style="color: #666; font-size: 12px;">
+                        Ride India Rentals<br>
+                        Email: support@rideindiarentals.com<br>
+                        © 2025 All rights reserved.
+                    </p>
+                </div>
+            </body>
+        </html>
+        """
+    return _enqueue('password_reset', email, 'Reset your Ride India Rentals password', htmlbody)
 
-        response = requests.post(api_url, json=payload, headers=headers, timeout=10)
-        try:
-            body_text = response.text
-        except Exception:
-            body_text = '<no body>'
 
-        if response.status_code in (200, 201):
-            current_app.logger.info('Feedback request email accepted by ZeptoMail (%s) for %s', response.status_code, email)
-            current_app.logger.debug('ZeptoMail response: %s', body_text)
-            return True
-        else:
-            current_app.logger.error('Error sending feedback request email: %s - %s', response.status_code, body_text)
-            return False
-    except Exception as e:
-        print(f"Error sending feedback email: {str(e)}")
-        return False
+def send_feedback_request(email, booking_id):
+    """Queue a feedback request email to the customer when booking is completed."""
+    feedback_url = current_app.config.get('FRONTEND_BASE_URL', '') + f"/bookings/{booking_id}/feedback"
+    htmlbody = f"""
+        <html>
+            <body>
+                <p>Hi,</p>
+                <p>Thank you for completing your booking. We'd love to know how your experience was.</p>
+                <p>Please click the link below to submit your feedback:</p>
+                <p><a href=\"{feedback_url}\">Leave feedback</a></p>
+                <p>Thanks,<br/>Ride India Rentals Team</p>
+            </body>
+        </html>
+        """
+    return _enqueue('feedback_request', email, 'How was your ride? Please provide feedback', htmlbody)
@@ -0,0 +1,205 @@
+"""
+Durable outbox for outbound e-mail.
+
+Request handlers call ``enqueue_email``, which stores the rendered message in the
+email_outbox table and returns immediately. Delivery happens in worker threads
+(MAIL_WORKER_THREADS per process, started on the first request after the process
+forks) or in a separate ``flask mail-worker`` process.
+
+Workers claim rows with a conditional UPDATE, so any number of threads and processes
+can share the table. A row left in 'sending' for MAIL_LOCK_TIMEOUT_SECONDS belonged
+to a worker that crashed mid-delivery; it counts as a failed attempt and goes back
+to 'pending' (or 'dead' once out of attempts), so a message that keeps crashing the
+worker is dead-lettered instead of retried forever. A failed delivery is retried with exponential backoff
+(MAIL_RETRY_BASE_SECONDS doubling per attempt, capped at MAIL_RETRY_MAX_SECONDS).
+After max_attempts, or on a permanent provider error, the row is marked 'dead' and
+kept for inspection; ``flask requeue-dead-mail`` puts dead rows back in the queue.
+"""
+
+import random
+import threading
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import and_
+
+from app import db
+from app.models.outbox import OutboxEmail
+
+_wakeup = threading.Event()
+_workers = []
+_workers_lock = threading.Lock()
+
+
+def enqueue_email(kind, recipient, payload):
+    """Store a rendered message for delivery. Returns True once it is committed."""
+    try:
+        db.session.add(OutboxEmail(
+            kind=kind,
+            recipient=recipient,
+            payload=payload,
+            max_attempts=current_app.config.get('MAIL_MAX_ATTEMPTS', 6)
+        ))
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error('Failed to queue %s email for %s: %s', kind, recipient, e)
+        return False
+    _wakeup.set()
+    return True
+
+
+def retry_delay(attempts):
+    """Backoff before the next try after ``attempts`` failed deliveries, with up to 10% jitter."""
+    base = current_app.config.get('MAIL_RETRY_BASE_SECONDS', 30)
+    cap = current_app.config.get('MAIL_RETRY_MAX_SECONDS', 3600)
+    delay = min(cap, base * 2 ** max(0, attempts - 1))
+    return timedelta(seconds=delay * (1 + random.random() * 0.1))
+
+
+def _claimable(now):
+    return and_(OutboxEmail.status == 'pending', OutboxEmail.next_attempt_at <= now)
+
+
+def _release_stale(now):
+    """Count deliveries whose worker died as failed attempts and make them claimable again."""
+    stale = and_(
+        OutboxEmail.status == 'sending',
+        OutboxEmail.locked_at < now - timedelta(seconds=current_app.config.get('MAIL_LOCK_TIMEOUT_SECONDS', 300))
+    )
+    error = 'Worker stopped during delivery'
+    # Both UPDATEs only match rows still in 'sending', so each crash is counted once
+    dead = OutboxEmail.query.filter(stale, OutboxEmail.attempts + 1 >= OutboxEmail.max_attempts).update({
+        OutboxEmail.status: 'dead',
+        OutboxEmail.attempts: OutboxEmail.attempts + 1,
+        OutboxEmail.locked_at: None,
+        OutboxEmail.last_error: error,
+    }, synchronize_session=False)
+    retried = OutboxEmail.query.filter(stale).update({
+        OutboxEmail.status: 'pending',
+        OutboxEmail.attempts: OutboxEmail.attempts + 1,
+        OutboxEmail.locked_at: None,
+        OutboxEmail.next_attempt_at: now,
+        OutboxEmail.last_error: error,
+    }, synchronize_session=False)
+    if dead or retried:
+        current_app.logger.warning('Reclaimed %s crashed mail deliveries, dead-lettered %s', retried, dead)
+
+
+def _claim_batch(limit):
+    now = datetime.utcnow()
+    _release_stale(now)
+    candidates = db.session.query(OutboxEmail.id).filter(
+        _claimable(now)
+    ).order_by(OutboxEmail.next_attempt_at.asc()).limit(limit).all()
+
+    claimed = []
+    for (email_id,) in candidates:
+        updated = OutboxEmail.query.filter(OutboxEmail.id == email_id, _claimable(now)).update({
+            OutboxEmail.status: 'sending',
+            OutboxEmail.locked_at: now,
+        }, synchronize_session=False)
+        if updated:
+            claimed.append(email_id)
+    db.session.commit()
+    return claimed
+
+
+def _deliver(email_id):
+    from app.utils.mail import deliver_email
+
+    message = db.session.get(OutboxEmail, email_id)
+    payload = message.payload
+    # Release the connection while waiting on the provider
+    db.session.commit()
+
+    delivered, error, retryable = deliver_email(payload)
+
+    message = db.session.get(OutboxEmail, email_id)
+    message.attempts = (message.attempts or 0) + 1
+    message.locked_at = None
+    now = datetime.utcnow()
+    if delivered:
+        message.status = 'sent'
+        message.sent_at = now
+        message.last_error = None
+        current_app.logger.info('%s email delivered to %s', message.kind, message.recipient)
+    elif not retryable or message.attempts >= message.max_attempts:
+        message.status = 'dead'
+        message.last_error = error
+        current_app.logger.error('%s email to %s dead-lettered after %s attempts: %s',
+                                 message.kind, message.recipient, message.attempts, error)
+    else:
+        message.status = 'pending'
+        message.next_attempt_at = now + retry_delay(message.attempts)
+        message.last_error = error
+        current_app.logger.warning('%s email to %s failed (attempt %s), retrying at %s: %s',
+                                   message.kind, message.recipient, message.attempts, message.next_attempt_at, error)
+    db.session.commit()
+
+
+def process_outbox(batch_size=None):
+    """Deliver one batch of due messages. Returns the number of messages attempted."""
+    batch_size = batch_size or current_app.config.get('MAIL_BATCH_SIZE', 20)
+    claimed = _claim_batch(batch_size)
+    for email_id in claimed:
+        try:
+            _deliver(email_id)
+        except Exception:
+            db.session.rollback()
+            # Left in 'sending'; reclaimed once MAIL_LOCK_TIMEOUT_SECONDS passes
+            current_app.logger.exception('Mail delivery crashed for outbox row %s', email_id)
+    return len(claimed)
+
+
+def run_worker(app, stop_event=None):
+    """Deliver queued mail until ``stop_event`` is set, sleeping when the queue is empty."""
+    poll = app.config.get('MAIL_WORKER_POLL_SECONDS', 5)
+    while stop_event is None or not stop_event.is_set():
+        with app.app_context():
+            try:
+                processed = process_outbox()
+            except Exception:
+                app.logger.exception('Mail worker iteration failed')
+                processed = 0
+            finally:
+                db.session.remove()
+        if not processed:
+            _wakeup.wait(poll)
+            _wakeup.clear()
+
+
+def requeue_dead(kind=None):
+    """Move dead-lettered messages back to the queue. Returns the number requeued."""
+    query = OutboxEmail.query.filter(OutboxEmail.status == 'dead')
+    if kind:
+        query = query.filter(OutboxEmail.kind == kind)
+    count = query.update({
+        OutboxEmail.status: 'pending',
+        OutboxEmail.attempts: 0,
+        OutboxEmail.next_attempt_at: datetime.utcnow(),
+    }, synchronize_session=False)
+    db.session.commit()
+    return count
+
+
+def init_mail_queue(app):
+    """Start MAIL_WORKER_THREADS delivery threads in this process on its first request."""
+    threads = app.config.get('MAIL_WORKER_THREADS', 1)
+    if threads <= 0:
+        return
+
+    @app.before_request
+    def _start_mail_workers():
+        if len(_workers) >= threads:
+            return
+        with _workers_lock:
+            while len(_workers) < threads:
+                worker = threading.Thread(
+                    target=run_worker,
+                    args=(app,),
+                    name=f'mail-worker-{len(_workers) + 1}',
+                    daemon=True
+                )
+                worker.start()
+                _workers.append(worker)
@@ -0,0 +1,191 @@
+"""
+Short-lived state for e-mail OTPs, shared by every worker and instance.
+
+``otp_store`` holds each pending OTP under its e-mail address together with a
+counter of failed attempts. Entries carry a TTL and are evicted when it passes,
+whether or not anyone ever verifies them.
+
+Backends (OTP_STORE_BACKEND):
+    memory  - per-process dict with a TTL heap and OTP_STORE_MAX_ENTRIES cap (default);
+              only correct with a single worker process
+    redis   - shared across workers via OTP_STORE_REDIS_URL; startup fails if it
+              cannot connect
+    fake    - the shared backend over an in-process fake client, for tests
+"""
+
+import heapq
+import hmac
+import pickle
+import threading
+import time
+from datetime import datetime, timedelta
+
+from flask import current_app
+
+from app.utils.response_cache import FakeRedis, connect_redis
+
+# How long an expired OTP is kept so verification can say "expired" rather than "not found"
+EXPIRED_GRACE_SECONDS = 300
+
+
+class MemoryBackend:
+    """Thread-safe dict with per-entry expiry.
+
+    Expiry times also go on a min-heap, and every write pops the entries that have
+    expired. When the store is still over ``max_entries`` the oldest writes are
+    dropped first.
+    """
+
+    name = 'memory'
+
+    def __init__(self, max_entries=10000):
+        self._max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._heap = []
+
+    def get(self, key):
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._put(key, value, time.monotonic() + ttl)
+
+    def delete(self, key):
+        with self._lock:
+            return self._entries.pop(key, None) is not None
+
+    def incr(self, key, ttl):
+        """Increment the counter at ``key``; a new counter expires after ``ttl`` seconds."""
+        with self._lock:
+            now = time.monotonic()
+            item = self._entries.get(key)
+            if item is None or item[1] <= now:
+                self._put(key, 1, now + ttl)
+                return 1
+            count = item[0] + 1
+            self._entries[key] = (count, item[1])
+            return count
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def _put(self, key, value, expires_at):
+        # Re-insert so dict order stays write order
+        self._entries.pop(key, None)
+        self._entries[key] = (value, expires_at)
+        heapq.heappush(self._heap, (expires_at, key))
+        self._evict(time.monotonic())
+        # Overwritten keys leave stale heap items behind; rebuild once they dominate
+        if len(self._heap) > 2 * len(self._entries) + 64:
+            self._heap = [(expires_at, key) for key, (_, expires_at) in self._entries.items()]
+            heapq.heapify(self._heap)
+
+    def _evict(self, now):
+        while self._heap and self._heap[0][0] <= now:
+            expires_at, key = heapq.heappop(self._heap)
+            item = self._entries.get(key)
+            if item is not None and item[1] == expires_at:
+                del self._entries[key]
+        while len(self._entries) > self._max_entries:
+            del self._entries[next(iter(self._entries))]
+
+
+class SharedBackend:
+    """Backend over a Redis-compatible client (get/set with ex, delete, incr, expire)."""
+
+    name = 'redis'
+
+    def __init__(self, client, prefix='otp:'):
+        self._client = client
+        self._prefix = prefix
+
+    def get(self, key):
+        raw = self._client.get(self._prefix + key)
+        return pickle.loads(raw) if raw is not None else None
+
+    def set(self, key, value, ttl):
+        self._client.set(self._prefix + key, pickle.dumps(value), ex=ttl)
+
+    def delete(self, key):
+        return bool(self._client.delete(self._prefix + key))
+
+    def incr(self, key, ttl):
+        count = self._client.incr(self._prefix + key)
+        if count == 1:
+            self._client.expire(self._prefix + key, ttl)
+        return count
+
+
+def _build_backend(app):
+    kind = (app.config.get('OTP_STORE_BACKEND') or 'memory').lower()
+    if kind == 'redis':
+        # Falling back to process memory would break OTPs across workers, so refuse to start
+        return SharedBackend(connect_redis(app.config.get('OTP_STORE_REDIS_URL'), 'OTP_STORE_BACKEND'))
+    elif kind == 'fake':
+        backend = SharedBackend(FakeRedis())
+        backend.name = 'fake'
+        return backend
+    return MemoryBackend(app.config.get('OTP_STORE_MAX_ENTRIES', 10000))
+
+
+class OTPStore:
+    def init_app(self, app):
+        app.extensions['otp_store'] = _build_backend(app)
+
+    @property
+    def backend(self):
+        return current_app.extensions['otp_store']
+
+    def issue(self, email, otp):
+        """Store ``otp`` as the pending code for ``email``, replacing any earlier one."""
+        expiry = timedelta(minutes=current_app.config.get('OTP_EXPIRY_MINUTES', 10))
+        ttl = int(expiry.total_seconds()) + EXPIRED_GRACE_SECONDS
+        self.backend.set(f'code:{email}', {
+            'otp': otp,
+            'expires_at': datetime.utcnow() + expiry
+        }, ttl)
+        self.backend.delete(f'attempts:{email}')
+
+    def verify(self, email, otp):
+        """Check ``otp`` for ``email``.
+
+        Returns 'verified', 'missing', 'expired', 'invalid' or 'locked' (too many
+        wrong guesses). The code is consumed on success, expiry and lockout.
+        """
+        cached = self.backend.get(f'code:{email}')
+        if cached is None:
+            return 'missing'
+        if datetime.utcnow() > cached['expires_at']:
+            self._discard(email)
+            return 'expired'
+
+        if not hmac.compare_digest(str(cached['otp']), str(otp)):
+            ttl = int(timedelta(minutes=current_app.config.get('OTP_EXPIRY_MINUTES', 10)).total_seconds())
+            attempts = self.backend.incr(f'attempts:{email}', ttl)
+            if attempts >= current_app.config.get('OTP_MAX_ATTEMPTS', 5):
+                self._discard(email)
+                return 'locked'
+            return 'invalid'
+
+        # Only the request that actually deletes the code succeeds, so a code works once
+        if not self.backend.delete(f'code:{email}'):
+            return 'missing'
+        self.backend.delete(f'attempts:{email}')
+        return 'verified'
+
+    def _discard(self, email):
+        self.backend.delete(f'code:{email}')
+        self.backend.delete(f'attempts:{email}')
+
+
+otp_store = OTPStore()
@@ -0,0 +1,110 @@
+"""
+Password hashing off the request thread.
+
+scrypt/pbkdf2 hashing holds the GIL for tens of milliseconds, which stalls every
+other thread in the worker. ``hash_password`` and ``verify_password`` run the
+werkzeug functions in a process pool of PASSWORD_HASH_WORKERS processes while the
+calling thread waits without holding the GIL.
+
+At most PASSWORD_HASH_WORKERS + PASSWORD_HASH_QUEUE_SIZE calls are in flight per
+process; a caller that cannot get a slot within PASSWORD_HASH_QUEUE_TIMEOUT_SECONDS
+gets PasswordHashingBusy, which the app turns into a 503 with Retry-After.
+PASSWORD_HASH_WORKERS=0 hashes inline on the request thread.
+
+New hashes use PASSWORD_HASH_METHOD; ``needs_rehash`` reports stored hashes made
+with other parameters so login can upgrade them.
+"""
+
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from functools import lru_cache
+
+from flask import current_app, jsonify
+from werkzeug.security import _hash_internal, check_password_hash, generate_password_hash
+
+_executor = None
+_slots = None
+_lock = threading.Lock()
+
+
+class PasswordHashingBusy(Exception):
+    """Every hashing slot stayed taken for PASSWORD_HASH_QUEUE_TIMEOUT_SECONDS."""
+
+
+def _pool():
+    global _executor, _slots
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                config = current_app.config
+                workers = config.get('PASSWORD_HASH_WORKERS', 2)
+                _slots = threading.BoundedSemaphore(workers + config.get('PASSWORD_HASH_QUEUE_SIZE', 16))
+                # spawn, not fork: forking a process that already runs request threads can copy
+                # held locks. Spawned children re-import the entry script, so it must be import-safe
+                _executor = ProcessPoolExecutor(
+                    max_workers=workers,
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+    return _executor, _slots
+
+
+def _reset_pool(broken):
+    global _executor
+    with _lock:
+        if _executor is broken:
+            _executor = None
+    broken.shutdown(wait=False)
+
+
+def _run(func, *args):
+    if current_app.config.get('PASSWORD_HASH_WORKERS', 2) <= 0:
+        return func(*args)
+
+    executor, slots = _pool()
+    if not slots.acquire(timeout=current_app.config.get('PASSWORD_HASH_QUEUE_TIMEOUT_SECONDS', 5)):
+        raise PasswordHashingBusy('Password hashing is at capacity')
+    try:
+        return executor.submit(func, *args).result()
+    except BrokenProcessPool:
+        # A pool process died (e.g. OOM-killed); start a fresh pool for the next call
+        current_app.logger.warning('Password hashing pool broke; recreating it')
+        _reset_pool(executor)
+        return func(*args)
+    finally:
+        slots.release()
+
+
+def hash_password(password):
+    return _run(generate_password_hash, password, current_app.config.get('PASSWORD_HASH_METHOD', 'scrypt'))
+
+
+def verify_password(pwhash, password):
+    if not pwhash:
+        return False
+    return _run(check_password_hash, pwhash, password)
+
+
+@lru_cache(maxsize=8)
+def _expanded_method(method):
+    """Return the parameter string werkzeug writes for ``method`` ("scrypt" -> "scrypt:32768:8:1").
+
+    Hashes one empty password, once per method, so werkzeug's own defaults apply.
+    """
+    return _hash_internal(method, '', '')[1]
+
+
+def needs_rehash(pwhash):
+    """True if ``pwhash`` was not made with the current PASSWORD_HASH_METHOD."""
+    if not pwhash:
+        return False
+    return pwhash.split('$', 1)[0] != _expanded_method(current_app.config.get('PASSWORD_HASH_METHOD', 'scrypt'))
+
+
+def init_password_hashing(app):
+    @app.errorhandler(PasswordHashingBusy)
+    def password_hashing_busy(e):
+        response = jsonify({'error': 'Server is busy, please try again shortly'})
+        response.headers['Retry-After'] = '1'
+        return response, 503
@@ -0,0 +1,202 @@
+"""
+Idempotent Razorpay order creation.
+
+Every order request carries an idempotency key: the client's ``Idempotency-Key``
+header scoped to the booking, or ``<booking id>:<amount>`` when there is none. The
+key is stored on the Payment row under a unique index, which makes it the claim
+for the upstream call:
+
+* an unexpired 'created' order for the key is returned as-is
+  (PAYMENT_ORDER_REUSE_SECONDS);
+* the first request inserts a 'creating' row and calls Razorpay on a small
+  thread pool, waiting at most RAZORPAY_ORDER_TIMEOUT_SECONDS;
+* concurrent requests in the same process wait on that same call; requests in
+  other processes poll the row until the order is stored, then get the same order;
+* expired or failed orders give up the key and a new order is created.
+
+When the first request stops waiting (RAZORPAY_ORDER_TIMEOUT_SECONDS) the call keeps
+running; if it still returns an order, a done-callback stores it on the payment row
+as 'expired', so a webhook or the stale-payment sweep can match the order if it is
+ever paid.
+"""
+
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+from app.models.payment import Payment
+
+_executor = None
+_executor_lock = threading.Lock()
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+
+class OrderInProgress(Exception):
+    """Another request is still creating the order for this key."""
+
+
+class IdempotencyConflict(Exception):
+    """The key was already used for a different booking, amount, or a paid order."""
+
+
+def idempotency_key(booking, amount_paise, client_key=None):
+    if client_key:
+        return f'{booking.id}:{client_key.strip()[:50]}'
+    return f'{booking.id}:{amount_paise}'
+
+
+def _pool():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=current_app.config.get('RAZORPAY_ORDER_WORKERS', 4),
+                    thread_name_prefix='razorpay-order'
+                )
+    return _executor
+
+
+def _submit(key, create_order, *args):
+    """Run ``create_order`` for ``key`` once; concurrent callers share the same future."""
+    app = current_app._get_current_object()
+
+    def run():
+        with app.app_context():
+            return create_order(*args)
+
+    with _inflight_lock:
+        future = _inflight.get(key)
+        if future is None:
+            future = _pool().submit(run)
+            _inflight[key] = future
+            future.add_done_callback(lambda f: _release(key, f))
+    return future
+
+
+def _release(key, future):
+    with _inflight_lock:
+        if _inflight.get(key) is future:
+            del _inflight[key]
+
+
+def _record_late_order(app, payment_id):
+    """Done-callback storing the order of a call whose caller already timed out."""
+    def record(future):
+        if future.cancelled() or future.exception() is not None:
+            return
+        order = future.result()
+        with app.app_context():
+            try:
+                payment = db.session.get(Payment, payment_id)
+                if payment is not None and not payment.razorpay_order_id:
+                    payment.razorpay_order_id = order.get('id')
+                    payment.currency = order.get('currency', 'INR')
+                    payment.status = 'expired'
+                    payment.notes = json.dumps(order.get('notes', {}))
+                    payment.raw_response = json.dumps(order)
+                    db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                app.logger.error('Could not record late order %s for payment %s: %s', order.get('id'), payment_id, e)
+            finally:
+                db.session.remove()
+    return record
+
+
+def _fresh(payment, seconds):
+    return payment.updated_at and datetime.utcnow() - payment.updated_at < timedelta(seconds=seconds)
+
+
+def _wait_for_order(key, timeout):
+    """Poll for the order another process is creating for ``key``."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        time.sleep(0.2)
+        db.session.rollback()
+        payment = Payment.query.filter_by(idempotency_key=key).first()
+        if payment is None or payment.status == 'failed':
+            break
+        if payment.status == 'created':
+            return payment, json.loads(payment.raw_response)
+    raise OrderInProgress('Payment order is still being created')
+
+
+def get_or_create_order(booking, amount_paise, key, create_order, receipt, notes):
+    """Return ``(payment, order)`` for ``key``, calling ``create_order`` at most once per key.
+
+    ``create_order(amount_paise, receipt, notes)`` performs the upstream call and
+    returns the Razorpay order dict.
+    """
+    config = current_app.config
+    timeout = config.get('RAZORPAY_ORDER_TIMEOUT_SECONDS', 20)
+    if booking.payment_status == 'completed':
+        raise IdempotencyConflict('This booking is already paid')
+
+    payment = Payment.query.filter_by(idempotency_key=key).first()
+    if payment is not None:
+        if payment.booking_id != booking.id or payment.amount != amount_paise:
+            raise IdempotencyConflict('Idempotency key was used for a different payment order')
+        if payment.status == 'paid':
+            raise IdempotencyConflict('This booking is already paid')
+        if payment.status == 'created' and _fresh(payment, config.get('PAYMENT_ORDER_REUSE_SECONDS', 900)):
+            return payment, json.loads(payment.raw_response)
+        if payment.status == 'creating' and _fresh(payment, timeout):
+            future = _inflight.get(key)
+            if future is not None:
+                return payment, future.result(timeout=timeout)
+            return _wait_for_order(key, timeout)
+        # Expired, failed or abandoned: keep the row for history and free the key
+        if payment.status in ('created', 'creating'):
+            payment.status = 'expired'
+        payment.idempotency_key = None
+        db.session.commit()
+
+    payment = Payment(
+        booking_id=booking.id,
+        razorpay_order_id='',
+        amount=amount_paise,
+        status='creating',
+        idempotency_key=key,
+    )
+    db.session.add(payment)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # Lost the race to another request; share its order
+        db.session.rollback()
+        future = _inflight.get(key)
+        if future is not None:
+            return Payment.query.filter_by(idempotency_key=key).first(), future.result(timeout=timeout)
+        return _wait_for_order(key, timeout)
+
+    future = _submit(key, create_order, amount_paise, receipt, notes)
+    try:
+        order = future.result(timeout=timeout)
+    except Exception as e:
+        db.session.rollback()
+        payment.status = 'failed'
+        payment.idempotency_key = None
+        payment.raw_response = json.dumps({'error': str(e) or 'Timed out creating order'})
+        db.session.commit()
+        if isinstance(e, FutureTimeoutError):
+            # Added after the commit above, so the late order is never overwritten by it
+            future.add_done_callback(_record_late_order(current_app._get_current_object(), payment.id))
+            raise TimeoutError('Timed out creating payment order') from e
+        raise
+
+    payment.razorpay_order_id = order.get('id')
+    payment.currency = order.get('currency', 'INR')
+    payment.status = order.get('status', 'created')
+    payment.notes = json.dumps(order.get('notes', {}))
+    payment.raw_response = json.dumps(order)
+    db.session.commit()
+    return payment, order
@@ -0,0 +1,373 @@
+"""
+Razorpay webhook inbox and payment reconciliation.
+
+The webhook endpoint only checks the signature and stores the delivery with
+``record_webhook_event``. Reconciler threads (PAYMENT_RECONCILER_THREADS per
+process, or ``flask payment-reconciler``) claim stored events in batches with a
+conditional UPDATE, load the affected payments and bookings with IN queries and
+apply them in one transaction per batch.
+
+Applying an event is idempotent and never moves a payment backwards: a paid
+payment stays paid whatever arrives later, and redelivered events (same
+X-Razorpay-Event-Id) are dropped on insert. A capture for a booking that no longer
+holds its slot (cancelled, or its pending hold ran out) only confirms it if no other
+booking overlaps; otherwise the booking stays cancelled and the payment is marked
+'refund_pending' for a manual refund.
+
+Every PAYMENT_SWEEP_INTERVAL_SECONDS the reconciler also sweeps payments that have
+been 'created' (or 'expired' with an order: past its reuse window, or stored after
+its creator timed out) for longer than PAYMENT_SWEEP_AFTER_SECONDS, for the case where
+neither the client callback nor the webhook arrived: the orders are listed from
+Razorpay page by page for the whole time range, and paid ones are finalized.
+"""
+
+import json
+import threading
+import time
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import and_, or_
+from sqlalchemy.exc import IntegrityError
+
+from app import db
+from app.models.booking import Booking
+from app.models.payment import Payment
+from app.models.webhook import PaymentWebhookEvent
+from app.utils.availability import BLOCKING_STATUSES, availability_index, overlapping_bookings
+from app.utils.http_client import get_client
+
+CAPTURED_EVENTS = frozenset({'payment.captured', 'order.paid'})
+FAILED_EVENTS = frozenset({'payment.failed'})
+# Money was taken; a later failure event must not undo these
+SETTLED_STATUSES = frozenset({'paid', 'refund_pending'})
+ORDERS_PAGE_SIZE = 100
+
+_wakeup = threading.Event()
+_workers = []
+_workers_lock = threading.Lock()
+
+
+def record_webhook_event(event_id, event, payload):
+    """Store a verified webhook delivery. Returns False if it was already stored."""
+    db.session.add(PaymentWebhookEvent(event_id=event_id, event=event, payload=payload))
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return False
+    _wakeup.set()
+    return True
+
+
+def _claimable(now):
+    stale = now - timedelta(seconds=current_app.config.get('PAYMENT_RECONCILER_LOCK_TIMEOUT_SECONDS', 300))
+    return or_(
+        and_(PaymentWebhookEvent.status == 'pending', PaymentWebhookEvent.next_attempt_at <= now),
+        and_(PaymentWebhookEvent.status == 'processing', PaymentWebhookEvent.locked_at < stale)
+    )
+
+
+def _claim_batch(limit):
+    now = datetime.utcnow()
+    candidates = db.session.query(PaymentWebhookEvent.id).filter(
+        _claimable(now)
+    ).order_by(PaymentWebhookEvent.next_attempt_at.asc()).limit(limit).all()
+
+    claimed = []
+    for (event_row_id,) in candidates:
+        updated = PaymentWebhookEvent.query.filter(
+            PaymentWebhookEvent.id == event_row_id, _claimable(now)
+        ).update({
+            PaymentWebhookEvent.status: 'processing',
+            PaymentWebhookEvent.locked_at: now,
+        }, synchronize_session=False)
+        if updated:
+            claimed.append(event_row_id)
+    db.session.commit()
+    return claimed
+
+
+def _payment_entity(payload):
+    entity = ((payload.get('payload') or {}).get('payment') or {}).get('entity') or {}
+    if not entity.get('order_id'):
+        order = ((payload.get('payload') or {}).get('order') or {}).get('entity') or {}
+        entity = dict(entity, order_id=order.get('id'), notes=entity.get('notes') or order.get('notes'))
+    return entity
+
+
+def _apply(event, entity, payment, booking):
+    """Apply one payment outcome. Returns the vehicle id whose availability changed, if any."""
+    if event in CAPTURED_EVENTS:
+        if payment.status not in SETTLED_STATUSES:
+            payment.status = 'paid'
+            payment.razorpay_payment_id = entity.get('id') or payment.razorpay_payment_id
+            payment.method = entity.get('method') or payment.method
+            payment.email = entity.get('email') or payment.email
+            payment.contact = entity.get('contact') or payment.contact
+            payment.idempotency_key = None
+        if booking.payment_status != 'completed':
+            slot_taken = booking.status not in BLOCKING_STATUSES and overlapping_bookings(
+                booking.vehicle_id, booking.start_date, booking.end_date, exclude_booking_id=booking.id
+            ).first() is not None
+            if slot_taken:
+                # Another booking took the dates after this one was cancelled or its hold ran out
+                if payment.status != 'refund_pending':
+                    current_app.logger.warning(
+                        'Payment %s captured for booking %s whose slot is taken; flagged for refund',
+                        payment.razorpay_payment_id, booking.id
+                    )
+                payment.status = 'refund_pending'
+                booking.set_payment_status('refund_pending')
+                booking.status = 'cancelled'
+                return None
+            booking.set_payment_status('completed')
+            booking.status = 'confirmed'
+            return booking.vehicle_id
+    elif event in FAILED_EVENTS:
+        if payment.status in SETTLED_STATUSES or booking.payment_status in ('completed', 'refund_pending'):
+            return None
+        payment.status = 'failed'
+        payment.razorpay_payment_id = entity.get('id') or payment.razorpay_payment_id
+        payment.idempotency_key = None
+        if booking.payment_status != 'failed':
+            booking.set_payment_status('failed')
+            booking.status = 'cancelled'
+            return booking.vehicle_id
+    return None
+
+
+def _load_targets(entities):
+    """Map order id -> (payment, booking) for every order referenced by ``entities``."""
+    order_ids = {e['order_id'] for e in entities if e.get('order_id')}
+    if not order_ids:
+        return {}
+    payments = {}
+    for payment in Payment.query.filter(Payment.razorpay_order_id.in_(order_ids)).all():
+        # Prefer the paid/live row if an order somehow has several
+        if payment.razorpay_order_id not in payments or payment.status == 'paid':
+            payments[payment.razorpay_order_id] = payment
+
+    # Orders without a payment row (e.g. created before rows were stored) carry the booking in notes
+    booking_ids = {p.booking_id for p in payments.values()}
+    for entity in entities:
+        booking_id = (entity.get('notes') or {}).get('booking_id')
+        if entity.get('order_id') not in payments and booking_id:
+            booking_ids.add(booking_id)
+    bookings = {}
+    if booking_ids:
+        bookings = {b.id: b for b in Booking.query.filter(Booking.id.in_(booking_ids)).all()}
+
+    targets = {}
+    for entity in entities:
+        order_id = entity.get('order_id')
+        if not order_id:
+            continue
+        payment = payments.get(order_id)
+        booking = bookings.get(payment.booking_id if payment else (entity.get('notes') or {}).get('booking_id'))
+        if booking is None:
+            continue
+        if payment is None:
+            payment = Payment(
+                booking_id=booking.id,
+                razorpay_order_id=order_id,
+                amount=entity.get('amount') or int(round((booking.total_amount or 0) * 100)),
+                currency=entity.get('currency', 'INR'),
+            )
+            db.session.add(payment)
+            payments[order_id] = payment
+        targets[order_id] = (payment, booking)
+    return targets
+
+
+def process_webhook_events(batch_size=None):
+    """Apply one batch of stored webhook events. Returns the number of events claimed."""
+    config = current_app.config
+    claimed = _claim_batch(batch_size or config.get('PAYMENT_WEBHOOK_BATCH_SIZE', 100))
+    if not claimed:
+        return 0
+
+    events = PaymentWebhookEvent.query.filter(
+        PaymentWebhookEvent.id.in_(claimed)
+    ).order_by(PaymentWebhookEvent.received_at.asc()).all()
+    entities = {}
+    for event in events:
+        try:
+            entities[event.id] = _payment_entity(json.loads(event.payload))
+        except ValueError:
+            entities[event.id] = {}
+    targets = _load_targets(list(entities.values()))
+
+    changed_vehicles = set()
+    now = datetime.utcnow()
+    max_attempts = config.get('PAYMENT_WEBHOOK_MAX_ATTEMPTS', 5)
+    retry_seconds = config.get('PAYMENT_WEBHOOK_RETRY_SECONDS', 60)
+
+    def retry_later(event, error):
+        event.last_error = error
+        if event.attempts >= max_attempts:
+            event.status = 'failed'
+        else:
+            event.status = 'pending'
+            event.next_attempt_at = now + timedelta(seconds=retry_seconds * event.attempts)
+
+    for event in events:
+        event.attempts = (event.attempts or 0) + 1
+        event.locked_at = None
+        entity = entities[event.id]
+        target = targets.get(entity.get('order_id'))
+        if event.event not in CAPTURED_EVENTS | FAILED_EVENTS:
+            event.status = 'processed'
+            event.processed_at = now
+            continue
+        if target is None:
+            # The order may belong to a booking that is not committed yet; retry a few times
+            retry_later(event, f"No booking found for order {entity.get('order_id')}")
+            continue
+        try:
+            with db.session.begin_nested():
+                vehicle_id = _apply(event.event, entity, *target)
+        except Exception as e:
+            current_app.logger.exception('Applying webhook event %s failed', event.event_id)
+            retry_later(event, str(e))
+            continue
+        if vehicle_id:
+            changed_vehicles.add(vehicle_id)
+        event.status = 'processed'
+        event.processed_at = now
+        event.last_error = None
+    db.session.commit()
+
+    for vehicle_id in changed_vehicles:
+        availability_index.invalidate(vehicle_id)
+    return len(claimed)
+
+
+def _list_orders(start, end):
+    """Fetch every Razorpay order created between ``start`` and ``end`` (datetimes, UTC)."""
+    from app.routes.bookings import RAZORPAY_API_URL, RAZORPAY_KEY_ID, RAZORPAY_KEY_SECRET
+
+    client = get_client('razorpay')
+    orders = {}
+    skip = 0
+    while True:
+        response = client.get(
+            f'{RAZORPAY_API_URL}/orders',
+            auth=(RAZORPAY_KEY_ID, RAZORPAY_KEY_SECRET),
+            params={
+                'from': int((start - datetime(1970, 1, 1)).total_seconds()),
+                'to': int((end - datetime(1970, 1, 1)).total_seconds()),
+                'count': ORDERS_PAGE_SIZE,
+                'skip': skip,
+            },
+        )
+        response.raise_for_status()
+        items = response.json().get('items', [])
+        for order in items:
+            orders[order['id']] = order
+        if len(items) < ORDERS_PAGE_SIZE:
+            return orders
+        skip += ORDERS_PAGE_SIZE
+
+
+def _captured_payment(order_id):
+    from app.routes.bookings import RAZORPAY_API_URL, RAZORPAY_KEY_ID, RAZORPAY_KEY_SECRET
+
+    response = get_client('razorpay').get(
+        f'{RAZORPAY_API_URL}/orders/{order_id}/payments',
+        auth=(RAZORPAY_KEY_ID, RAZORPAY_KEY_SECRET),
+    )
+    response.raise_for_status()
+    for entity in response.json().get('items', []):
+        if entity.get('status') == 'captured':
+            return entity
+    return None
+
+
+def sweep_stale_payments():
+    """Finalize 'created'/'expired' payments whose order was paid but never reported. Returns the count."""
+    config = current_app.config
+    now = datetime.utcnow()
+    newest = now - timedelta(seconds=config.get('PAYMENT_SWEEP_AFTER_SECONDS', 900))
+    oldest = now - timedelta(hours=config.get('PAYMENT_SWEEP_WINDOW_HOURS', 48))
+    stale = Payment.query.join(Booking, Booking.id == Payment.booking_id).filter(
+        Payment.status.in_(('created', 'expired')),
+        Payment.razorpay_order_id != '',
+        Payment.created_at >= oldest,
+        Payment.created_at <= newest,
+        Booking.payment_status == 'pending'
+    ).all()
+    if not stale:
+        return 0
+
+    start = min(p.created_at for p in stale) - timedelta(minutes=1)
+    end = max(p.created_at for p in stale) + timedelta(minutes=1)
+    orders = _list_orders(start, end)
+
+    entities = []
+    for payment in stale:
+        order = orders.get(payment.razorpay_order_id)
+        if order and order.get('status') == 'paid':
+            entity = _captured_payment(order['id'])
+            if entity:
+                entities.append(dict(entity, order_id=order['id']))
+    if not entities:
+        return 0
+
+    targets = _load_targets(entities)
+    changed_vehicles = set()
+    for entity in entities:
+        target = targets.get(entity['order_id'])
+        if target:
+            vehicle_id = _apply('payment.captured', entity, *target)
+            if vehicle_id:
+                changed_vehicles.add(vehicle_id)
+    db.session.commit()
+    for vehicle_id in changed_vehicles:
+        availability_index.invalidate(vehicle_id)
+    current_app.logger.info('Payment sweep finalized %s of %s stale orders', len(entities), len(stale))
+    return len(entities)
+
+
+def run_reconciler(app, stop_event=None):
+    """Apply webhook events and sweep stale payments until ``stop_event`` is set."""
+    poll = app.config.get('PAYMENT_RECONCILER_POLL_SECONDS', 5)
+    sweep_interval = app.config.get('PAYMENT_SWEEP_INTERVAL_SECONDS', 300)
+    next_sweep = time.monotonic() + sweep_interval
+    while stop_event is None or not stop_event.is_set():
+        with app.app_context():
+            try:
+                processed = process_webhook_events()
+                if time.monotonic() >= next_sweep:
+                    next_sweep = time.monotonic() + sweep_interval
+                    sweep_stale_payments()
+            except Exception:
+                app.logger.exception('Payment reconciler iteration failed')
+                processed = 0
+            finally:
+                db.session.remove()
+        if not processed:
+            _wakeup.wait(poll)
+            _wakeup.clear()
+
+
+def init_payment_reconciler(app):
+    """Start PAYMENT_RECONCILER_THREADS reconciler threads in this process on its first request."""
+    threads = app.config.get('PAYMENT_RECONCILER_THREADS', 1)
+    if threads <= 0:
+        return
+
+    @app.before_request
+    def _start_payment_reconcilers():
+        if len(_workers) >= threads:
+            return
+        with _workers_lock:
+            while len(_workers) < threads:
+                worker = threading.Thread(
+                    target=run_reconciler,
+                    args=(app,),
+                    name=f'payment-reconciler-{len(_workers) + 1}',
+                    daemon=True
+                )
+                worker.start()
+                _workers.append(worker)
@@ -0,0 +1,79 @@
+"""
+Per-request SQL query counting.
+
+Used to keep list endpoints free of N+1 query patterns: every statement executed
+while a request is active is counted on ``flask.g`` and, when
+``QUERY_COUNT_HEADER`` is enabled, reported back in the ``X-Query-Count``
+response header so tests can assert an upper bound.
+
+``count_queries`` only sees statements run by its own thread (or asyncio task):
+the active counters live in a ContextVar, so background workers and other request
+threads never add to them.
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from flask import g, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+_listener_installed = False
+# Counters of the enclosing count_queries blocks; a tuple, so a block never mutates another context's value
+_active_counters = ContextVar('active_query_counters', default=())
+
+
+def _on_execute(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context():
+        g.query_count = g.get('query_count', 0) + 1
+    for counter in _active_counters.get():
+        counter.append(statement)
+
+
+def _install_listener():
+    global _listener_installed
+    if not _listener_installed:
+        event.listen(Engine, 'before_cursor_execute', _on_execute)
+        _listener_installed = True
+
+
+def init_query_counter(app):
+    """Expose the number of queries run by each request as ``X-Query-Count``."""
+    if not app.config.get('QUERY_COUNT_HEADER'):
+        return
+    _install_listener()
+
+    @app.before_request
+    def _reset_query_count():
+        g.query_count = 0
+
+    @app.after_request
+    def _add_query_count_header(response):
+        response.headers['X-Query-Count'] = str(g.get('query_count', 0))
+        return response
+
+
+@contextmanager
+def count_queries():
+    """Collect every SQL statement executed inside the block.
+
+    Yields a list that receives the statements, so ``len()`` gives the count.
+    """
+    _install_listener()
+    statements = []
+    token = _active_counters.set(_active_counters.get() + (statements,))
+    try:
+        yield statements
+    finally:
+        _active_counters.reset(token)
+
+
+@contextmanager
+def assert_max_queries(limit):
+    """Fail with AssertionError if the block executes more than ``limit`` queries."""
+    with count_queries() as statements:
+        yield statements
+    if len(statements) > limit:
+        raise AssertionError(
+            f'Expected at most {limit} queries, got {len(statements)}:\n' + '\n'.join(statements)
+        )
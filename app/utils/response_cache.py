@@ -0,0 +1,277 @@
+"""
+Server-side cache for public GET responses.
+
+Cities, catalog brands/models and vehicle detail change rarely but are read on
+every page load. ``cached_response`` stores the rendered body of successful
+responses keyed on path, query string and host (URLs in the payload are built
+from ``request.host_url``), serves it with an ETag and answers a matching
+``If-None-Match`` with 304.
+
+Entries are grouped into namespaces. ``invalidate(namespace)`` replaces the
+namespace's generation token, which is part of every key, so all of its entries
+become unreachable at once without scanning the store; they age out by TTL/LRU.
+
+Backends (RESPONSE_CACHE_BACKEND):
+    memory  - per-process LRU with TTL (default)
+    redis   - shared across workers via RESPONSE_CACHE_REDIS_URL; startup fails if it
+              cannot connect
+    fake    - the shared backend over an in-process fake client, for tests
+"""
+
+import hashlib
+import pickle
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from functools import wraps
+
+from flask import current_app, jsonify, request
+
+
+class MemoryBackend:
+    """Thread-safe LRU with per-entry expiry."""
+
+    name = 'memory'
+
+    def __init__(self, max_entries=1024):
+        self._max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+    def add(self, key, value):
+        """Store ``value`` only if ``key`` is absent; return the stored value."""
+        with self._lock:
+            item = self._entries.get(key)
+            if item is not None:
+                return item[0]
+        self.set(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class SharedBackend:
+    """Backend over a Redis-compatible client (get/set with ex/nx, flushdb)."""
+
+    name = 'redis'
+
+    def __init__(self, client, prefix='rc:'):
+        self._client = client
+        self._prefix = prefix
+
+    def get(self, key):
+        raw = self._client.get(self._prefix + key)
+        return pickle.loads(raw) if raw is not None else None
+
+    def set(self, key, value, ttl=None):
+        self._client.set(self._prefix + key, pickle.dumps(value), ex=ttl)
+
+    def add(self, key, value):
+        if self._client.set(self._prefix + key, pickle.dumps(value), nx=True):
+            return value
+        return self.get(key)
+
+    def clear(self):
+        for key in self._client.scan_iter(self._prefix + '*'):
+            self._client.delete(key)
+
+
+class FakeRedis:
+    """Minimal in-process stand-in for the redis client calls the shared backends make."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data = {}
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires_at = item
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[key]
+                return None
+            return value
+
+    def mget(self, keys):
+        return [self.get(key) for key in keys]
+
+    def set(self, key, value, ex=None, nx=False):
+        with self._lock:
+            if nx and key in self._data:
+                return None
+            self._data[key] = (value, time.monotonic() + ex if ex else None)
+            return True
+
+    def delete(self, key):
+        with self._lock:
+            return 1 if self._data.pop(key, None) is not None else 0
+
+    def incr(self, key):
+        with self._lock:
+            value, expires_at = self._data.get(key, (0, None))
+            if expires_at is not None and expires_at <= time.monotonic():
+                value, expires_at = 0, None
+            value = int(value) + 1
+            self._data[key] = (value, expires_at)
+            return value
+
+    def expire(self, key, seconds):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return False
+            self._data[key] = (item[0], time.monotonic() + seconds)
+            return True
+
+    def scan_iter(self, pattern):
+        prefix = pattern.rstrip('*')
+        with self._lock:
+            return [key for key in self._data if key.startswith(prefix)]
+
+
+def connect_redis(url, setting):
+    """Return a connected Redis client for ``url``, or raise RuntimeError naming ``setting``."""
+    try:
+        import redis
+    except ImportError as e:
+        raise RuntimeError(f'{setting}=redis needs the redis package') from e
+    client = redis.Redis.from_url(url)
+    try:
+        client.ping()
+    except redis.RedisError as e:
+        raise RuntimeError(f'{setting}=redis but {url} is unreachable: {e}') from e
+    return client
+
+
+def _build_backend(app):
+    kind = (app.config.get('RESPONSE_CACHE_BACKEND') or 'memory').lower()
+    if kind == 'redis':
+        return SharedBackend(connect_redis(app.config.get('RESPONSE_CACHE_REDIS_URL'), 'RESPONSE_CACHE_BACKEND'))
+    elif kind == 'fake':
+        backend = SharedBackend(FakeRedis())
+        backend.name = 'fake'
+        return backend
+    return MemoryBackend(app.config.get('RESPONSE_CACHE_MAX_ENTRIES', 1024))
+
+
+class ResponseCache:
+    def __init__(self):
+        self._stats_lock = threading.Lock()
+        self._stats = {}
+
+    def init_app(self, app):
+        app.extensions['response_cache'] = _build_backend(app)
+
+        @app.route('/api/health/cache', methods=['GET'])
+        def response_cache_stats():
+            return jsonify(self.stats()), 200
+
+    @property
+    def backend(self):
+        return current_app.extensions['response_cache']
+
+    def invalidate(self, *namespaces):
+        """Drop every cached response in the given namespaces."""
+        if not current_app.config.get('RESPONSE_CACHE_ENABLED', True):
+            return
+        for namespace in namespaces:
+            self.backend.set(f'gen:{namespace}', uuid.uuid4().hex)
+
+    def stats(self):
+        with self._stats_lock:
+            namespaces = {name: dict(counts) for name, counts in self._stats.items()}
+        totals = {'hits': 0, 'misses': 0, 'not_modified': 0}
+        for counts in namespaces.values():
+            for field in totals:
+                totals[field] += counts[field]
+        return {'backend': self.backend.name, **totals, 'namespaces': namespaces}
+
+    def reset_stats(self):
+        with self._stats_lock:
+            self._stats = {}
+
+    def _record(self, namespace, field):
+        with self._stats_lock:
+            counts = self._stats.setdefault(namespace, {'hits': 0, 'misses': 0, 'not_modified': 0})
+            counts[field] += 1
+
+    def _generation(self, namespace):
+        key = f'gen:{namespace}'
+        return self.backend.get(key) or self.backend.add(key, uuid.uuid4().hex)
+
+    def _key(self, namespaces):
+        generations = ','.join(self._generation(namespace) for namespace in namespaces)
+        query = '&'.join(sorted(f'{k}={v}' for k, v in request.args.items(multi=True)))
+        return f'resp:{request.host_url}{request.path}?{query}|{generations}'
+
+    def _respond(self, entry, namespace, state):
+        body, mimetype, etag = entry
+        if request.if_none_match.contains(etag):
+            self._record(namespace, 'not_modified')
+            response = current_app.response_class(status=304)
+        else:
+            self._record(namespace, 'hits' if state == 'HIT' else 'misses')
+            response = current_app.response_class(body, status=200, mimetype=mimetype)
+        response.set_etag(etag)
+        response.headers['X-Cache'] = state
+        return response
+
+
+response_cache = ResponseCache()
+
+
+def cached_response(namespace, ttl=None, scope=None):
+    """Cache a public GET view's 200 responses under ``namespace``.
+
+    ``scope`` optionally maps the view kwargs to an extra namespace (for example one
+    per vehicle) so a write can drop a single entry instead of the whole namespace.
+    """
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not current_app.config.get('RESPONSE_CACHE_ENABLED', True):
+                return fn(*args, **kwargs)
+
+            namespaces = [namespace]
+            if scope is not None:
+                namespaces.append(scope(**kwargs))
+            key = response_cache._key(namespaces)
+            entry = response_cache.backend.get(key)
+            if entry is not None:
+                return response_cache._respond(entry, namespace, 'HIT')
+
+            response = current_app.make_response(fn(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+            body = response.get_data()
+            entry = (body, response.mimetype, hashlib.sha1(body).hexdigest())
+            timeout = ttl or current_app.config.get('RESPONSE_CACHE_TTL_SECONDS', 300)
+            response_cache.backend.set(key, entry, timeout)
+            return response_cache._respond(entry, namespace, 'MISS')
+        return wrapper
+    return decorator
@@ -2,6 +2,24 @@ from sqlalchemy import inspect, text
 
 from app import db
 
+# Composite indexes for the booking overlap and listing queries (migration be14493d7305)
+HOT_QUERY_INDEXES = {
+    'bookings': {
+        'ix_bookings_vehicle_dates_status': ('vehicle_id', 'start_date', 'end_date', 'status'),
+        'ix_bookings_agency_payment_start': ('agency_id', 'payment_status', 'start_date'),
+        'ix_bookings_customer_start': ('customer_id', 'start_date'),
+    },
+    'vehicles': {
+        'ix_vehicles_available_created': ('is_available', 'created_at'),
+    },
+    'vehicle_images': {
+        'ix_vehicle_images_vehicle_primary': ('vehicle_id', 'is_primary'),
+    },
+    'feedbacks': {
+        'ix_feedbacks_agency_created': ('agency_id', 'created_at'),
+    },
+}
+
 
 def ensure_schema_consistency() -> None:
     """Apply lightweight schema fixes for deployments without migrations."""
@@ -10,6 +28,9 @@ def ensure_schema_consistency() -> None:
     def column_exists(table: str, column: str) -> bool:
         return any(col['name'] == column for col in inspector.get_columns(table))
 
+    def index_exists(table: str, name: str) -> bool:
+        return any(index['name'] == name for index in inspector.get_indexes(table))
+
     # Add avatar_locked to profiles if missing
     if not column_exists('profiles', 'avatar_locked'):
         db.session.execute(text("ALTER TABLE profiles ADD COLUMN avatar_locked BOOLEAN DEFAULT 0"))
@@ -81,3 +102,38 @@ def ensure_schema_consistency() -> None:
         db.session.execute(text("ALTER TABLE vehicles ADD COLUMN timings VARCHAR(100)"))
         db.session.commit()
         inspector = inspect(db.engine)
+
+    # Listing cache columns on vehicles
+    if not column_exists('vehicles', 'primary_image_url'):
+        db.session.execute(text("ALTER TABLE vehicles ADD COLUMN primary_image_url VARCHAR(255)"))
+        db.session.commit()
+        inspector = inspect(db.engine)
+
+    if not column_exists('vehicles', 'agency_name'):
+        db.session.execute(text("ALTER TABLE vehicles ADD COLUMN agency_name VARCHAR(120)"))
+        db.session.commit()
+        inspector = inspect(db.engine)
+
+    if not column_exists('vehicles', 'agency_logo_url'):
+        db.session.execute(text("ALTER TABLE vehicles ADD COLUMN agency_logo_url VARCHAR(255)"))
+        db.session.commit()
+        inspector = inspect(db.engine)
+
+    if not column_exists('vehicles', 'geohash'):
+        db.session.execute(text("ALTER TABLE vehicles ADD COLUMN geohash VARCHAR(12)"))
+        db.session.execute(text("CREATE INDEX ix_vehicles_available_geohash ON vehicles (is_available, geohash)"))
+        db.session.commit()
+        inspector = inspect(db.engine)
+
+    if not column_exists('payments', 'idempotency_key'):
+        db.session.execute(text("ALTER TABLE payments ADD COLUMN idempotency_key VARCHAR(100)"))
+        db.session.execute(text("CREATE UNIQUE INDEX ix_payments_idempotency_key ON payments (idempotency_key)"))
+        db.session.commit()
+        inspector = inspect(db.engine)
+
+    # Hot-query indexes; create_all skips indexes on tables that already exist
+    for table, indexes in HOT_QUERY_INDEXES.items():
+        for name, columns in indexes.items():
+            if not index_exists(table, name):
+                db.session.execute(text(f"CREATE INDEX {name} ON {table} ({', '.join(columns)})"))
+                db.session.commit()
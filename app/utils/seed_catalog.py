@@ -1,6 +1,7 @@
 from app import db
 from app.models.catalog import CatalogBrand, CatalogModel
 from flask import current_app
+from app.utils.response_cache import response_cache
 
 bike_catalog = {
     "Gravton Motors": ["Quanta"],
@@ -312,3 +313,4 @@ def seed_catalogs():
     insert_catalog(bike_catalog, 'bike')
     insert_catalog(car_catalog, 'car')
     db.session.commit()
+    response_cache.invalidate('catalog')
@@ -1,5 +1,6 @@
 from app import db
 from app.models import City
+from app.utils.response_cache import response_cache
 
 CITY_NAMES = [
     # Major Metropolitan Cities
@@ -676,10 +677,12 @@ CITY_NAMES = [
 
 def seed_cities() -> None:
     existing = {city.name for city in City.query.all()}
-    new_cities = [City(name=name) for name in CITY_NAMES if name not in existing]
+    # CITY_NAMES repeats a few names; insert each once
+    new_cities = [City(name=name) for name in dict.fromkeys(CITY_NAMES) if name not in existing]
 
     if not new_cities:
         return
 
     db.session.bulk_save_objects(new_cities)
     db.session.commit()
+    response_cache.invalidate('cities')
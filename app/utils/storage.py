@@ -0,0 +1,474 @@
+"""
+One storage interface for uploaded files.
+
+``file_storage.put`` streams an upload to the configured backend under a
+content-addressed key (``<prefix>/<sha256>.<ext>``) and returns the URL to keep in
+the database. Uploading the same bytes to the same prefix again reuses the stored
+file. Files replaced by a newer upload are removed with ``delete_later`` on a small
+background pool (STORAGE_DELETE_WORKERS; 0 deletes inline), so the request does not
+wait on the delete.
+
+Backends (STORAGE_BACKEND):
+    gcs     - objects in GCS_BUCKET, served by the bucket; the default when GCS_BUCKET
+              is set, and the one to use with more than one instance
+    local   - files under UPLOAD_DIR, served by /uploads/<key>; every instance needs
+              the same disk
+    memory  - per-process dict served by /uploads/<key>, for tests
+
+URLs from another backend (e.g. /uploads/... links written before a move to GCS)
+are never deleted. On the gcs backend /uploads/<key> serves the file from UPLOAD_DIR
+while it is still there and otherwise redirects (302) to the same key in the bucket,
+so old links keep working before and after ``python manage.py migrate-local-uploads``
+copies the folder into the bucket.
+
+KYC documents (keys under gcs.PRIVATE_PREFIXES) are private on the gcs backend:
+responses pass stored URLs through ``file_storage.access_url``, which swaps them for
+short-lived signed GET URLs, and /uploads/<key> answers 404 for them.
+
+Upload bodies are never read into memory whole. MAX_CONTENT_LENGTH (and the
+stricter ``limit_request_size`` on a route) rejects oversized requests while the
+body is read; werkzeug spools file parts to temp files past 500 KB; and
+``validate_upload`` checks each file's size and leading bytes with seek/tell and a
+16-byte read before it is copied to the backend in CHUNK_SIZE pieces.
+"""
+
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+from urllib.parse import unquote
+
+from flask import Response, abort, current_app, jsonify, redirect, request, send_from_directory
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.wsgi import LimitedStream
+
+from app.utils import gcs
+
+CHUNK_SIZE = 64 * 1024
+# Non-seekable streams are spooled to a temp file, in memory up to this size
+SPOOL_MAX_BYTES = 1024 * 1024
+# Room for multipart boundaries and form fields on top of the file limits
+FORM_OVERHEAD_BYTES = 64 * 1024
+SNIFF_BYTES = 16
+
+CONTENT_TYPES = {
+    'jpg': 'image/jpeg',
+    'jpeg': 'image/jpeg',
+    'png': 'image/png',
+    'webp': 'image/webp',
+    'avif': 'image/avif',
+    'pdf': 'application/pdf',
+}
+
+# Leading bytes of each format, so a renamed file is rejected
+MAGIC_CHECKS = {
+    'jpg': lambda head: head.startswith(b'\xff\xd8\xff'),
+    'jpeg': lambda head: head.startswith(b'\xff\xd8\xff'),
+    'png': lambda head: head.startswith(b'\x89PNG\r\n\x1a\n'),
+    'webp': lambda head: head[:4] == b'RIFF' and head[8:12] == b'WEBP',
+    'avif': lambda head: head[4:8] == b'ftyp' and head[8:12] in (b'avif', b'avis'),
+    'pdf': lambda head: head.startswith(b'%PDF-'),
+}
+
+
+def file_extension(filename, allowed):
+    """Return the lower-cased extension of ``filename`` if it is in ``allowed``, else None."""
+    if not filename or '.' not in filename:
+        return None
+    ext = filename.rsplit('.', 1)[1].lower()
+    return ext if ext in allowed else None
+
+
+def upload_max_bytes():
+    """Default per-file limit (UPLOAD_MAX_MB) for uploads without a stricter one."""
+    return current_app.config.get('UPLOAD_MAX_MB', 10) * 1024 * 1024
+
+
+def validate_upload(file, allowed, max_bytes):
+    """Check an uploaded file without reading it into memory.
+
+    Returns ``(ext, None)`` when the extension is allowed, the size is within
+    ``max_bytes`` and the leading bytes match the extension; otherwise
+    ``(None, error message)``. The stream is left at its start.
+    """
+    ext = file_extension(file.filename, allowed)
+    if not ext:
+        return None, 'File type not allowed'
+    stream = file.stream
+    stream.seek(0, os.SEEK_END)
+    size = stream.tell()
+    stream.seek(0)
+    if size == 0:
+        return None, 'File is empty'
+    if size > max_bytes:
+        return None, 'File size exceeds limit'
+    head = stream.read(SNIFF_BYTES)
+    stream.seek(0)
+    check = MAGIC_CHECKS.get(ext)
+    if check is not None and not check(head):
+        return None, 'File content does not match its type'
+    return ext, None
+
+
+def limit_request_size(max_bytes):
+    """Reject request bodies over ``max_bytes`` (an int or a callable) with 413.
+
+    A larger Content-Length is refused before anything is read; a body without one
+    (chunked) is cut off as soon as it passes the limit. Put it below the auth
+    decorators so the check runs before form parsing.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            limit = max_bytes() if callable(max_bytes) else max_bytes
+            length = request.content_length
+            if length is not None and length > limit:
+                raise RequestEntityTooLarge()
+            if length is None:
+                request.environ['wsgi.input'] = LimitedStream(request.environ['wsgi.input'], limit, is_max=True)
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _hash_stream(stream):
+    """Return ``(sha256 hex, stream)`` with the stream positioned where it started.
+
+    The stream is read in chunks; one that cannot seek is copied to a spooled temp
+    file on the way through and that copy is returned instead.
+    """
+    digest = hashlib.sha256()
+    try:
+        start = stream.tell()
+        stream.seek(start)
+    except (AttributeError, OSError, ValueError):
+        spooled = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES)
+        for chunk in iter(lambda: stream.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+            spooled.write(chunk)
+        spooled.seek(0)
+        return digest.hexdigest(), spooled
+    for chunk in iter(lambda: stream.read(CHUNK_SIZE), b''):
+        digest.update(chunk)
+    stream.seek(start)
+    return digest.hexdigest(), stream
+
+
+class LocalBackend:
+    """Files on the local filesystem under ``root``."""
+
+    name = 'local'
+
+    def __init__(self, root, url_prefix='/uploads'):
+        self.root = root
+        self.url_prefix = url_prefix
+
+    def _path(self, key):
+        path = os.path.abspath(os.path.join(self.root, key))
+        if not path.startswith(os.path.abspath(self.root) + os.sep):
+            raise ValueError(f'Invalid storage key: {key}')
+        return path
+
+    def write(self, key, stream, content_type=None):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temp file and rename so readers never see a partial file
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.upload-')
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                shutil.copyfileobj(stream, out, CHUNK_SIZE)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    def write_many(self, items):
+        for key, stream, content_type in items:
+            if not self.exists(key):
+                self.write(key, stream, content_type)
+
+    def exists(self, key):
+        return os.path.isfile(self._path(key))
+
+    def read(self, key):
+        with open(self._path(key), 'rb') as f:
+            return f.read()
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    def url(self, key):
+        return f'{self.url_prefix}/{key}'
+
+    def access_url(self, key):
+        return self.url(key)
+
+    def key_for_url(self, url):
+        prefix = self.url_prefix + '/'
+        return url[len(prefix):] if url and url.startswith(prefix) else None
+
+    def serve(self, key):
+        return send_from_directory(self.root, key, as_attachment=False)
+
+
+class GCSBackend:
+    """Objects in GCS_BUCKET through the shared client in app.utils.gcs."""
+
+    name = 'gcs'
+
+    def __init__(self, bucket_name, legacy_root=None):
+        self.url_prefix = f'https://storage.googleapis.com/{bucket_name}/'
+        # Uploads from before the move to GCS, served until they are migrated
+        self.legacy = LocalBackend(legacy_root) if legacy_root else None
+        # key -> (signed URL, monotonic time to stop handing it out)
+        self._signed = {}
+        self._lock = threading.Lock()
+
+    def write(self, key, stream, content_type=None):
+        gcs.upload_files([(key, stream, content_type)])
+
+    def write_many(self, items):
+        # The existence checks run on the upload pool alongside the uploads
+        gcs.upload_files(items, skip_existing=True)
+
+    def exists(self, key):
+        return gcs.get_bucket().blob(key).exists()
+
+    def read(self, key):
+        return gcs.get_bucket().blob(key).download_as_bytes()
+
+    def delete(self, key):
+        blob = gcs.get_bucket().blob(key)
+        if blob.exists():
+            blob.delete()
+
+    def url(self, key):
+        return gcs.get_bucket().blob(key).public_url
+
+    def access_url(self, key):
+        if not gcs.is_private(key):
+            return self.url(key)
+        now = time.monotonic()
+        cached = self._signed.get(key)
+        if cached is not None and cached[1] > now:
+            return cached[0]
+        url, expires_in = gcs.generate_download_url(key)
+        with self._lock:
+            if len(self._signed) >= 1024:
+                self._signed = {k: v for k, v in self._signed.items() if v[1] > now}
+            # Reused for half its lifetime so every caller gets at least the other half
+            self._signed[key] = (url, now + expires_in.total_seconds() / 2)
+        return url
+
+    def key_for_url(self, url):
+        return unquote(url[len(self.url_prefix):]) if url and url.startswith(self.url_prefix) else None
+
+    def serve(self, key):
+        if gcs.is_private(key):
+            # Private objects, on disk or in the bucket, are only reachable through access_url
+            abort(404)
+        try:
+            if self.legacy is not None and self.legacy.exists(key):
+                return self.legacy.serve(key)
+        except ValueError:
+            abort(404)
+        # Temporary: a cached 301 would outlive a migration or an object turning private
+        return redirect(self.url(key), code=302)
+
+
+class MemoryBackend:
+    """Per-process dict of key -> (bytes, content type)."""
+
+    name = 'memory'
+
+    def __init__(self, url_prefix='/uploads'):
+        self.url_prefix = url_prefix
+        self.objects = {}
+        self._lock = threading.Lock()
+
+    def write(self, key, stream, content_type=None):
+        data = stream.read()
+        with self._lock:
+            self.objects[key] = (data, content_type)
+
+    def write_many(self, items):
+        for key, stream, content_type in items:
+            if not self.exists(key):
+                self.write(key, stream, content_type)
+
+    def exists(self, key):
+        return key in self.objects
+
+    def read(self, key):
+        return self.objects[key][0]
+
+    def delete(self, key):
+        with self._lock:
+            self.objects.pop(key, None)
+
+    def url(self, key):
+        return f'{self.url_prefix}/{key}'
+
+    def access_url(self, key):
+        return self.url(key)
+
+    def key_for_url(self, url):
+        prefix = self.url_prefix + '/'
+        return url[len(prefix):] if url and url.startswith(prefix) else None
+
+    def serve(self, key):
+        item = self.objects.get(key)
+        if item is None:
+            abort(404)
+        data, content_type = item
+        return Response(data, mimetype=content_type or 'application/octet-stream')
+
+
+def _build_backend(app):
+    kind = (app.config.get('STORAGE_BACKEND') or 'local').lower()
+    if kind == 'gcs':
+        if gcs.gcs_available and gcs.GCS_BUCKET:
+            return GCSBackend(gcs.GCS_BUCKET, legacy_root=app.config['UPLOAD_DIR'])
+        app.logger.warning('GCS storage unavailable (google-cloud-storage missing or GCS_BUCKET unset); using local disk')
+    elif kind == 'memory':
+        return MemoryBackend()
+    return LocalBackend(app.config['UPLOAD_DIR'])
+
+
+class FileStorage:
+    def __init__(self):
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        app.extensions['file_storage'] = _build_backend(app)
+
+        @app.errorhandler(RequestEntityTooLarge)
+        def request_too_large(e):
+            return jsonify({'error': 'File size exceeds limit'}), 413
+
+    @property
+    def backend(self):
+        return current_app.extensions['file_storage']
+
+    def put(self, prefix, stream, ext, content_type=None):
+        """Store ``stream`` under ``<prefix>/<sha256>.<ext>`` and return its URL."""
+        return self.put_many([(prefix, stream, ext, content_type)])[0]
+
+    def put_many(self, items):
+        """Store ``(prefix, stream, ext, content_type)`` items; returns URLs in order.
+
+        The items go to the backend in one batch (concurrently on GCS); files already
+        stored under the same key are not written again.
+        """
+        backend = self.backend
+        keys = []
+        pending = {}
+        for prefix, stream, ext, content_type in items:
+            digest, stream = _hash_stream(stream)
+            key = f'{prefix}/{digest}.{ext}'
+            keys.append(key)
+            pending.setdefault(key, (key, stream, content_type))
+        backend.write_many(list(pending.values()))
+        return [backend.url(key) for key in keys]
+
+    def delete_later(self, url, keep=()):
+        """Delete the file behind ``url`` in the background, unless it is in ``keep``.
+
+        URLs that do not belong to the current backend are ignored.
+        """
+        if not url or url in keep:
+            return
+        backend = self.backend
+        key = backend.key_for_url(url)
+        if key is None:
+            return
+        workers = current_app.config.get('STORAGE_DELETE_WORKERS', 2)
+        if workers <= 0:
+            self._delete(current_app._get_current_object(), backend, key)
+        else:
+            self._pool(workers).submit(self._delete, current_app._get_current_object(), backend, key)
+
+    def _pool(self, workers):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='storage-delete')
+        return self._executor
+
+    @staticmethod
+    def _delete(app, backend, key):
+        with app.app_context():
+            try:
+                backend.delete(key)
+            except Exception as e:
+                app.logger.warning('Could not delete stored file %s: %s', key, e)
+
+    def serve(self, key):
+        return self.backend.serve(key)
+
+    def access_url(self, url):
+        """Return the URL a client should use to fetch ``url``: a signed, short-lived one
+        for private objects on the gcs backend, otherwise ``url`` itself."""
+        if not url:
+            return url
+        backend = self.backend
+        key = backend.key_for_url(url)
+        legacy_key = url[len('/uploads/'):] if url.startswith('/uploads/') else None
+        if key is None and backend.name == 'gcs' and legacy_key and gcs.is_private(legacy_key):
+            # Saved before the move to GCS; migrate-local-uploads copies it to the same key
+            key = legacy_key
+        if key is None:
+            return url
+        try:
+            return backend.access_url(key)
+        except Exception as e:
+            current_app.logger.error('Could not sign a URL for %s: %s', key, e)
+            return None
+
+    def migrate_local(self, root, batch_size=50):
+        """Copy the files under ``root`` into the current backend at the same keys.
+
+        Keys already stored are skipped, so an interrupted run can be repeated. Returns
+        the number of files looked at; the local copies are left in place.
+        """
+        backend = self.backend
+        if isinstance(backend, LocalBackend) and os.path.abspath(backend.root) == os.path.abspath(root):
+            return 0
+        count = 0
+        batch = []
+
+        def flush():
+            try:
+                backend.write_many(list(batch))
+            finally:
+                for _, stream, _ in batch:
+                    stream.close()
+            batch.clear()
+
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames[:] = [name for name in dirnames if not name.startswith('.')]
+            for filename in filenames:
+                # Skip dotfiles, including half-written .upload-* temp files
+                if filename.startswith('.'):
+                    continue
+                path = os.path.join(dirpath, filename)
+                key = os.path.relpath(path, root).replace(os.sep, '/')
+                ext = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+                batch.append((key, open(path, 'rb'), CONTENT_TYPES.get(ext)))
+                count += 1
+                if len(batch) >= batch_size:
+                    flush()
+        if batch:
+            flush()
+        return count
+
+
+file_storage = FileStorage()
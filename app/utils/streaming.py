@@ -0,0 +1,36 @@
+"""
+Streaming NDJSON responses for large list endpoints.
+
+``stream=1`` or ``Accept: application/x-ndjson`` switches a list endpoint from one
+JSON document to newline-delimited JSON: rows are pulled from the database with a
+server-side cursor (``yield_per``) and written out as they arrive, so memory use
+does not grow with the size of the result.
+"""
+
+import json
+
+from flask import Response, stream_with_context
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+
+
+def wants_stream(request) -> bool:
+    if (request.args.get('stream') or '').lower() in ('1', 'true', 'yes'):
+        return True
+    # Only an explicit preference counts; */* keeps the regular JSON response
+    accept = request.accept_mimetypes
+    return accept[NDJSON_MIMETYPE] > accept['application/json']
+
+
+def ndjson_response(items) -> Response:
+    """Stream an iterable of JSON-serializable dicts, one per line."""
+    def generate():
+        for item in items:
+            yield json.dumps(item, separators=(',', ':'), default=str) + '\n'
+
+    return Response(stream_with_context(generate()), mimetype=NDJSON_MIMETYPE)
+
+
+def stream_rows(query, batch_size=500):
+    """Iterate ``query`` through a server-side cursor ``batch_size`` rows at a time."""
+    return query.yield_per(batch_size)
@@ -0,0 +1,272 @@
+"""
+In-process search index for vehicle make/model/location.
+
+``ilike('%term%')`` cannot use a B-tree index, so every ``q``/``location``
+search scans the vehicles table. This index keeps a trigram inverted index over
+the distinct lowercased values of each searchable field (make/model/location
+values repeat heavily across a fleet), mapping every value to the ids of the
+vehicles that carry it. A lookup intersects the posting lists of the term's
+trigrams, confirms the substring match on the few surviving values and returns
+the matching vehicle ids, so results are exactly those of the ILIKE filter.
+
+Terms the index cannot answer exactly (shorter than three characters, or
+containing SQL wildcards) and very broad terms return None so the caller keeps
+the ILIKE path. When a term matches nothing, ``suggest`` offers the closest
+CatalogBrand/CatalogModel name as a typo correction.
+
+Writes update the index incrementally and go out on the change feed
+(app/utils/change_feed.py), so with a shared feed other processes reload those
+vehicles before their next search. A full rebuild every
+VEHICLE_SEARCH_INDEX_TTL_SECONDS runs on a background thread while searches keep
+using the previous snapshot; writes made during the rebuild are replayed onto the
+new snapshot. Until the first build finishes searches use ILIKE.
+"""
+
+import difflib
+import threading
+import time
+
+from flask import current_app
+from sqlalchemy import case, func, or_
+
+from app import db
+from app.models.catalog import CatalogBrand, CatalogModel
+from app.models.vehicle import Vehicle
+from app.utils.change_feed import FULL, change_feed
+
+FIELDS = ('make', 'model', 'location')
+FEED = 'vehicles'
+GRAM = 3
+
+
+def _doc(make, model, location):
+    return tuple((value or '').lower() for value in (make, model, location))
+
+
+def _grams(value):
+    return {value[i:i + GRAM] for i in range(len(value) - GRAM + 1)}
+
+
+class _FieldIndex:
+    """Trigram index over the distinct values of one column."""
+
+    __slots__ = ('ids_by_value', 'values_by_gram')
+
+    def __init__(self):
+        self.ids_by_value = {}
+        self.values_by_gram = {}
+
+    def add(self, value, vehicle_id):
+        ids = self.ids_by_value.get(value)
+        if ids is None:
+            ids = self.ids_by_value[value] = set()
+            for gram in _grams(value):
+                self.values_by_gram.setdefault(gram, set()).add(value)
+        ids.add(vehicle_id)
+
+    def discard(self, value, vehicle_id):
+        ids = self.ids_by_value.get(value)
+        if ids is None:
+            return
+        ids.discard(vehicle_id)
+        if not ids:
+            del self.ids_by_value[value]
+            for gram in _grams(value):
+                values = self.values_by_gram.get(gram)
+                if values is not None:
+                    values.discard(value)
+                    if not values:
+                        del self.values_by_gram[gram]
+
+    def match(self, term, into):
+        postings = []
+        for gram in _grams(term):
+            values = self.values_by_gram.get(gram)
+            if not values:
+                return
+            postings.append(values)
+        postings.sort(key=len)
+        candidates = set(postings[0]).intersection(*postings[1:])
+        for value in candidates:
+            if term in value:
+                into.update(self.ids_by_value[value])
+
+
+class VehicleSearchIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._fields = {field: _FieldIndex() for field in FIELDS}
+        self._docs = {}
+        self._catalog = _FieldIndex()
+        self._ready = False
+        self._built_at = None
+        self._feed_version = None
+        self._builder = None
+        # vehicle id -> doc (None when removed) for writes made while a rebuild runs
+        self._replay = None
+
+    def match(self, term, fields=FIELDS):
+        """Return ids of vehicles whose ``fields`` contain ``term`` (case-insensitive),
+        or None when the caller should fall back to ILIKE."""
+        term = (term or '').lower()
+        if len(term) < GRAM or '%' in term or '_' in term:
+            return None
+        if not self._ensure_fresh():
+            return None
+        ids = set()
+        with self._lock:
+            for field in fields:
+                self._fields[field].match(term, ids)
+        if len(ids) > current_app.config.get('VEHICLE_SEARCH_MAX_IDS', 5000):
+            return None
+        return ids
+
+    def suggest(self, term):
+        """Return the catalog brand/model name closest to ``term``, if any is close enough."""
+        term = (term or '').strip().lower()
+        if len(term) < GRAM or not self._ensure_fresh():
+            return None
+        with self._lock:
+            names = set()
+            for gram in _grams(term):
+                names.update(self._catalog.values_by_gram.get(gram, ()))
+            originals = {name: next(iter(self._catalog.ids_by_value[name])) for name in names}
+        close = difflib.get_close_matches(term, list(originals), n=1, cutoff=0.75)
+        return originals[close[0]] if close else None
+
+    def update(self, vehicle):
+        self._apply({vehicle.id: _doc(vehicle.make, vehicle.model, vehicle.location)})
+        change_feed.publish(FEED, vehicle.id)
+
+    def remove(self, vehicle_id):
+        self._apply({vehicle_id: None})
+        change_feed.publish(FEED, vehicle_id)
+
+    def invalidate(self):
+        with self._lock:
+            self._built_at = None
+        change_feed.publish(FEED, FULL)
+
+    def wait(self, timeout=None):
+        """Wait for a running rebuild to finish (for tests and scripts)."""
+        builder = self._builder
+        if builder is not None:
+            builder.join(timeout)
+
+    def _apply(self, docs):
+        with self._lock:
+            for vehicle_id, doc in docs.items():
+                self._remove(vehicle_id)
+                if doc is not None:
+                    self._add(vehicle_id, doc)
+            if self._replay is not None:
+                self._replay.update(docs)
+
+    def _ensure_fresh(self):
+        """Start a background rebuild when one is due and apply changes from other
+        processes. Returns False while there is no snapshot to search yet."""
+        self._sync()
+        ttl = current_app.config.get('VEHICLE_SEARCH_INDEX_TTL_SECONDS', 300)
+        with self._lock:
+            due = self._built_at is None or time.monotonic() - self._built_at > ttl
+            if due and self._replay is None:
+                self._replay = {}
+                self._builder = threading.Thread(
+                    target=self._rebuild,
+                    args=(current_app._get_current_object(),),
+                    name='vehicle-search-rebuild',
+                    daemon=True
+                )
+                self._builder.start()
+            return self._ready
+
+    def _sync(self):
+        with self._lock:
+            since = self._feed_version
+        if since is None:
+            return
+        version, changed = change_feed.changes(FEED, since)
+        if changed is None:
+            with self._lock:
+                self._built_at = None
+            return
+        if changed:
+            docs = dict.fromkeys(changed)
+            rows = db.session.query(Vehicle.id, Vehicle.make, Vehicle.model, Vehicle.location).filter(
+                Vehicle.id.in_(changed)
+            )
+            for vehicle_id, make, model, location in rows:
+                docs[vehicle_id] = _doc(make, model, location)
+            self._apply(docs)
+        with self._lock:
+            self._feed_version = max(self._feed_version, version)
+
+    def _rebuild(self, app):
+        # Runs on its own thread; searches keep using the previous snapshot meanwhile
+        with app.app_context():
+            try:
+                version, _ = change_feed.changes(FEED, None)
+                fields = {field: _FieldIndex() for field in FIELDS}
+                docs = {}
+                rows = db.session.query(Vehicle.id, Vehicle.make, Vehicle.model, Vehicle.location).yield_per(5000)
+                for vehicle_id, make, model, location in rows:
+                    doc = docs[vehicle_id] = _doc(make, model, location)
+                    for field, value in zip(FIELDS, doc):
+                        if value:
+                            fields[field].add(value, vehicle_id)
+
+                catalog = _FieldIndex()
+                for (name,) in db.session.query(CatalogBrand.name).union(db.session.query(CatalogModel.name)):
+                    catalog.add(name.lower(), name)
+            except Exception:
+                app.logger.exception('Vehicle search index rebuild failed')
+                with self._lock:
+                    self._replay = None
+                return
+            finally:
+                db.session.remove()
+
+            with self._lock:
+                self._fields = fields
+                self._docs = docs
+                self._catalog = catalog
+                # Writes made while the rows were read may be missing from the snapshot
+                for vehicle_id, doc in self._replay.items():
+                    self._remove(vehicle_id)
+                    if doc is not None:
+                        self._add(vehicle_id, doc)
+                self._replay = None
+                self._ready = True
+                self._built_at = time.monotonic()
+                self._feed_version = version
+
+    def _add(self, vehicle_id, doc):
+        self._docs[vehicle_id] = doc
+        for field, value in zip(FIELDS, doc):
+            if value:
+                self._fields[field].add(value, vehicle_id)
+
+    def _remove(self, vehicle_id):
+        doc = self._docs.pop(vehicle_id, None)
+        if doc is None:
+            return
+        for field, value in zip(FIELDS, doc):
+            if value:
+                self._fields[field].discard(value, vehicle_id)
+
+
+def rank_expression(term):
+    """SQL ordering key for ``q`` results: exact make/model, then prefix, then make/model
+    substring, then location-only matches."""
+    lowered = term.lower()
+    like_prefix = f"{term}%"
+    like_term = f"%{term}%"
+    return case(
+        (or_(func.lower(Vehicle.make) == lowered, func.lower(Vehicle.model) == lowered), 0),
+        (or_(Vehicle.make.ilike(like_prefix), Vehicle.model.ilike(like_prefix)), 1),
+        (or_(Vehicle.make.ilike(like_term), Vehicle.model.ilike(like_term)), 2),
+        else_=3
+    )
+
+
+vehicle_search_index = VehicleSearchIndex()
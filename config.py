@@ -66,17 +66,128 @@ class Config:
     
     # OTP Configuration
     OTP_EXPIRY_MINUTES = 10
+    OTP_MAX_ATTEMPTS = int(os.getenv('OTP_MAX_ATTEMPTS', '5'))
+    # Pending OTPs (see app/utils/otp_store.py); use redis when running more than one worker
+    OTP_STORE_BACKEND = os.getenv('OTP_STORE_BACKEND', 'memory')
+    OTP_STORE_REDIS_URL = os.getenv('OTP_STORE_REDIS_URL', 'redis://localhost:6379/0')
+    OTP_STORE_MAX_ENTRIES = int(os.getenv('OTP_STORE_MAX_ENTRIES', '10000'))
+
+    # Uploaded files (see app/utils/storage.py): gcs, local or memory
+    STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'gcs' if os.getenv('GCS_BUCKET') else 'local')
+    STORAGE_DELETE_WORKERS = int(os.getenv('STORAGE_DELETE_WORKERS', '2'))
+    # Per-file limit where a route has no stricter one, and the cap on any request body
+    UPLOAD_MAX_MB = int(os.getenv('UPLOAD_MAX_MB', '10'))
+    MAX_CONTENT_LENGTH = int(os.getenv('MAX_REQUEST_MB', '50')) * 1024 * 1024
+
+    # Google Cloud Storage uploads (see app/utils/gcs.py)
+    GCS_UPLOAD_WORKERS = int(os.getenv('GCS_UPLOAD_WORKERS', '8'))
+    GCS_UPLOAD_ACL = os.getenv('GCS_UPLOAD_ACL', 'publicRead')
+    GCS_UPLOAD_CHUNK_SIZE_MB = int(os.getenv('GCS_UPLOAD_CHUNK_SIZE_MB', '8'))
+    # Direct-to-bucket uploads through signed PUT URLs (see app/routes/uploads.py)
+    GCS_SIGNED_URL_EXPIRY_SECONDS = int(os.getenv('GCS_SIGNED_URL_EXPIRY_SECONDS', '900'))
+    # Signed GET URLs for private objects (KYC documents under kyc/)
+    GCS_PRIVATE_URL_EXPIRY_SECONDS = int(os.getenv('GCS_PRIVATE_URL_EXPIRY_SECONDS', '300'))
+
+    # Razorpay order creation (see app/utils/payment_orders.py)
+    RAZORPAY_ORDER_WORKERS = int(os.getenv('RAZORPAY_ORDER_WORKERS', '4'))
+    RAZORPAY_ORDER_TIMEOUT_SECONDS = float(os.getenv('RAZORPAY_ORDER_TIMEOUT_SECONDS', '20'))
+    PAYMENT_ORDER_REUSE_SECONDS = int(os.getenv('PAYMENT_ORDER_REUSE_SECONDS', '900'))
+
+    # Razorpay webhook inbox and reconciler (see app/utils/payment_reconciler.py)
+    PAYMENT_RECONCILER_THREADS = int(os.getenv('PAYMENT_RECONCILER_THREADS', '1'))
+    PAYMENT_RECONCILER_POLL_SECONDS = int(os.getenv('PAYMENT_RECONCILER_POLL_SECONDS', '5'))
+    PAYMENT_RECONCILER_LOCK_TIMEOUT_SECONDS = int(os.getenv('PAYMENT_RECONCILER_LOCK_TIMEOUT_SECONDS', '300'))
+    PAYMENT_WEBHOOK_BATCH_SIZE = int(os.getenv('PAYMENT_WEBHOOK_BATCH_SIZE', '100'))
+    PAYMENT_WEBHOOK_MAX_ATTEMPTS = int(os.getenv('PAYMENT_WEBHOOK_MAX_ATTEMPTS', '5'))
+    PAYMENT_WEBHOOK_RETRY_SECONDS = int(os.getenv('PAYMENT_WEBHOOK_RETRY_SECONDS', '60'))
+    PAYMENT_SWEEP_INTERVAL_SECONDS = int(os.getenv('PAYMENT_SWEEP_INTERVAL_SECONDS', '300'))
+    PAYMENT_SWEEP_AFTER_SECONDS = int(os.getenv('PAYMENT_SWEEP_AFTER_SECONDS', '900'))
+    PAYMENT_SWEEP_WINDOW_HOURS = int(os.getenv('PAYMENT_SWEEP_WINDOW_HOURS', '48'))
+
+    # Thumbnail and WebP/AVIF variants of vehicle and agency photos (see app/utils/image_variants.py)
+    IMAGE_VARIANT_THREADS = int(os.getenv('IMAGE_VARIANT_THREADS', '1'))
+    IMAGE_VARIANT_PROCESSES = int(os.getenv('IMAGE_VARIANT_PROCESSES', '2'))
+    IMAGE_VARIANT_SIZES = os.getenv('IMAGE_VARIANT_SIZES', 'thumb:320,card:640,full:1600')
+    IMAGE_VARIANT_FORMATS = os.getenv('IMAGE_VARIANT_FORMATS', 'webp,avif')
+    IMAGE_VARIANT_QUALITY = int(os.getenv('IMAGE_VARIANT_QUALITY', '80'))
+    IMAGE_VARIANT_BATCH_SIZE = int(os.getenv('IMAGE_VARIANT_BATCH_SIZE', '16'))
+    IMAGE_VARIANT_MAX_ATTEMPTS = int(os.getenv('IMAGE_VARIANT_MAX_ATTEMPTS', '3'))
+    IMAGE_VARIANT_RETRY_SECONDS = int(os.getenv('IMAGE_VARIANT_RETRY_SECONDS', '60'))
+    IMAGE_VARIANT_POLL_SECONDS = int(os.getenv('IMAGE_VARIANT_POLL_SECONDS', '5'))
+    IMAGE_VARIANT_LOCK_TIMEOUT_SECONDS = int(os.getenv('IMAGE_VARIANT_LOCK_TIMEOUT_SECONDS', '600'))
+
+    # Password hashing process pool (see app/utils/password_hashing.py)
+    PASSWORD_HASH_METHOD = os.getenv('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+    PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', '2'))
+    PASSWORD_HASH_QUEUE_SIZE = int(os.getenv('PASSWORD_HASH_QUEUE_SIZE', '16'))
+    PASSWORD_HASH_QUEUE_TIMEOUT_SECONDS = float(os.getenv('PASSWORD_HASH_QUEUE_TIMEOUT_SECONDS', '5'))
+
+    # Google sign-in (see app/utils/google_auth.py); GOOGLE_CLIENT_IDS is comma-separated
+    GOOGLE_CLIENT_IDS = os.getenv('GOOGLE_CLIENT_IDS', '')
+    GOOGLE_CERTS_URL = os.getenv('GOOGLE_CERTS_URL', 'https://www.googleapis.com/oauth2/v3/certs')
+    GOOGLE_TOKEN_VERIFICATION = os.getenv('GOOGLE_TOKEN_VERIFICATION', 'local')
+
+    # Shared outbound HTTP clients (see app/utils/http_client.py)
+    HTTP_CONNECT_TIMEOUT_SECONDS = float(os.getenv('HTTP_CONNECT_TIMEOUT_SECONDS', '3.05'))
+    HTTP_POOL_MAXSIZE = int(os.getenv('HTTP_POOL_MAXSIZE', '10'))
+    HTTP_RETRY_BUDGET_RATIO = float(os.getenv('HTTP_RETRY_BUDGET_RATIO', '0.2'))
+    HTTP_CIRCUIT_FAILURE_THRESHOLD = int(os.getenv('HTTP_CIRCUIT_FAILURE_THRESHOLD', '5'))
+    HTTP_CIRCUIT_RESET_SECONDS = int(os.getenv('HTTP_CIRCUIT_RESET_SECONDS', '30'))
+
+    # Outbound e-mail outbox (see app/utils/mail_queue.py)
+    ZEPTOMAIL_TIMEOUT_SECONDS = int(os.getenv('ZEPTOMAIL_TIMEOUT_SECONDS', '10'))
+    MAIL_WORKER_THREADS = int(os.getenv('MAIL_WORKER_THREADS', '1'))
+    MAIL_WORKER_POLL_SECONDS = int(os.getenv('MAIL_WORKER_POLL_SECONDS', '5'))
+    MAIL_BATCH_SIZE = int(os.getenv('MAIL_BATCH_SIZE', '20'))
+    MAIL_MAX_ATTEMPTS = int(os.getenv('MAIL_MAX_ATTEMPTS', '6'))
+    MAIL_RETRY_BASE_SECONDS = int(os.getenv('MAIL_RETRY_BASE_SECONDS', '30'))
+    MAIL_RETRY_MAX_SECONDS = int(os.getenv('MAIL_RETRY_MAX_SECONDS', '3600'))
+    MAIL_LOCK_TIMEOUT_SECONDS = int(os.getenv('MAIL_LOCK_TIMEOUT_SECONDS', '300'))
+
+    # Worker processes serving requests; gunicorn.conf.py sets this for its workers
+    WEB_WORKERS = int(os.getenv('WEB_WORKERS', '1'))
+    # Cross-process invalidation of the in-memory indexes (see app/utils/change_feed.py);
+    # use redis with more than one worker or instance
+    CHANGE_FEED_BACKEND = os.getenv('CHANGE_FEED_BACKEND', 'local')
+    CHANGE_FEED_REDIS_URL = os.getenv('CHANGE_FEED_REDIS_URL', 'redis://localhost:6379/0')
+    CHANGE_FEED_RETENTION_SECONDS = int(os.getenv('CHANGE_FEED_RETENTION_SECONDS', '600'))
+    CHANGE_FEED_MAX_GAP = int(os.getenv('CHANGE_FEED_MAX_GAP', '1000'))
+
+    # In-memory availability index used by date-range vehicle search
+    AVAILABILITY_HORIZON_DAYS = int(os.getenv('AVAILABILITY_HORIZON_DAYS', '180'))
+    AVAILABILITY_INDEX_TTL_SECONDS = int(os.getenv('AVAILABILITY_INDEX_TTL_SECONDS', '30'))
+
+    # In-memory make/model/location search index
+    VEHICLE_SEARCH_INDEX_TTL_SECONDS = int(os.getenv('VEHICLE_SEARCH_INDEX_TTL_SECONDS', '300'))
+    VEHICLE_SEARCH_MAX_IDS = int(os.getenv('VEHICLE_SEARCH_MAX_IDS', '5000'))
+
+    # Largest radius accepted by GET /api/vehicles?near=
+    NEAR_MAX_RADIUS_KM = float(os.getenv('NEAR_MAX_RADIUS_KM', '100'))
+
+    # Server-side cache for public GET responses (cities, catalog, vehicle detail)
+    RESPONSE_CACHE_ENABLED = os.getenv('RESPONSE_CACHE_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+    RESPONSE_CACHE_BACKEND = os.getenv('RESPONSE_CACHE_BACKEND', 'memory')
+    RESPONSE_CACHE_REDIS_URL = os.getenv('RESPONSE_CACHE_REDIS_URL', 'redis://localhost:6379/0')
+    RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', '1024'))
+    RESPONSE_CACHE_TTL_SECONDS = int(os.getenv('RESPONSE_CACHE_TTL_SECONDS', '300'))
+
+    # Report per-request SQL query counts in the X-Query-Count response header
+    QUERY_COUNT_HEADER = os.getenv('QUERY_COUNT_HEADER', 'false').lower() in ('1', 'true', 'yes')
     # SQLAlchemy engine options to improve connection reliability with remote MySQL
     # Enable pool_pre_ping to detect and recycle stale connections.
     SQLALCHEMY_ENGINE_OPTIONS = {
         'pool_pre_ping': True,
         'pool_recycle': int(os.getenv('SQLALCHEMY_POOL_RECYCLE', '280')),
         'pool_size': int(os.getenv('SQLALCHEMY_POOL_SIZE', '10')),
+        'max_overflow': int(os.getenv('SQLALCHEMY_MAX_OVERFLOW', '10')),
         'pool_timeout': int(os.getenv('SQLALCHEMY_POOL_TIMEOUT', '30')),
         'connect_args': {
             'connect_timeout': int(os.getenv('DB_CONNECT_TIMEOUT', '10'))
         }
     }
+    # SQLite (local runs, scripts/load_test.py) rejects connect_timeout
+    if (os.getenv('DATABASE_URL') or '').startswith('sqlite'):
+        del SQLALCHEMY_ENGINE_OPTIONS['connect_args']
 
 class DevelopmentConfig(Config):
     """Development configuration"""
@@ -94,6 +205,21 @@ class TestingConfig(Config):
     """Testing configuration"""
     TESTING = True
     SQLALCHEMY_DATABASE_URI = required_db_uri()
+    # The pool options are for remote MySQL; SQLite rejects connect_timeout
+    if SQLALCHEMY_DATABASE_URI.startswith('sqlite'):
+        SQLALCHEMY_ENGINE_OPTIONS = {}
+    QUERY_COUNT_HEADER = True
+    RESPONSE_CACHE_BACKEND = 'fake'
+    OTP_STORE_BACKEND = 'fake'
+    CHANGE_FEED_BACKEND = 'fake'
+    STORAGE_BACKEND = 'memory'
+    STORAGE_DELETE_WORKERS = 0
+    PASSWORD_HASH_WORKERS = 0
+    # Tests drive app.utils.mail_queue.process_outbox directly
+    MAIL_WORKER_THREADS = 0
+    PAYMENT_RECONCILER_THREADS = 0
+    IMAGE_VARIANT_THREADS = 0
+    IMAGE_VARIANT_PROCESSES = 0
 
 def get_config():
     """Get the appropriate configuration"""
@@ -0,0 +1,118 @@
+"""
+Gunicorn settings, loaded automatically from the working directory.
+
+Worker processes run CPU-bound work (password hashing, JSON rendering) in
+parallel, which threads inside one process cannot do under the GIL. Sizing:
+
+    threads  GUNICORN_THREADS, default 8
+    workers  WEB_CONCURRENCY if set, otherwise one per available CPU, capped so
+             workers * (pool size + overflow) stays within DB_MAX_CONNECTIONS
+
+Each worker gets its own SQLAlchemy pool sized to its threads plus its background
+threads (mail, payment reconciler, image variants), unless SQLALCHEMY_POOL_SIZE is
+set explicitly.
+
+State each worker keeps in its own memory, and what more than one worker needs:
+
+    pending OTPs         OTP_STORE_BACKEND=redis; without it the derived worker
+                         count stays at 1 and more workers refuse to start
+    memory file storage  tests only; more workers refuse to start
+    availability index   CHANGE_FEED_BACKEND=redis keeps every worker's index
+                         exact; without it searches use the SQL overlap filter
+    search index         CHANGE_FEED_BACKEND=redis; without it writes reach other
+                         workers after VEHICLE_SEARCH_INDEX_TTL_SECONDS (warning)
+    response cache       RESPONSE_CACHE_BACKEND=redis; without it invalidations
+                         reach other workers after RESPONSE_CACHE_TTL_SECONDS
+                         (warning)
+    background threads   every worker runs its own mail, reconciler and image
+                         variant threads; they claim rows with conditional
+                         UPDATEs, so this is safe and only multiplies the total
+    process pools        password hashing and image variants start their own
+                         pools per worker; size them per worker, not per host
+
+The same applies across instances, which gunicorn cannot check.
+
+scripts/load_test.py measures how throughput scales with the worker count.
+"""
+
+import os
+
+
+def _int_env(name, default):
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+def _cpu_count():
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def _is_redis(name, default='memory'):
+    return os.getenv(name, default).lower() == 'redis'
+
+
+threads = _int_env('GUNICORN_THREADS', 8)
+worker_class = 'gthread'
+
+# Per-worker database pool: every request thread and background thread can hold a connection
+background_threads = (
+    _int_env('MAIL_WORKER_THREADS', 1)
+    + _int_env('PAYMENT_RECONCILER_THREADS', 1)
+    + _int_env('IMAGE_VARIANT_THREADS', 1)
+)
+pool_size = _int_env('SQLALCHEMY_POOL_SIZE', threads + background_threads)
+max_overflow = _int_env('SQLALCHEMY_MAX_OVERFLOW', 2)
+os.environ['SQLALCHEMY_POOL_SIZE'] = str(pool_size)
+os.environ['SQLALCHEMY_MAX_OVERFLOW'] = str(max_overflow)
+
+shared_state = _is_redis('OTP_STORE_BACKEND')
+explicit_workers = _int_env('WEB_CONCURRENCY', 0)
+if explicit_workers:
+    workers = explicit_workers
+elif shared_state:
+    workers = _cpu_count()
+    db_max_connections = _int_env('DB_MAX_CONNECTIONS', 0)
+    if db_max_connections:
+        workers = min(workers, db_max_connections // (pool_size + max_overflow))
+    workers = max(1, workers)
+else:
+    workers = 1
+# Lets the app tell whether process-local indexes are still exact (on_starting
+# corrects it when -w on the command line overrides this file)
+os.environ['WEB_WORKERS'] = str(workers)
+
+bind = f":{os.getenv('PORT', '8080')}"
+# Cloud Run enforces the request timeout itself
+timeout = _int_env('GUNICORN_TIMEOUT', 0)
+graceful_timeout = _int_env('GUNICORN_GRACEFUL_TIMEOUT', 30)
+accesslog = '-'
+errorlog = '-'
+
+
+def on_starting(server):
+    # The command line (-w) overrides this file, so check what gunicorn will really start
+    count = server.cfg.workers
+    os.environ['WEB_WORKERS'] = str(count)
+    if count > 1:
+        if not shared_state:
+            raise RuntimeError(
+                f'{count} workers need OTP_STORE_BACKEND=redis: '
+                'pending OTPs kept in process memory are invisible to the other workers'
+            )
+        if os.getenv('STORAGE_BACKEND', '').lower() == 'memory':
+            raise RuntimeError(f'{count} workers cannot share STORAGE_BACKEND=memory; use gcs or local')
+        if not _is_redis('CHANGE_FEED_BACKEND', 'local'):
+            server.log.warning(
+                'CHANGE_FEED_BACKEND is not redis; date-range searches use the SQL overlap filter and '
+                'the search index sees other workers\' writes only after VEHICLE_SEARCH_INDEX_TTL_SECONDS'
+            )
+        if not _is_redis('RESPONSE_CACHE_BACKEND'):
+            server.log.warning(
+                'RESPONSE_CACHE_BACKEND is not redis; cache invalidation only reaches the worker '
+                'that made the change, others serve stale entries until RESPONSE_CACHE_TTL_SECONDS'
+            )
+    server.log.info('Starting %s worker(s) x %s thread(s), DB pool %s+%s per worker, %s background thread(s) per worker',
+                    count, server.cfg.threads, pool_size, max_overflow, background_threads)
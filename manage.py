@@ -41,5 +41,129 @@ def seed_cities_command():
         click.echo(f'✗ Error seeding cities: {e}', err=True)
         raise
 
+@cli.command('backfill-listing-cache')
+@click.option('--batch-size', default=500, show_default=True, help='Vehicles per batch.')
+def backfill_listing_cache_command(batch_size):
+    """Populate cached primary image, agency summary and geohash columns on vehicles."""
+    from app.utils.listing_cache import backfill_vehicle_listing_cache
+    click.echo('Backfilling vehicle listing cache...')
+    try:
+        count = backfill_vehicle_listing_cache(batch_size=batch_size)
+        click.echo(f'✓ Backfilled {count} vehicles')
+    except Exception as e:
+        click.echo(f'✗ Error backfilling listing cache: {e}', err=True)
+        raise
+
+@cli.command('reconcile-agency-stats')
+@click.option('--batch-size', default=500, show_default=True, help='Agencies per batch.')
+def reconcile_agency_stats_command(batch_size):
+    """Recompute agency vehicle/booking/earnings/rating counters from source tables."""
+    from app.utils.agency_stats import reconcile_agency_stats
+    click.echo('Reconciling agency statistics...')
+    try:
+        count = reconcile_agency_stats(batch_size=batch_size)
+        click.echo(f'✓ Updated {count} agencies')
+    except Exception as e:
+        click.echo(f'✗ Error reconciling agency statistics: {e}', err=True)
+        raise
+
+@cli.command('mail-worker')
+@click.option('--once', is_flag=True, help='Deliver the currently due messages and exit.')
+def mail_worker_command(once):
+    """Deliver queued e-mail from the outbox (run with MAIL_WORKER_THREADS=0 on web workers)."""
+    from flask import current_app
+    from app.utils.mail_queue import process_outbox, run_worker
+    if once:
+        total = 0
+        while True:
+            processed = process_outbox()
+            if not processed:
+                break
+            total += processed
+        click.echo(f'✓ Attempted {total} messages')
+        return
+    click.echo('Mail worker started; press Ctrl+C to stop')
+    run_worker(current_app._get_current_object())
+
+@cli.command('requeue-dead-mail')
+@click.option('--kind', default=None, help='Only requeue messages of this kind (e.g. otp).')
+def requeue_dead_mail_command(kind):
+    """Put dead-lettered e-mail back in the outbox for another round of attempts."""
+    from app.utils.mail_queue import requeue_dead
+    count = requeue_dead(kind=kind)
+    click.echo(f'✓ Requeued {count} messages')
+
+@cli.command('payment-reconciler')
+@click.option('--once', is_flag=True, help='Apply stored webhook events, sweep stale payments once and exit.')
+def payment_reconciler_command(once):
+    """Apply Razorpay webhook events and finalize stale payments (run with PAYMENT_RECONCILER_THREADS=0 on web workers)."""
+    from flask import current_app
+    from app.utils.payment_reconciler import process_webhook_events, run_reconciler, sweep_stale_payments
+    if once:
+        total = 0
+        while True:
+            processed = process_webhook_events()
+            if not processed:
+                break
+            total += processed
+        try:
+            finalized = sweep_stale_payments()
+        except Exception as e:
+            click.echo(f'✗ Error sweeping stale payments: {e}', err=True)
+            raise
+        click.echo(f'✓ Processed {total} webhook events, finalized {finalized} stale payments')
+        return
+    click.echo('Payment reconciler started; press Ctrl+C to stop')
+    run_reconciler(current_app._get_current_object())
+
+@cli.command('image-variants')
+@click.option('--once', is_flag=True, help='Process the queued images and exit.')
+@click.option('--backfill', is_flag=True, help='First queue every vehicle image and agency logo without variants.')
+def image_variants_command(once, backfill):
+    """Render thumbnail/WebP/AVIF variants of stored images (run with IMAGE_VARIANT_THREADS=0 on web workers)."""
+    from flask import current_app
+    from app.utils.image_variants import backfill_image_variants, pil_available, process_image_variants, run_image_variants
+    if not pil_available:
+        click.echo('✗ Pillow is not installed', err=True)
+        raise SystemExit(1)
+    if backfill:
+        click.echo(f'✓ Queued {backfill_image_variants()} images')
+    if once:
+        total = 0
+        while True:
+            processed = process_image_variants()
+            if not processed:
+                break
+            total += processed
+        click.echo(f'✓ Processed {total} images')
+        return
+    click.echo('Image variant worker started; press Ctrl+C to stop')
+    run_image_variants(current_app._get_current_object())
+
+@cli.command('migrate-local-uploads')
+@click.option('--batch-size', default=50, show_default=True, help='Files per upload batch.')
+def migrate_local_uploads_command(batch_size):
+    """Copy files under UPLOAD_DIR into the configured storage backend (e.g. GCS) at the same keys."""
+    from flask import current_app
+    from app.utils.storage import file_storage
+    click.echo(f'Copying {current_app.config["UPLOAD_DIR"]} to the {file_storage.backend.name} backend...')
+    try:
+        count = file_storage.migrate_local(current_app.config['UPLOAD_DIR'], batch_size=batch_size)
+        click.echo(f'✓ Copied or found {count} files')
+    except Exception as e:
+        click.echo(f'✗ Error migrating uploads: {e}', err=True)
+        raise
+
+@cli.command('make-kyc-private')
+def make_kyc_private_command():
+    """Revoke public read on KYC objects uploaded to GCS before they were stored privately."""
+    from app.utils.gcs import PRIVATE_PREFIXES, make_private
+    try:
+        count = sum(make_private(prefix) for prefix in PRIVATE_PREFIXES)
+        click.echo(f'✓ Made {count} objects private')
+    except Exception as e:
+        click.echo(f'✗ Error updating object ACLs: {e}', err=True)
+        raise
+
 if __name__ == '__main__':
     cli()
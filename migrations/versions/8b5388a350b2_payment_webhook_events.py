@@ -0,0 +1,43 @@
+"""inbox for razorpay payment webhooks
+
+Revision ID: 8b5388a350b2
+Revises: e7349389dfc2
+Create Date: 2026-10-17 17:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b5388a350b2'
+down_revision = 'e7349389dfc2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'payment_webhook_events',
+        sa.Column('id', sa.String(length=36), nullable=False),
+        sa.Column('event_id', sa.String(length=100), nullable=False),
+        sa.Column('event', sa.String(length=100), nullable=False),
+        sa.Column('payload', sa.Text(), nullable=False),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('next_attempt_at', sa.DateTime(), nullable=False),
+        sa.Column('locked_at', sa.DateTime(), nullable=True),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('received_at', sa.DateTime(), nullable=False),
+        sa.Column('processed_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('event_id')
+    )
+    with op.batch_alter_table('payment_webhook_events', schema=None) as batch_op:
+        batch_op.create_index('ix_payment_webhook_events_status_next_attempt', ['status', 'next_attempt_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('payment_webhook_events', schema=None) as batch_op:
+        batch_op.drop_index('ix_payment_webhook_events_status_next_attempt')
+    op.drop_table('payment_webhook_events')
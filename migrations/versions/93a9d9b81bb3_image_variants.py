@@ -0,0 +1,42 @@
+"""resized image variants for vehicle photos and agency logos
+
+Revision ID: 93a9d9b81bb3
+Revises: 8b5388a350b2
+Create Date: 2026-10-17 18:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '93a9d9b81bb3'
+down_revision = '8b5388a350b2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'image_variants',
+        sa.Column('id', sa.String(length=36), nullable=False),
+        sa.Column('source_url', sa.String(length=255), nullable=False),
+        sa.Column('variants', sa.Text(), nullable=True),
+        sa.Column('status', sa.String(length=20), nullable=False),
+        sa.Column('attempts', sa.Integer(), nullable=False),
+        sa.Column('next_attempt_at', sa.DateTime(), nullable=False),
+        sa.Column('locked_at', sa.DateTime(), nullable=True),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(), nullable=False),
+        sa.Column('processed_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('source_url')
+    )
+    with op.batch_alter_table('image_variants', schema=None) as batch_op:
+        batch_op.create_index('ix_image_variants_status_next_attempt', ['status', 'next_attempt_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('image_variants', schema=None) as batch_op:
+        batch_op.drop_index('ix_image_variants_status_next_attempt')
+    op.drop_table('image_variants')
@@ -0,0 +1,28 @@
+"""vehicle geohash for radius search
+
+Revision ID: 94a43cac9310
+Revises: be14493d7305
+Create Date: 2026-10-17 12:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '94a43cac9310'
+down_revision = 'be14493d7305'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('vehicles', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('geohash', sa.String(length=12), nullable=True))
+        batch_op.create_index('ix_vehicles_available_geohash', ['is_available', 'geohash'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('vehicles', schema=None) as batch_op:
+        batch_op.drop_index('ix_vehicles_available_geohash')
+        batch_op.drop_column('geohash')
@@ -0,0 +1,30 @@
+"""vehicle listing cache columns
+
+Revision ID: 9609bd8c2734
+Revises: fc1aca8ed8bb, add_feedbacks_table
+Create Date: 2026-10-17 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9609bd8c2734'
+down_revision = ('fc1aca8ed8bb', 'add_feedbacks_table')
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('vehicles', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('primary_image_url', sa.String(length=255), nullable=True))
+        batch_op.add_column(sa.Column('agency_name', sa.String(length=120), nullable=True))
+        batch_op.add_column(sa.Column('agency_logo_url', sa.String(length=255), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('vehicles', schema=None) as batch_op:
+        batch_op.drop_column('agency_logo_url')
+        batch_op.drop_column('agency_name')
+        batch_op.drop_column('primary_image_url')
@@ -0,0 +1,47 @@
+"""composite indexes for booking overlap and listing queries
+
+Revision ID: be14493d7305
+Revises: 9609bd8c2734
+Create Date: 2026-10-17 11:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'be14493d7305'
+down_revision = '9609bd8c2734'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('bookings', schema=None) as batch_op:
+        batch_op.create_index('ix_bookings_vehicle_dates_status', ['vehicle_id', 'start_date', 'end_date', 'status'], unique=False)
+        batch_op.create_index('ix_bookings_agency_payment_start', ['agency_id', 'payment_status', 'start_date'], unique=False)
+        batch_op.create_index('ix_bookings_customer_start', ['customer_id', 'start_date'], unique=False)
+
+    with op.batch_alter_table('vehicles', schema=None) as batch_op:
+        batch_op.create_index('ix_vehicles_available_created', ['is_available', 'created_at'], unique=False)
+
+    with op.batch_alter_table('vehicle_images', schema=None) as batch_op:
+        batch_op.create_index('ix_vehicle_images_vehicle_primary', ['vehicle_id', 'is_primary'], unique=False)
+
+    with op.batch_alter_table('feedbacks', schema=None) as batch_op:
+        batch_op.create_index('ix_feedbacks_agency_created', ['agency_id', 'created_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('feedbacks', schema=None) as batch_op:
+        batch_op.drop_index('ix_feedbacks_agency_created')
+
+    with op.batch_alter_table('vehicle_images', schema=None) as batch_op:
+        batch_op.drop_index('ix_vehicle_images_vehicle_primary')
+
+    with op.batch_alter_table('vehicles', schema=None) as batch_op:
+        batch_op.drop_index('ix_vehicles_available_created')
+
+    with op.batch_alter_table('bookings', schema=None) as batch_op:
+        batch_op.drop_index('ix_bookings_customer_start')
+        batch_op.drop_index('ix_bookings_agency_payment_start')
+        batch_op.drop_index('ix_bookings_vehicle_dates_status')
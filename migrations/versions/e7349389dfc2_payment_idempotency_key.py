@@ -0,0 +1,28 @@
+"""payment idempotency key for order creation
+
+Revision ID: e7349389dfc2
+Revises: 180684b9ffc3
+Create Date: 2026-10-17 16:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e7349389dfc2'
+down_revision = '180684b9ffc3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('payments', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('idempotency_key', sa.String(length=100), nullable=True))
+        batch_op.create_index('ix_payments_idempotency_key', ['idempotency_key'], unique=True)
+
+
+def downgrade():
+    with op.batch_alter_table('payments', schema=None) as batch_op:
+        batch_op.drop_index('ix_payments_idempotency_key')
+        batch_op.drop_column('idempotency_key')
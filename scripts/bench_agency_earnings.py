@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+"""
+Compare GET /api/agencies/earnings with the per-row Python loop it replaced.
+
+Seeds --bookings bookings (most of them completed, for one agency) into a throwaway
+SQLite file or --database-url, then for each range times the endpoint against
+``legacy_earnings``, the old implementation kept here verbatim, and compares the two.
+
+The endpoint sums amounts as DECIMAL, the old loop as Python floats, so a figure
+derived from a sum (an average, a percentage) can land on the other side of a
+rounding tie: ``differences`` allows one unit in the last rounded digit and the
+script reports whether the bytes are identical as well.
+
+    python scripts/bench_agency_earnings.py --bookings 100000
+
+tests/test_agency_earnings.py imports ``legacy_earnings`` and ``seed_bookings`` for
+the equivalence test. The seeded tables are created but never dropped.
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+VEHICLE_TYPES = ('bike', 'scooter', 'car', 'van', None)
+
+
+def legacy_earnings(agency_id, range_key, now):
+    """The response body of get_agency_earnings before it moved to SQL aggregates."""
+    from app.models.booking import Booking
+    from app.models.vehicle import Vehicle
+    from app.routes.agencies import _add_months, _get_range_dates, _month_start
+
+    current_start, previous_start, previous_end = _get_range_dates(range_key, now)
+
+    base_query = Booking.query.filter_by(agency_id=agency_id, payment_status='completed')
+
+    current_bookings = base_query.filter(Booking.start_date >= current_start).all()
+    previous_bookings = base_query.filter(
+        Booking.start_date >= previous_start,
+        Booking.start_date < previous_end
+    ).all()
+
+    vehicle_ids = list({b.vehicle_id for b in current_bookings})
+    vehicles_map = {}
+    if vehicle_ids:
+        vehicles = Vehicle.query.filter(Vehicle.id.in_(vehicle_ids)).all()
+        vehicles_map = {v.id: v for v in vehicles}
+
+    def _safe_amount(booking):
+        return float(booking.total_amount or 0)
+
+    total_earnings = sum(_safe_amount(b) for b in current_bookings)
+    total_bookings = len(current_bookings)
+    average_per_booking = total_earnings / total_bookings if total_bookings else 0
+
+    previous_earnings = sum(_safe_amount(b) for b in previous_bookings)
+    if previous_earnings:
+        growth_rate = ((total_earnings - previous_earnings) / previous_earnings) * 100
+    else:
+        growth_rate = 100.0 if total_earnings > 0 else 0.0
+
+    type_earnings = {}
+    vehicle_stats = {}
+    for booking in current_bookings:
+        vehicle = vehicles_map.get(booking.vehicle_id)
+        v_type = (vehicle.vehicle_type if vehicle and vehicle.vehicle_type else 'other').lower()
+        name = f"{vehicle.make} {vehicle.model}" if vehicle else 'Unknown Vehicle'
+
+        type_earnings[v_type] = type_earnings.get(v_type, 0) + _safe_amount(booking)
+
+        if booking.vehicle_id not in vehicle_stats:
+            vehicle_stats[booking.vehicle_id] = {
+                'name': name,
+                'type': v_type,
+                'bookings': 0,
+                'earnings': 0.0,
+            }
+        vehicle_stats[booking.vehicle_id]['bookings'] += 1
+        vehicle_stats[booking.vehicle_id]['earnings'] += _safe_amount(booking)
+
+    top_vehicle = None
+    if vehicle_stats:
+        top_id = max(vehicle_stats, key=lambda vid: vehicle_stats[vid]['earnings'])
+        top_data = vehicle_stats[top_id]
+        top_vehicle = {
+          'name': top_data['name'],
+          'type': top_data['type'],
+          'bookings': top_data['bookings'],
+          'earnings': round(top_data['earnings'], 2),
+          'avgPerBooking': round(top_data['earnings'] / top_data['bookings'], 2) if top_data['bookings'] else 0,
+        }
+
+    all_completed_bookings = base_query.all()
+    current_month_start = _month_start(now)
+    monthly_trend = []
+    for offset in range(5, -1, -1):
+        start = _add_months(current_month_start, -offset)
+        end = _add_months(start, 1)
+        month_earnings = 0.0
+        month_bookings = 0
+        for booking in all_completed_bookings:
+            if booking.start_date >= start and booking.start_date < end:
+                month_earnings += _safe_amount(booking)
+                month_bookings += 1
+        monthly_trend.append({
+            'month': start.strftime('%b'),
+            'earnings': round(month_earnings, 2),
+            'bookings': month_bookings
+        })
+
+    total_for_share = total_earnings or 1
+    categories = []
+    two_w = type_earnings.get('bike', 0) + type_earnings.get('scooter', 0)
+    four_w = type_earnings.get('car', 0)
+    other_w = total_earnings - two_w - four_w
+    for name, amount, key in [
+        ('2 Wheelers', two_w, 'bike'),
+        ('4 Wheelers', four_w, 'car'),
+        ('Other', other_w, 'other'),
+    ]:
+        categories.append({
+            'name': name,
+            'type': key,
+            'earnings': round(amount, 2),
+            'percentage': round((amount / total_for_share) * 100, 1) if total_for_share else 0
+        })
+
+    vehicle_performance = [
+        {
+            'name': stats['name'],
+            'type': stats['type'],
+            'bookings': stats['bookings'],
+            'earnings': round(stats['earnings'], 2),
+            'avgPerBooking': round(stats['earnings'] / stats['bookings'], 2) if stats['bookings'] else 0
+        }
+        for stats in vehicle_stats.values()
+    ]
+    vehicle_performance.sort(key=lambda v: v['earnings'], reverse=True)
+
+    return {
+        'range': range_key,
+        'summary': {
+            'totalEarnings': round(total_earnings, 2),
+            'totalBookings': total_bookings,
+            'averagePerBooking': round(average_per_booking, 2),
+            'growthRate': round(growth_rate, 1),
+            'topVehicle': top_vehicle
+        },
+        'categories': categories,
+        'monthlyTrend': monthly_trend,
+        'vehiclePerformance': vehicle_performance,
+        'paymentMethods': []
+    }
+
+
+def differences(new, old, path=''):
+    """Yield ``(path, new, old)`` wherever two earnings bodies differ by more than rounding."""
+    if isinstance(old, dict) and isinstance(new, dict) and new.keys() == old.keys():
+        for key in old:
+            yield from differences(new[key], old[key], f'{path}.{key}')
+    elif isinstance(old, list) and isinstance(new, list) and len(new) == len(old):
+        for index, (new_item, old_item) in enumerate(zip(new, old)):
+            yield from differences(new_item, old_item, f'{path}[{index}]')
+    elif isinstance(old, float) and isinstance(new, (int, float)) and not isinstance(new, bool):
+        # Percentages and the growth rate are rounded to one decimal, amounts to two
+        tolerance = 0.1 if path.endswith(('.percentage', '.growthRate')) else 0.01
+        if abs(new - old) > tolerance + 1e-9:
+            yield path, new, old
+    elif new != old or type(new) is not type(old):
+        yield path, new, old
+
+
+def seed_bookings(owner_id, customer_id, bookings, vehicles=40, seed=1):
+    """Create an agency for ``owner_id`` with ``vehicles`` vehicles and ``bookings``
+    bookings spread over the last 14 months; returns the agency id."""
+    from sqlalchemy import insert
+
+    from app import db
+    from app.models.agency import Agency
+    from app.models.booking import Booking
+    from app.models.vehicle import Vehicle
+
+    rng = random.Random(seed)
+    agency = Agency(user_id=owner_id, agency_name='Earnings Agency', is_verified=True)
+    db.session.add(agency)
+    db.session.flush()
+    vehicle_ids = []
+    for n in range(vehicles):
+        vehicle = Vehicle(
+            owner_id=owner_id, agency_id=agency.id, make='Make', model=f'Model {n}', year=2022,
+            vehicle_type=VEHICLE_TYPES[n % len(VEHICLE_TYPES)] or '', fuel_type='petrol',
+            registration_number=uuid.uuid4().hex[:12], daily_rate=500,
+        )
+        db.session.add(vehicle)
+        db.session.flush()
+        vehicle_ids.append(vehicle.id)
+
+    now = datetime.utcnow()
+    rows = []
+    for _ in range(bookings):
+        start = now - timedelta(minutes=rng.randrange(14 * 31 * 24 * 60))
+        # Paise amounts, as the booking form sends them; a few free rentals
+        total = round(rng.uniform(150, 25000), 2) if rng.random() > 0.02 else 0
+        rows.append(dict(
+            id=str(uuid.uuid4()), customer_id=customer_id, vehicle_id=rng.choice(vehicle_ids),
+            agency_id=agency.id, start_date=start, end_date=start + timedelta(days=2),
+            pickup_location='Bangalore', dropoff_location='Bangalore', daily_rate=500,
+            number_of_days=2, subtotal=total, total_amount=total,
+            status='completed', payment_status='completed' if rng.random() < 0.9 else 'pending',
+        ))
+        if len(rows) == 5000:
+            db.session.execute(insert(Booking), rows)
+            rows = []
+    if rows:
+        db.session.execute(insert(Booking), rows)
+    db.session.commit()
+    return agency.id
+
+
+def _time(fn, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--bookings', type=int, default=100000)
+    parser.add_argument('--vehicles', type=int, default=40)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--database-url')
+    args = parser.parse_args()
+
+    os.environ['DATABASE_URL'] = args.database_url or (
+        f'sqlite:///{os.path.join(tempfile.mkdtemp(prefix="bench-"), "bench.db")}'
+    )
+    os.environ['FLASK_ENV'] = 'production'
+    sys.path.insert(0, ROOT)
+    from flask import current_app
+    from flask_jwt_extended import create_access_token
+
+    from app import create_app, db
+    from app import models  # noqa: F401
+    from app.models import payment, catalog, feedback  # noqa: F401
+    from app.models.user import User
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        owner = User(email=f'owner-{uuid.uuid4().hex[:8]}@example.com', is_active=True)
+        customer = User(email=f'customer-{uuid.uuid4().hex[:8]}@example.com', is_active=True)
+        db.session.add_all([owner, customer])
+        db.session.commit()
+        started = time.perf_counter()
+        agency_id = seed_bookings(owner.id, customer.id, args.bookings, args.vehicles)
+        print(f'Seeded {args.bookings} bookings in {time.perf_counter() - started:.1f}s')
+
+        client = app.test_client()
+        headers = {'Authorization': f'Bearer {create_access_token(identity=owner.id)}'}
+        print(f'{"range":>6}  {"legacy ms":>9}  {"sql ms":>8}  {"identical":>9}  {"within rounding":>15}')
+        for range_key in ('week', 'month', 'year'):
+            response, new_ms = _time(
+                lambda: client.get(f'/api/agencies/earnings?range={range_key}', headers=headers), args.repeat
+            )
+            legacy, old_ms = _time(lambda: legacy_earnings(agency_id, range_key, datetime.utcnow()), args.repeat)
+            identical = current_app.json.response(legacy).get_data() == response.get_data()
+            diffs = list(differences(response.get_json(), legacy))
+            print(f'{range_key:>6}  {old_ms:>9.0f}  {new_ms:>8.0f}  {"yes" if identical else "no":>9}  '
+                  f'{"yes" if not diffs else "NO":>15}')
+            for path, new, old in diffs:
+                print(f'        {path}: {new!r} (legacy {old!r})')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+"""
+Compare page 1 with a deep page of GET /api/vehicles, OFFSET vs keyset cursor.
+
+Seeds --vehicles available vehicles into a throwaway SQLite file or
+--database-url. Some share a created_at timestamp, so the keyset tie-break on id
+is exercised. Then it times page 1 and page --deep-page (default 500) in both modes:
+
+    offset  ?page=N&per_page=P               OFFSET (N-1)*P
+    keyset  ?cursor=<row before page N>&per_page=P
+
+Both skip the total count (include_total=false) so only the page query is
+measured, and the keyset page is checked against the offset page. Keyset latency
+should stay flat with depth; OFFSET grows with the rows it skips.
+
+    python scripts/bench_pagination.py --vehicles 50000 --deep-page 500
+
+On SQLite the script runs ANALYZE after seeding, as in the other benchmarks.
+
+The seeded tables are created but never dropped.
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _seed(count, rng):
+    from sqlalchemy import insert
+
+    from app import db
+    from app.models.agency import Agency
+    from app.models.user import User
+    from app.models.vehicle import Vehicle
+
+    owner = User(email=f'pages-{uuid.uuid4().hex[:8]}@example.com', is_active=True)
+    db.session.add(owner)
+    db.session.flush()
+    agency = Agency(user_id=owner.id, agency_name='Pagination Agency', is_verified=True)
+    db.session.add(agency)
+    db.session.flush()
+
+    base = datetime.utcnow() - timedelta(days=365)
+    rows = []
+    for n in range(count):
+        # Bulk imports land in the same second; about a third of the rows share a timestamp
+        created_at = base + timedelta(seconds=n // 3 * 3 if rng.random() < 0.3 else n)
+        rows.append(dict(
+            id=str(uuid.uuid4()), owner_id=owner.id, agency_id=agency.id, make='Honda', model=f'Activa {n % 50}',
+            year=2022, vehicle_type='scooter', fuel_type='petrol', registration_number=uuid.uuid4().hex[:16],
+            daily_rate=400, location='Bangalore', is_available=True, created_at=created_at,
+            agency_name=agency.agency_name, primary_image_url='',
+        ))
+        if len(rows) == 5000:
+            db.session.execute(insert(Vehicle), rows)
+            rows = []
+    if rows:
+        db.session.execute(insert(Vehicle), rows)
+    db.session.commit()
+
+
+def _cursor_before(page, per_page):
+    """The cursor a client holds after reading ``page - 1`` pages."""
+    from app.models.vehicle import Vehicle
+    from app.utils.pagination import encode_cursor
+
+    if page == 1:
+        return ''
+    last = Vehicle.query.filter_by(is_available=True).order_by(
+        Vehicle.created_at.desc(), Vehicle.id.desc()
+    ).offset((page - 1) * per_page - 1).first()
+    return encode_cursor(last.created_at, last.id)
+
+
+def _time(client, params, repeat):
+    latencies = []
+    body = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        body = client.get('/api/vehicles', query_string=params).get_json()
+        latencies.append(time.perf_counter() - started)
+    return body, statistics.median(latencies) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--vehicles', type=int, default=50000)
+    parser.add_argument('--per-page', type=int, default=20)
+    parser.add_argument('--deep-page', type=int, default=500)
+    parser.add_argument('--repeat', type=int, default=15)
+    parser.add_argument('--database-url')
+    args = parser.parse_args()
+    if args.deep_page * args.per_page > args.vehicles:
+        parser.error('--vehicles must cover --deep-page * --per-page rows')
+
+    os.environ['DATABASE_URL'] = args.database_url or (
+        f'sqlite:///{os.path.join(tempfile.mkdtemp(prefix="bench-"), "bench.db")}'
+    )
+    os.environ['FLASK_ENV'] = 'production'
+    sys.path.insert(0, ROOT)
+    from sqlalchemy import text
+
+    from app import create_app, db
+    from app import models  # noqa: F401
+    from app.models import payment, catalog, feedback  # noqa: F401
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        started = time.perf_counter()
+        _seed(args.vehicles, random.Random(11))
+        if db.engine.dialect.name == 'sqlite':
+            # Statistics as a long-running database has them
+            db.session.execute(text('ANALYZE'))
+            db.session.commit()
+        print(f'Seeded {args.vehicles} vehicles in {time.perf_counter() - started:.1f}s')
+
+        client = app.test_client()
+        print(f'{"page":>5}  {"offset ms":>9}  {"keyset ms":>9}  {"same rows":>9}')
+        for page in (1, args.deep_page):
+            common = {'per_page': args.per_page, 'include_total': 'false'}
+            offset_body, offset_ms = _time(client, dict(common, page=page), args.repeat)
+            keyset_body, keyset_ms = _time(client, dict(common, cursor=_cursor_before(page, args.per_page)),
+                                           args.repeat)
+            same = [v['id'] for v in offset_body['vehicles']] == [v['id'] for v in keyset_body['vehicles']]
+            print(f'{page:>5}  {offset_ms:>9.1f}  {keyset_ms:>9.1f}  {"yes" if same else "NO":>9}')
+
+
+if __name__ == '__main__':
+    main()
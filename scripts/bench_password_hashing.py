@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Compare password verification inline on request threads with the process pool.
+
+For each PASSWORD_HASH_WORKERS value (0 = inline, the behaviour before the pool)
+--threads threads verify a PASSWORD_HASH_METHOD hash for --duration seconds, as
+concurrent logins in one gunicorn worker would. Meanwhile a probe thread does a
+1 ms sleep in a loop, standing in for the worker's other requests: its overshoot
+shows how long they wait for the GIL.
+
+    python scripts/bench_password_hashing.py --workers 0,2,4 --threads 8
+
+Prints verifications per second and the probe's p50/p99 delay per setting. The pool
+can only beat inline hashing with spare CPUs; on one CPU expect the same throughput
+and a better probe delay.
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _app():
+    os.environ.setdefault('DATABASE_URL', f'sqlite:///{os.path.join(tempfile.mkdtemp(prefix="bench-"), "bench.db")}')
+    os.environ['FLASK_ENV'] = 'production'
+    sys.path.insert(0, ROOT)
+    from app import create_app
+    return create_app()
+
+
+def _run(app, workers, threads, duration):
+    from app.utils import password_hashing
+
+    app.config['PASSWORD_HASH_WORKERS'] = workers
+    # Room for every benchmark thread, so nothing measures queue timeouts
+    app.config['PASSWORD_HASH_QUEUE_SIZE'] = threads
+    with app.app_context():
+        pwhash = password_hashing.hash_password('bench-password')
+        if workers:
+            # Start the pool processes before timing
+            for _ in range(workers):
+                password_hashing.verify_password(pwhash, 'bench-password')
+
+    done = []
+    delays = []
+    stop = time.monotonic() + duration
+
+    def login():
+        with app.app_context():
+            while time.monotonic() < stop:
+                assert password_hashing.verify_password(pwhash, 'bench-password')
+                done.append(1)
+
+    def probe():
+        while time.monotonic() < stop:
+            started = time.perf_counter()
+            time.sleep(0.001)
+            delays.append(time.perf_counter() - started - 0.001)
+
+    pool = [threading.Thread(target=login) for _ in range(threads)] + [threading.Thread(target=probe)]
+    for thread in pool:
+        thread.start()
+    for thread in pool:
+        thread.join()
+
+    if password_hashing._executor is not None:
+        password_hashing._executor.shutdown()
+        password_hashing._executor = None
+    delays.sort()
+    return len(done) / duration, statistics.median(delays) * 1000, delays[int(len(delays) * 0.99) - 1] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--workers', default='0,2', help='comma-separated PASSWORD_HASH_WORKERS values')
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=10)
+    args = parser.parse_args()
+
+    app = _app()
+    cpus = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count()
+    print(f'{app.config["PASSWORD_HASH_METHOD"]}: {args.threads} threads, {args.duration:g}s per run, {cpus} CPU(s)')
+    print(f'{"workers":>7}  {"verify/s":>8}  {"probe p50 ms":>12}  {"probe p99 ms":>12}')
+    for workers in (int(value) for value in args.workers.split(',')):
+        rate, p50, p99 = _run(app, workers, args.threads, args.duration)
+        print(f'{workers:>7}  {rate:>8.1f}  {p50:>12.2f}  {p99:>12.2f}')
+
+
+if __name__ == '__main__':
+    main()
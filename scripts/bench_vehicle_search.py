@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Time GET /api/vehicles?q= and ?location= with the trigram index against ILIKE.
+
+Seeds --vehicles vehicles into a throwaway SQLite file or --database-url. Makes
+and models come from the seeded catalog and locations from a few cities'
+neighbourhoods, with a tail of one-off custom names. The script builds the search
+index and then runs each term twice, once through the index and once through the
+ILIKE scan (VEHICLE_SEARCH_MAX_IDS set to -1, so every lookup falls back), and
+checks that both return the same rows. A typo is scanned under the catalog name
+the index corrected it to:
+
+    python scripts/bench_vehicle_search.py --vehicles 200000
+
+Terms that match more than VEHICLE_SEARCH_MAX_IDS vehicles use ILIKE on both
+runs; the "path" column says which one the endpoint took. The seeded tables are
+created but never dropped.
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+AREAS = ('Koramangala', 'Indiranagar', 'HSR Layout', 'Whitefield', 'Jayanagar', 'Adyar', 'T Nagar',
+         'Velachery', 'Banjara Hills', 'Gachibowli', 'Andheri', 'Bandra', 'Powai')
+CITIES = ('Bangalore', 'Chennai', 'Hyderabad', 'Mumbai')
+# (parameter, term): rare, mid, broad, a typo the catalog corrects and a miss
+TERMS = (('q', 'ntorq'), ('q', 'classic 350'), ('q', 'custom-07'), ('q', 'honda'), ('q', 'royal enfeild'),
+         ('q', 'zzyzx'), ('location', 'powai'), ('location', 'bangalore'))
+
+
+def _seed(count, rng):
+    from sqlalchemy import insert
+
+    from app import db
+    from app.models.agency import Agency
+    from app.models.catalog import CatalogBrand
+    from app.models.user import User
+    from app.models.vehicle import Vehicle
+
+    catalog = [(brand.name, [model.name for model in brand.models]) for brand in CatalogBrand.query.all()]
+    owner = User(email=f'search-{uuid.uuid4().hex[:8]}@example.com', is_active=True)
+    db.session.add(owner)
+    db.session.flush()
+    agency = Agency(user_id=owner.id, agency_name='Search Agency', is_verified=True)
+    db.session.add(agency)
+    db.session.flush()
+
+    rows = []
+    for n in range(count):
+        make, models = rng.choice(catalog)
+        model = rng.choice(models) if models and rng.random() < 0.95 else f'Custom-{n % 997:02d}'
+        rows.append(dict(
+            id=str(uuid.uuid4()), owner_id=owner.id, agency_id=agency.id, make=make, model=model,
+            year=2022, vehicle_type='bike', fuel_type='petrol', registration_number=uuid.uuid4().hex[:16],
+            daily_rate=400, location=f'{rng.choice(AREAS)}, {rng.choice(CITIES)}', is_available=True,
+            agency_name=agency.agency_name, primary_image_url='',
+        ))
+        if len(rows) == 5000:
+            db.session.execute(insert(Vehicle), rows)
+            rows = []
+    if rows:
+        db.session.execute(insert(Vehicle), rows)
+    db.session.commit()
+
+
+def _time(client, params, repeat):
+    latencies = []
+    body = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        body = client.get('/api/vehicles', query_string=params).get_json()
+        latencies.append(time.perf_counter() - started)
+    return body, statistics.median(latencies) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--vehicles', type=int, default=200000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--database-url')
+    args = parser.parse_args()
+
+    os.environ['DATABASE_URL'] = args.database_url or (
+        f'sqlite:///{os.path.join(tempfile.mkdtemp(prefix="bench-"), "bench.db")}'
+    )
+    os.environ['FLASK_ENV'] = 'production'
+    sys.path.insert(0, ROOT)
+    from sqlalchemy import text
+
+    from app import create_app, db
+    from app import models  # noqa: F401
+    from app.models import payment, catalog, feedback  # noqa: F401
+    from app.utils.seed_catalog import seed_catalogs
+    from app.utils.vehicle_search import FIELDS, vehicle_search_index
+
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        seed_catalogs()
+        started = time.perf_counter()
+        _seed(args.vehicles, random.Random(7))
+        if db.engine.dialect.name == 'sqlite':
+            # Statistics as a long-running database has them
+            db.session.execute(text('ANALYZE'))
+            db.session.commit()
+        print(f'Seeded {args.vehicles} vehicles in {time.perf_counter() - started:.1f}s')
+
+        started = time.perf_counter()
+        vehicle_search_index.match('warm')
+        vehicle_search_index.wait()
+        print(f'Built the search index in {time.perf_counter() - started:.1f}s')
+
+        client = app.test_client()
+        max_ids = app.config['VEHICLE_SEARCH_MAX_IDS']
+        print(f'{"term":>22}  {"matches":>7}  {"path":>5}  {"index ms":>8}  {"ilike ms":>8}  {"same":>4}')
+        for name, term in TERMS:
+            params = {name: term, 'per_page': 12}
+            ids = vehicle_search_index.match(term, fields=('location',) if name == 'location' else FIELDS)
+            indexed, index_ms = _time(client, params, args.repeat)
+            # Typo correction needs the index; scan for the corrected term instead
+            scan_params = dict(params, q=indexed['correctedQuery']) if 'correctedQuery' in indexed else params
+            app.config['VEHICLE_SEARCH_MAX_IDS'] = -1
+            try:
+                scanned, ilike_ms = _time(client, scan_params, args.repeat)
+            finally:
+                app.config['VEHICLE_SEARCH_MAX_IDS'] = max_ids
+            same = indexed['pagination'] == scanned['pagination'] and (
+                [v['id'] for v in indexed['vehicles']] == [v['id'] for v in scanned['vehicles']]
+            )
+            path = 'ilike' if ids is None else 'index'
+            print(f'{f"{name}={term}":>22}  {indexed["pagination"]["total"]:>7}  {path:>5}  {index_ms:>8.1f}  '
+                  f'{ilike_ms:>8.1f}  {"yes" if same else "NO":>4}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+Measure how request throughput scales with the gunicorn worker count.
+
+Seeds a database with one active user and some vehicles, then for each value of
+--workers starts ``gunicorn run:app`` (with gunicorn.conf.py) and keeps --clients
+concurrent clients busy on one endpoint for --duration seconds:
+
+    login   POST /api/auth/login, CPU-bound password verification
+    search  GET /api/vehicles with a date range, availability and serialization
+
+Prints requests per second and p50/p95 latency per worker count. Multi-worker runs
+need the shared OTP store and change feed, so they point at --redis-url; without one
+the script serves redis from fakeredis when it is installed.
+
+    python scripts/load_test.py --workers 1,2,4 --endpoint login
+
+Run it on a host with at least as many CPUs as the largest worker count, and a load
+generator that is not starved by the server (another host, or spare cores), or the
+numbers measure contention rather than scaling. Defaults to a throwaway SQLite file;
+pass --database-url for MySQL. The seeded tables are created but never dropped.
+"""
+
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PASSWORD = 'load-test-password'
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _start_fake_redis():
+    try:
+        from fakeredis import TcpFakeServer
+    except ImportError:
+        sys.exit('Multi-worker runs need --redis-url (or fakeredis installed for a local stand-in)')
+    port = _free_port()
+    server = TcpFakeServer(('127.0.0.1', port), server_type='redis')
+    # Connection handlers would otherwise keep the script alive after the last run
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f'redis://127.0.0.1:{port}/0'
+
+
+def _seed(env, vehicles):
+    """Create the tables and a user and vehicles to query; returns the user's e-mail."""
+    os.environ.update(env)
+    sys.path.insert(0, ROOT)
+    from app import create_app, db
+    from app import models  # noqa: F401
+    from app.models import payment, catalog, feedback  # noqa: F401
+    from app.models.agency import Agency
+    from app.models.user import User
+    from app.models.vehicle import Vehicle
+
+    app = create_app()
+    app.config['PASSWORD_HASH_WORKERS'] = 0
+    with app.app_context():
+        db.create_all()
+        email = f'load-{uuid.uuid4().hex[:8]}@example.com'
+        user = User(email=email, is_active=True)
+        user.set_password(PASSWORD)
+        db.session.add(user)
+        db.session.flush()
+        agency = Agency(user_id=user.id, agency_name='Load Test Agency', is_verified=True)
+        db.session.add(agency)
+        db.session.flush()
+        for n in range(vehicles):
+            db.session.add(Vehicle(
+                owner_id=user.id, agency_id=agency.id, make='Honda', model=f'Activa {n}', year=2022,
+                vehicle_type='bike', fuel_type='petrol', registration_number=uuid.uuid4().hex[:12],
+                daily_rate=400 + n, location='Bangalore',
+            ))
+        db.session.commit()
+    return email
+
+
+def _wait_until_up(base_url, proc, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f'gunicorn exited with {proc.returncode}')
+        try:
+            requests.get(f'{base_url}/api/cities', timeout=1)
+            return
+        except requests.RequestException:
+            time.sleep(0.2)
+    raise RuntimeError('gunicorn did not start in time')
+
+
+def _request_factory(endpoint, base_url, email):
+    if endpoint == 'login':
+        def call(session):
+            return session.post(f'{base_url}/api/auth/login', json={'email': email, 'password': PASSWORD}, timeout=30)
+    else:
+        start = (datetime.utcnow() + timedelta(days=7)).replace(microsecond=0)
+        params = {'start_date': start.isoformat(), 'end_date': (start + timedelta(days=2)).isoformat(), 'per_page': 12}
+
+        def call(session):
+            return session.get(f'{base_url}/api/vehicles', params=params, timeout=30)
+    return call
+
+
+def _drive(call, clients, duration):
+    """Keep ``clients`` threads calling for ``duration`` seconds; returns (latencies, errors)."""
+    latencies = []
+    errors = []
+    deadline = time.monotonic() + duration
+
+    def client():
+        session = requests.Session()
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            try:
+                response = call(session)
+                ok = response.status_code == 200
+            except requests.RequestException:
+                ok = False
+            if ok:
+                latencies.append(time.perf_counter() - started)
+            else:
+                errors.append(1)
+
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        for _ in range(clients):
+            pool.submit(client)
+    return latencies, len(errors)
+
+
+def run(workers, args, env, email):
+    port = _free_port()
+    base_url = f'http://127.0.0.1:{port}'
+    proc_env = dict(env, PORT=str(port), WEB_CONCURRENCY=str(workers))
+    proc = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'run:app'],
+        cwd=ROOT, env=proc_env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        _wait_until_up(base_url, proc)
+        call = _request_factory(args.endpoint, base_url, email)
+        _drive(call, args.clients, args.warmup)
+        latencies, errors = _drive(call, args.clients, args.duration)
+    finally:
+        proc.terminate()
+        proc.wait(timeout=30)
+    latencies.sort()
+    rps = len(latencies) / args.duration
+    p50 = statistics.median(latencies) * 1000 if latencies else float('nan')
+    p95 = latencies[int(len(latencies) * 0.95) - 1] * 1000 if latencies else float('nan')
+    return rps, p50, p95, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--workers', default='1,2,4', help='comma-separated worker counts')
+    parser.add_argument('--endpoint', choices=('login', 'search'), default='login')
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=20)
+    parser.add_argument('--warmup', type=float, default=3)
+    parser.add_argument('--vehicles', type=int, default=200)
+    parser.add_argument('--database-url')
+    parser.add_argument('--redis-url')
+    args = parser.parse_args()
+
+    database_url = args.database_url or f'sqlite:///{os.path.join(tempfile.mkdtemp(prefix="load-test-"), "load.db")}'
+    redis_url = args.redis_url or _start_fake_redis()
+    env = dict(
+        os.environ,
+        FLASK_ENV='production',
+        DATABASE_URL=database_url,
+        OTP_STORE_BACKEND='redis', OTP_STORE_REDIS_URL=redis_url,
+        CHANGE_FEED_BACKEND='redis', CHANGE_FEED_REDIS_URL=redis_url,
+        RESPONSE_CACHE_BACKEND='redis', RESPONSE_CACHE_REDIS_URL=redis_url,
+    )
+    email = _seed(env, args.vehicles)
+
+    cpus = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count()
+    print(f'{args.endpoint}: {args.clients} clients, {args.duration:g}s per run, {cpus} CPU(s) available')
+    print(f'{"workers":>7}  {"req/s":>8}  {"p50 ms":>8}  {"p95 ms":>8}  {"errors":>6}  {"speedup":>7}')
+    baseline = None
+    for workers in (int(value) for value in args.workers.split(',')):
+        rps, p50, p95, errors = run(workers, args, env, email)
+        baseline = baseline or rps
+        print(f'{workers:>7}  {rps:>8.1f}  {p50:>8.1f}  {p95:>8.1f}  {errors:>6}  {rps / baseline if baseline else 0:>6.2f}x')
+
+
+if __name__ == '__main__':
+    main()
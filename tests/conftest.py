@@ -0,0 +1,166 @@
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_db_dir = tempfile.mkdtemp(prefix='rentals-tests-')
+# Never DATABASE_URL: the tests drop every table
+os.environ['DATABASE_URL'] = os.getenv('TEST_DATABASE_URL') or f'sqlite:///{os.path.join(_db_dir, "test.db")}'
+os.environ['FLASK_ENV'] = 'testing'
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest  # noqa: E402
+from flask_jwt_extended import create_access_token  # noqa: E402
+
+from app import create_app, db as _db  # noqa: E402
+from app import models  # noqa: E402,F401
+from app.models import payment, catalog, feedback  # noqa: E402,F401
+
+
+@pytest.fixture(scope='session')
+def app():
+    app = create_app()
+    with app.app_context():
+        yield app
+
+
+@pytest.fixture
+def db(app):
+    _db.create_all()
+    yield _db
+    _db.session.remove()
+    _db.drop_all()
+
+
+@pytest.fixture
+def client(app, db):
+    return app.test_client()
+
+
+@pytest.fixture
+def auth_headers(app):
+    def headers(user_id):
+        return {'Authorization': f'Bearer {create_access_token(identity=user_id)}'}
+    return headers
+
+
+@pytest.fixture
+def make_user(db):
+    from app.models.user import User
+
+    def make(email=None, **fields):
+        user = User(email=email or f'{uuid.uuid4().hex[:8]}@example.com', is_active=True, **fields)
+        db.session.add(user)
+        db.session.commit()
+        return user
+    return make
+
+
+@pytest.fixture
+def make_vehicle(db, make_user):
+    from app.models.agency import Agency
+    from app.models.vehicle import Vehicle
+
+    def make(owner=None, agency=None, **fields):
+        owner = owner or make_user()
+        if agency is None:
+            agency = Agency(user_id=owner.id, agency_name='Test Agency', is_verified=True)
+            db.session.add(agency)
+            db.session.flush()
+        values = dict(
+            make='Honda', model='Activa', year=2022, vehicle_type='bike', fuel_type='petrol',
+            registration_number=uuid.uuid4().hex[:10], daily_rate=500, location='Bangalore',
+        )
+        values.update(fields)
+        vehicle = Vehicle(owner_id=owner.id, agency_id=agency.id, **values)
+        db.session.add(vehicle)
+        db.session.commit()
+        return vehicle
+    return make
+
+
+@pytest.fixture
+def make_booking(db, make_user):
+    from app.models.booking import Booking
+
+    def make(vehicle, customer=None, start=None, days=2, **fields):
+        customer = customer or make_user()
+        start = start or datetime.utcnow().replace(microsecond=0) + timedelta(days=3)
+        values = dict(
+            pickup_location='Bangalore', dropoff_location='Bangalore', daily_rate=vehicle.daily_rate,
+            number_of_days=days, subtotal=vehicle.daily_rate * days, total_amount=vehicle.daily_rate * days,
+        )
+        values.update(fields)
+        booking = Booking(
+            customer_id=customer.id, vehicle_id=vehicle.id, agency_id=vehicle.agency_id,
+            start_date=start, end_date=start + timedelta(days=days), **values
+        )
+        _db.session.add(booking)
+        _db.session.commit()
+        return booking
+    return make
+
+
+class FakeService:
+    """Local HTTP server standing in for an external API.
+
+    Queue replies with ``reply(status, body)``; once the queue is empty every request
+    gets ``default``. Every reply waits ``delay`` seconds first. Received requests are
+    kept in ``requests`` as dicts.
+    """
+
+    def __init__(self):
+        self.requests = []
+        self.replies = []
+        self.default = (200, {}, {})
+        self.delay = 0
+        service = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _handle(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                service.requests.append({
+                    'method': self.command,
+                    'path': self.path,
+                    'headers': dict(self.headers),
+                    'body': self.rfile.read(length) if length else b'',
+                })
+                status, body, headers = service.replies.pop(0) if service.replies else service.default
+                if service.delay:
+                    time.sleep(service.delay)
+                data = body if isinstance(body, bytes) else json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            do_GET = do_POST = _handle
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self._server.server_address[1]}'
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def reply(self, status, body=None, headers=None):
+        self.replies.append((status, {} if body is None else body, headers or {}))
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+@pytest.fixture
+def fake_service():
+    service = FakeService()
+    yield service
+    service.close()
@@ -0,0 +1,46 @@
+import importlib.util
+import os
+from datetime import datetime
+
+import pytest
+
+_spec = importlib.util.spec_from_file_location(
+    'bench_agency_earnings',
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'scripts', 'bench_agency_earnings.py')
+)
+bench = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(bench)
+
+
+@pytest.mark.parametrize('range_key', ['week', 'month', 'year'])
+def test_earnings_match_the_per_row_implementation(client, db, auth_headers, make_user, range_key):
+    owner, customer = make_user(), make_user()
+    agency_id = bench.seed_bookings(owner.id, customer.id, 1500, vehicles=12)
+
+    response = client.get(f'/api/agencies/earnings?range={range_key}', headers=auth_headers(owner.id))
+    assert response.status_code == 200
+    legacy = bench.legacy_earnings(agency_id, range_key, datetime.utcnow())
+    assert list(bench.differences(response.get_json(), legacy)) == []
+
+
+def test_empty_agency_renders_the_same_bytes(app, client, db, auth_headers, make_user):
+    owner, customer = make_user(), make_user()
+    agency_id = bench.seed_bookings(owner.id, customer.id, 0, vehicles=2)
+
+    response = client.get('/api/agencies/earnings', headers=auth_headers(owner.id))
+    legacy = bench.legacy_earnings(agency_id, 'month', datetime.utcnow())
+    assert response.get_data() == app.json.response(legacy).get_data()
+
+
+def test_totals_are_exact_to_the_paisa(client, db, auth_headers, make_user, make_vehicle, make_booking):
+    vehicle = make_vehicle(vehicle_type='car')
+    # 0.1 + 0.2 style amounts whose float sum is off in the last bits
+    for amount in (0.1, 0.2, 1234.56, 99.99):
+        booking = make_booking(vehicle, start=datetime.utcnow().replace(microsecond=0), total_amount=amount)
+        booking.payment_status = 'completed'
+    db.session.commit()
+
+    body = client.get('/api/agencies/earnings?range=week', headers=auth_headers(vehicle.owner_id)).get_json()
+    assert body['summary']['totalEarnings'] == 1334.85
+    assert body['categories'][1]['earnings'] == 1334.85
+    assert body['vehiclePerformance'][0]['avgPerBooking'] == 333.71
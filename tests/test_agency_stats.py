@@ -0,0 +1,23 @@
+from app.models.agency import Agency
+
+
+def test_deleting_a_vehicle_drops_its_paid_bookings_from_the_totals(client, db, auth_headers, make_vehicle,
+                                                                    make_booking):
+    vehicle = make_vehicle()
+    kept = make_vehicle(owner=vehicle.owner, agency=vehicle.owner.agency)
+    for target in (vehicle, vehicle, kept):
+        booking = make_booking(target)
+        booking.set_payment_status('completed')
+    make_booking(vehicle)
+    Agency.adjust_stats(vehicle.agency_id, vehicles=2)
+    db.session.commit()
+    agency_id = vehicle.agency_id
+
+    response = client.delete(f'/api/vehicles/{vehicle.id}', headers=auth_headers(vehicle.owner_id))
+    assert response.status_code == 200
+
+    db.session.expire_all()
+    agency = db.session.get(Agency, agency_id)
+    assert agency.total_vehicles == 1
+    assert agency.total_bookings == 1
+    assert agency.total_earnings == kept.daily_rate * 2
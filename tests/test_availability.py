@@ -0,0 +1,117 @@
+import random
+from datetime import datetime, timedelta
+
+from app.models.booking import Booking
+from app.utils.availability import AvailabilityIndex, overlapping_bookings
+
+
+def _sql_blocked(start, end):
+    return {
+        booking.vehicle_id
+        for booking in Booking.query.all()
+        if overlapping_bookings(booking.vehicle_id, start, end).first() is not None
+    }
+
+
+def test_index_matches_sql_overlap_filter(db, make_vehicle, make_booking):
+    rng = random.Random(7)
+    today = datetime.utcnow().replace(hour=10, minute=0, second=0, microsecond=0)
+    vehicles = [make_vehicle() for _ in range(8)]
+    for _ in range(40):
+        vehicle = rng.choice(vehicles)
+        booking = make_booking(
+            vehicle,
+            start=today + timedelta(days=rng.randint(0, 30), hours=rng.randint(0, 23)),
+            days=rng.randint(1, 5),
+            status=rng.choice(['pending', 'confirmed', 'active', 'cancelled', 'completed']),
+        )
+        if booking.status == 'pending' and rng.random() < 0.5:
+            booking.created_at = datetime.utcnow() - timedelta(minutes=10)
+            db.session.commit()
+
+    index = AvailabilityIndex()
+    for _ in range(50):
+        start = today + timedelta(days=rng.randint(0, 35), hours=rng.randint(0, 23))
+        end = start + timedelta(hours=rng.randint(1, 120))
+        assert set(index.blocked_vehicle_ids(start, end)) == _sql_blocked(start, end)
+
+
+def test_invalidation_reaches_other_processes(db, make_vehicle, make_booking):
+    vehicle = make_vehicle()
+    booking = make_booking(vehicle, status='cancelled')
+    start, end = booking.start_date, booking.end_date
+
+    # Two indexes over the same change feed stand in for two worker processes
+    writer, reader = AvailabilityIndex(), AvailabilityIndex()
+    assert writer.blocked_vehicle_ids(start, end) == []
+    assert reader.blocked_vehicle_ids(start, end) == []
+
+    booking.status = 'confirmed'
+    db.session.commit()
+    writer.invalidate(vehicle.id)
+
+    assert reader.blocked_vehicle_ids(start, end) == [vehicle.id]
+
+
+def test_multiple_workers_without_shared_feed_use_sql(app, db, make_vehicle, make_booking):
+    booking = make_booking(make_vehicle(), status='confirmed')
+    feed = app.extensions['change_feed']
+    app.config['WEB_WORKERS'] = 2
+    app.extensions['change_feed'] = None
+    try:
+        assert AvailabilityIndex().blocked_vehicle_ids(booking.start_date, booking.end_date) is None
+    finally:
+        app.config['WEB_WORKERS'] = 1
+        app.extensions['change_feed'] = feed
+
+
+def _without_shared_feed(app, monkeypatch):
+    monkeypatch.setitem(app.extensions, 'change_feed', None)
+    monkeypatch.setitem(app.config, 'WEB_WORKERS', 1)
+
+
+def test_invalidation_during_rebuild_is_kept(app, db, make_vehicle, make_booking, monkeypatch):
+    _without_shared_feed(app, monkeypatch)
+    vehicle = make_vehicle()
+    first = make_booking(vehicle, status='cancelled')
+    late = make_booking(vehicle, start=first.end_date + timedelta(days=3), status='cancelled')
+    index = AvailabilityIndex()
+    assert index.blocked_vehicle_ids(first.start_date, first.end_date) == []
+
+    first.status = 'confirmed'
+    db.session.commit()
+    index.invalidate(vehicle.id)
+
+    load = AvailabilityIndex._load
+
+    def load_then_book(query):
+        loaded = load(query)
+        # Committed after the reload read the table, so missing from its result
+        late.status = 'confirmed'
+        db.session.commit()
+        index.invalidate(vehicle.id)
+        return loaded
+
+    monkeypatch.setattr(index, '_load', load_then_book)
+    assert index.blocked_vehicle_ids(first.start_date, first.end_date) == [vehicle.id]
+    monkeypatch.setattr(index, '_load', load)
+    assert index.blocked_vehicle_ids(late.start_date, late.end_date) == [vehicle.id]
+
+
+def test_full_invalidation_during_rebuild_is_kept(app, db, make_vehicle, make_booking, monkeypatch):
+    _without_shared_feed(app, monkeypatch)
+    booking = make_booking(make_vehicle(), status='cancelled')
+    index = AvailabilityIndex()
+    load = AvailabilityIndex._load
+
+    def load_then_book(query):
+        loaded = load(query)
+        booking.status = 'confirmed'
+        db.session.commit()
+        index.invalidate()
+        return loaded
+
+    monkeypatch.setattr(index, '_load', load_then_book)
+    assert index.blocked_vehicle_ids(booking.start_date, booking.end_date) == []
+    monkeypatch.setattr(index, '_load', load)
+    assert index.blocked_vehicle_ids(booking.start_date, booking.end_date) == [booking.vehicle_id]
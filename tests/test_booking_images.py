@@ -0,0 +1,34 @@
+import json
+
+import pytest
+
+from app.models.vehicle import VehicleImage
+
+
+def _add_images(db, vehicle, *images):
+    rows = [VehicleImage(vehicle_id=vehicle.id, image_url=url, is_primary=primary) for url, primary in images]
+    db.session.add_all(rows)
+    # Listings cache the first image when none is primary; bookings must not pick that up
+    vehicle.refresh_primary_image(rows)
+    db.session.commit()
+
+
+@pytest.mark.parametrize('images, expected', [
+    ([('/img/side.jpg', False)], None),
+    ([('/img/side.jpg', False), ('/img/front.jpg', True)], '/img/front.jpg'),
+])
+def test_booking_image_is_the_primary_one_only(client, db, auth_headers, make_vehicle, make_booking,
+                                               images, expected):
+    vehicle = make_vehicle()
+    _add_images(db, vehicle, *images)
+    booking = make_booking(vehicle)
+    headers = auth_headers(booking.customer_id)
+
+    listed = client.get('/api/bookings', headers=headers).get_json()['bookings']
+    assert [item['vehicleImage'] for item in listed] == [expected]
+
+    detail = client.get(f'/api/bookings/{booking.id}', headers=headers).get_json()['booking']
+    assert detail['vehicleImage'] == expected
+
+    streamed = client.get('/api/bookings?stream=1', headers=headers).get_data(as_text=True)
+    assert [json.loads(line)['vehicleImage'] for line in streamed.splitlines() if line] == [expected]
@@ -0,0 +1,24 @@
+import json
+
+from app.models.user import Profile
+
+
+def _stream(client, headers, **params):
+    response = client.get('/api/bookings', query_string=dict(params, stream=1), headers=headers)
+    assert response.status_code == 200
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines() if line]
+
+
+def test_stream_yields_each_booking_once_with_the_customer_profile(client, db, auth_headers, make_user,
+                                                                   make_vehicle, make_booking):
+    vehicle = make_vehicle()
+    customer = make_user()
+    db.session.add(Profile(user_id=customer.id, full_name='Asha Rao', phone='9000000000'))
+    db.session.commit()
+    bookings = [make_booking(vehicle, customer=customer, days=days) for days in (1, 2, 3)]
+
+    items = _stream(client, auth_headers(vehicle.owner_id))
+    assert sorted(item['id'] for item in items) == sorted(b.id for b in bookings)
+    assert {item['customer']['name'] for item in items} == {'Asha Rao'}
+
+    assert len(_stream(client, auth_headers(customer.id), limit=2)) == 2
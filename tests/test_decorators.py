@@ -0,0 +1,60 @@
+import pytest
+from flask_jwt_extended import create_access_token
+
+from app.models.user import UserRoleModel
+
+ADMIN_ONLY = '/api/health/http'
+AGENCY_ONLY = '/api/agency-kyc/me'
+
+
+def _headers(user_id, role=None):
+    claims = {'role': role} if role else None
+    return {'Authorization': f'Bearer {create_access_token(identity=user_id, additional_claims=claims)}'}
+
+
+def _status(client, path, user, claim=None):
+    return client.get(path, headers=_headers(user.id, claim)).status_code
+
+
+@pytest.fixture
+def user_with_role(db, make_user):
+    def make(role):
+        user = make_user()
+        if role:
+            db.session.add(UserRoleModel(user_id=user.id, role=role))
+            db.session.commit()
+        return user
+    return make
+
+
+# An agency user without an agency row gets 404 from the view, past the decorator
+@pytest.mark.parametrize('path, role, status', [
+    (ADMIN_ONLY, 'admin', 200),
+    (ADMIN_ONLY, 'agency', 403),
+    (ADMIN_ONLY, 'customer', 403),
+    (AGENCY_ONLY, 'agency', 404),
+    (AGENCY_ONLY, 'admin', 404),
+    (AGENCY_ONLY, 'customer', 403),
+])
+def test_role_claim_decides(client, user_with_role, path, role, status):
+    # The claim wins over the role row
+    other = 'customer' if role != 'customer' else 'admin'
+    assert _status(client, path, user_with_role(other), claim=role) == status
+
+
+@pytest.mark.parametrize('path, role, status', [
+    (ADMIN_ONLY, 'admin', 200),
+    (ADMIN_ONLY, 'agency', 403),
+    (ADMIN_ONLY, None, 403),
+    (AGENCY_ONLY, 'agency', 404),
+    (AGENCY_ONLY, 'admin', 404),
+    (AGENCY_ONLY, 'customer', 403),
+    (AGENCY_ONLY, None, 403),
+])
+def test_tokens_without_a_claim_use_the_role_row(client, user_with_role, path, role, status):
+    assert _status(client, path, user_with_role(role)) == status
+
+
+@pytest.mark.parametrize('path', [ADMIN_ONLY, AGENCY_ONLY])
+def test_missing_token_is_401(client, db, path):
+    assert client.get(path).status_code == 401
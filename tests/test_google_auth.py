@@ -0,0 +1,103 @@
+import time
+
+import jwt
+import pytest
+from cryptography.hazmat.primitives.asymmetric import rsa
+from jwt.algorithms import RSAAlgorithm
+
+from app.utils import google_auth
+from app.utils.google_auth import GoogleTokenError, key_cache, verify_google_id_token
+
+CLIENT_ID = 'client-1.apps.googleusercontent.com'
+
+
+def _key():
+    return rsa.generate_private_key(public_exponent=65537, key_size=2048)
+
+
+def _jwks(keys):
+    jwks = []
+    for kid, private_key in keys.items():
+        jwk = RSAAlgorithm.to_jwk(private_key.public_key(), as_dict=True)
+        jwk.update(kid=kid, alg='RS256', use='sig')
+        jwks.append(jwk)
+    return {'keys': jwks}
+
+
+def _token(private_key, kid, **overrides):
+    now = int(time.time())
+    claims = {
+        'iss': 'https://accounts.google.com', 'aud': CLIENT_ID, 'sub': '1234',
+        'email': 'rider@example.com', 'email_verified': True, 'iat': now, 'exp': now + 3600,
+    }
+    claims.update(overrides)
+    return jwt.encode(claims, private_key, algorithm='RS256', headers={'kid': kid})
+
+
+@pytest.fixture
+def google(app, fake_service, monkeypatch):
+    """A local key server publishing ``keys`` (kid -> private key) as Google's certs."""
+    monkeypatch.setitem(app.config, 'GOOGLE_CERTS_URL', f'{fake_service.url}/oauth2/v3/certs')
+    monkeypatch.setitem(app.config, 'GOOGLE_CLIENT_IDS', CLIENT_ID)
+    monkeypatch.setitem(app.config, 'GOOGLE_TOKEN_VERIFICATION', 'local')
+    key_cache.clear()
+    fake_service.keys = {'k1': _key()}
+
+    def publish(max_age=3600):
+        fake_service.default = (200, _jwks(fake_service.keys), {'Cache-Control': f'public, max-age={max_age}'})
+
+    fake_service.publish = publish
+    publish()
+    yield fake_service
+    key_cache.clear()
+
+
+def test_valid_token_is_verified_from_cached_keys(google):
+    claims = verify_google_id_token(_token(google.keys['k1'], 'k1'))
+    assert claims['email'] == 'rider@example.com'
+    verify_google_id_token(_token(google.keys['k1'], 'k1', sub='5678'))
+    assert len(google.requests) == 1
+
+
+@pytest.mark.parametrize('claims, message', [
+    ({'aud': 'someone-else.apps.googleusercontent.com'}, 'another client'),
+    ({'iss': 'https://evil.example.com'}, 'not issued by Google'),
+    ({'exp': int(time.time()) - 3600, 'iat': int(time.time()) - 7200}, 'expired'),
+])
+def test_bad_claims_are_rejected(google, claims, message):
+    with pytest.raises(GoogleTokenError, match=message):
+        verify_google_id_token(_token(google.keys['k1'], 'k1', **claims))
+
+
+def test_token_signed_by_another_key_is_rejected(google):
+    with pytest.raises(GoogleTokenError):
+        verify_google_id_token(_token(_key(), 'k1'))
+
+
+def test_unknown_kid_refreshes_at_most_once_per_interval(google):
+    verify_google_id_token(_token(google.keys['k1'], 'k1'))
+    forged = _key()
+    for _ in range(3):
+        with pytest.raises(GoogleTokenError, match='Unknown signing key'):
+            verify_google_id_token(_token(forged, 'forged'))
+    assert len(google.requests) == 1
+
+
+def test_rotated_key_is_picked_up(google, monkeypatch):
+    verify_google_id_token(_token(google.keys['k1'], 'k1'))
+    google.keys = {'k2': _key()}
+    google.publish()
+    monkeypatch.setattr(google_auth, 'KEY_REFRESH_MIN_INTERVAL', 0)
+
+    assert verify_google_id_token(_token(google.keys['k2'], 'k2'))['sub'] == '1234'
+    assert len(google.requests) == 2
+    # k1 is gone from the refreshed set
+    with pytest.raises(GoogleTokenError):
+        verify_google_id_token(_token(_key(), 'k1'))
+
+
+def test_expired_key_set_is_fetched_again(google):
+    google.publish(max_age=0)
+    verify_google_id_token(_token(google.keys['k1'], 'k1'))
+    verify_google_id_token(_token(google.keys['k1'], 'k1'))
+    assert len(google.requests) == 2
@@ -0,0 +1,60 @@
+import pytest
+import requests
+
+from app.models.user import UserRoleModel
+from app.utils.http_client import CircuitOpenError, ServiceClient
+
+
+def _client():
+    return ServiceClient('test', connect_timeout=1, read_timeout=1, max_retries=0, pool_maxsize=1,
+                         budget_ratio=0.2, failure_threshold=1, reset_seconds=0)
+
+
+def _raise(exc):
+    def request(*args, **kwargs):
+        raise exc
+    return request
+
+
+@pytest.mark.parametrize('exc, opens', [
+    (requests.exceptions.ChunkedEncodingError('truncated'), True),
+    (ValueError('bad arguments'), False),
+    (KeyboardInterrupt(), False),
+])
+def test_half_open_probe_is_released_on_any_exception(fake_service, monkeypatch, exc, opens):
+    client = _client()
+    client.breaker.record_failure()
+    assert client.breaker.state == 'half_open'
+
+    monkeypatch.setattr(client.session, 'request', _raise(exc))
+    with pytest.raises(type(exc)):
+        client.get(fake_service.url)
+    monkeypatch.undo()
+
+    # The next call is let through as a new probe instead of failing fast forever
+    assert client.get(fake_service.url).status_code == 200
+    assert client.breaker.state == 'closed'
+    assert len(fake_service.requests) == 1
+
+
+def test_open_circuit_fails_fast(fake_service):
+    client = ServiceClient('test', connect_timeout=1, read_timeout=1, max_retries=0, pool_maxsize=1,
+                           budget_ratio=0.2, failure_threshold=1, reset_seconds=60)
+    fake_service.reply(503)
+    client.get(fake_service.url)
+    with pytest.raises(CircuitOpenError):
+        client.get(fake_service.url)
+    assert len(fake_service.requests) == 1
+
+
+def test_http_stats_are_admin_only(client, db, make_user, auth_headers):
+    assert client.get('/api/health/http').status_code == 401
+
+    customer = make_user()
+    db.session.add(UserRoleModel(user_id=customer.id, role='customer'))
+    admin = make_user()
+    db.session.add(UserRoleModel(user_id=admin.id, role='admin'))
+    db.session.commit()
+
+    assert client.get('/api/health/http', headers=auth_headers(customer.id)).status_code == 403
+    assert client.get('/api/health/http', headers=auth_headers(admin.id)).status_code == 200
@@ -0,0 +1,168 @@
+import io
+import json
+
+import pytest
+
+from app.models.image_variant import ImageVariant
+from app.models.vehicle import VehicleImage
+from app.utils import image_variants
+from app.utils.image_variants import enqueue_image_variants, process_image_variants
+from app.utils.storage import file_storage
+
+PIL = pytest.importorskip('PIL.Image')
+
+
+@pytest.fixture(autouse=True)
+def webp_only(app, monkeypatch):
+    # AVIF encoding is slow and optional in Pillow builds; one test opts back in
+    monkeypatch.setitem(app.config, 'IMAGE_VARIANT_FORMATS', 'webp')
+
+
+def _stored_photo(width=2000, height=1000, fmt='JPEG', ext='jpg'):
+    buf = io.BytesIO()
+    PIL.new('RGB', (width, height), (200, 40, 40)).save(buf, format=fmt)
+    buf.seek(0)
+    return file_storage.put('vehicles/owner-1', buf, ext, f'image/{ext}')
+
+
+def _variant_size(url):
+    data = file_storage.backend.read(file_storage.backend.key_for_url(url))
+    with PIL.open(io.BytesIO(data)) as image:
+        return image.format, image.size
+
+
+def _row(url):
+    return ImageVariant.query.filter_by(source_url=url).one()
+
+
+def test_variants_are_rendered_and_stored(db):
+    url = _stored_photo()
+    assert enqueue_image_variants([url, url]) == 1
+    assert enqueue_image_variants([url]) == 0
+    assert process_image_variants() == 1
+
+    row = _row(url)
+    assert (row.status, row.attempts, row.last_error) == ('ready', 1, None)
+    variants = json.loads(row.variants)
+    assert set(variants) == {'thumb', 'card', 'full'}
+    assert _variant_size(variants['thumb']['webp']) == ('WEBP', (320, 160))
+    assert _variant_size(variants['card']['webp']) == ('WEBP', (640, 320))
+    assert _variant_size(variants['full']['webp']) == ('WEBP', (1600, 800))
+    assert variants['card']['webp'].startswith('/uploads/vehicles/owner-1/variants/card/')
+
+
+def test_small_originals_are_not_upscaled(db):
+    url = _stored_photo(500, 250, fmt='PNG', ext='png')
+    enqueue_image_variants([url])
+    process_image_variants()
+
+    variants = json.loads(_row(url).variants)
+    assert _variant_size(variants['thumb']['webp'])[1] == (320, 160)
+    assert _variant_size(variants['card']['webp'])[1] == (500, 250)
+    assert _variant_size(variants['full']['webp'])[1] == (500, 250)
+
+
+def test_avif_is_rendered_when_pillow_supports_it(app, db, monkeypatch):
+    if not image_variants.features.check('avif'):
+        pytest.skip('Pillow was built without AVIF')
+    monkeypatch.setitem(app.config, 'IMAGE_VARIANT_FORMATS', 'webp,avif')
+    monkeypatch.setitem(app.config, 'IMAGE_VARIANT_SIZES', 'thumb:320')
+    url = _stored_photo(800, 400)
+    enqueue_image_variants([url])
+    process_image_variants()
+
+    variants = json.loads(_row(url).variants)
+    assert set(variants['thumb']) == {'webp', 'avif'}
+    assert _variant_size(variants['thumb']['avif'])[1] == (320, 160)
+
+
+def test_only_stored_images_are_queued(db):
+    pdf = file_storage.put('kyc/owner-1', io.BytesIO(b'%PDF-1.4'), 'pdf', 'application/pdf')
+    assert enqueue_image_variants(['https://cdn.example/photo.jpg', pdf, None, '']) == 0
+    assert ImageVariant.query.count() == 0
+
+
+def test_listing_picks_the_card_variant_and_thumb_logo(client, db, make_vehicle):
+    photo, logo = _stored_photo(), _stored_photo(400, 400, fmt='PNG', ext='png')
+    vehicle = make_vehicle(primary_image_url=photo, agency_logo_url=logo, agency_name='Test Agency')
+
+    card = client.get('/api/vehicles').get_json()['vehicles'][0]
+    assert card['imageUrl'].endswith(photo)
+    assert card['agencyLogo'].endswith(logo)
+    assert card['imageVariants'] is None
+
+    enqueue_image_variants([photo, logo])
+    process_image_variants()
+    variants = image_variants.variant_urls([photo, logo])
+
+    card = client.get('/api/vehicles').get_json()['vehicles'][0]
+    assert card['id'] == vehicle.id
+    assert card['imageUrl'].endswith(variants[photo]['card']['webp'])
+    assert card['agencyLogo'].endswith(variants[logo]['thumb']['webp'])
+    assert card['imageVariants']['full']['webp'].endswith(variants[photo]['full']['webp'])
+
+
+def test_ready_variants_reach_a_cached_vehicle_detail(client, db, make_vehicle):
+    photo = _stored_photo()
+    vehicle = make_vehicle(primary_image_url=photo)
+    db.session.add(VehicleImage(vehicle_id=vehicle.id, image_url=photo, is_primary=True))
+    db.session.commit()
+    assert client.get(f'/api/vehicles/{vehicle.id}').get_json()['vehicle']['images'][0]['imageVariants'] is None
+
+    enqueue_image_variants([photo])
+    process_image_variants()
+
+    image = client.get(f'/api/vehicles/{vehicle.id}').get_json()['vehicle']['images'][0]
+    assert set(image['imageVariants']) == {'thumb', 'card', 'full'}
+
+
+def test_render_failure_keeps_the_original_and_retries(app, client, db, make_vehicle, monkeypatch):
+    photo = _stored_photo()
+    make_vehicle(primary_image_url=photo)
+    monkeypatch.setitem(app.config, 'IMAGE_VARIANT_RETRY_SECONDS', 0)
+
+    def broken(*args):
+        raise OSError('encoder crashed')
+    monkeypatch.setattr(image_variants, 'render_variants', broken)
+    enqueue_image_variants([photo])
+
+    process_image_variants()
+    row = _row(photo)
+    assert (row.status, row.attempts) == ('pending', 1)
+    assert 'encoder crashed' in row.last_error
+    assert client.get('/api/vehicles').get_json()['vehicles'][0]['imageUrl'].endswith(photo)
+
+    for _ in range(app.config['IMAGE_VARIANT_MAX_ATTEMPTS'] - 1):
+        process_image_variants()
+    db.session.refresh(row)
+    assert (row.status, row.attempts) == ('failed', app.config['IMAGE_VARIANT_MAX_ATTEMPTS'])
+    assert process_image_variants() == 0
+
+
+def test_undecodable_original_fails_at_once(client, db, make_vehicle):
+    url = file_storage.put('vehicles/owner-1', io.BytesIO(b'\xff\xd8\xff not really a jpeg'), 'jpg', 'image/jpeg')
+    make_vehicle(primary_image_url=url)
+    enqueue_image_variants([url])
+    process_image_variants()
+
+    row = _row(url)
+    assert (row.status, row.attempts) == ('failed', 1)
+    assert client.get('/api/vehicles').get_json()['vehicles'][0]['imageUrl'].endswith(url)
+
+
+def test_missing_original_keeps_the_url_and_retries(client, db, make_vehicle):
+    url = _stored_photo()
+    file_storage.backend.delete(file_storage.backend.key_for_url(url))
+    make_vehicle(primary_image_url=url)
+    enqueue_image_variants([url])
+    process_image_variants()
+
+    row = _row(url)
+    assert (row.status, row.attempts) == ('pending', 1)
+    assert row.last_error.startswith('Could not read original')
+    assert client.get('/api/vehicles').get_json()['vehicles'][0]['imageUrl'].endswith(url)
+
+
+def test_nothing_is_queued_without_pillow(db, monkeypatch):
+    monkeypatch.setattr(image_variants, 'pil_available', False)
+    assert enqueue_image_variants([_stored_photo()]) == 0
@@ -0,0 +1,51 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import inspect, text
+
+from app.models.booking import Booking
+from app.models.vehicle import Vehicle
+from app.utils.availability import overlapping_bookings
+from app.utils.schema import HOT_QUERY_INDEXES, ensure_schema_consistency
+
+
+def _plan(db, query):
+    sql = str(query.statement.compile(db.engine, compile_kwargs={'literal_binds': True}))
+    if db.engine.dialect.name == 'sqlite':
+        return ' '.join(row[-1] for row in db.session.execute(text(f'EXPLAIN QUERY PLAN {sql}')))
+    return ' '.join(str(row._mapping.get('key')) for row in db.session.execute(text(f'EXPLAIN {sql}')))
+
+
+def test_schema_consistency_creates_missing_hot_query_indexes(db):
+    for table in (Booking.__table__, Vehicle.__table__):
+        for index in table.indexes:
+            if index.name in HOT_QUERY_INDEXES[table.name]:
+                index.drop(bind=db.engine)
+
+    ensure_schema_consistency()
+
+    inspector = inspect(db.engine)
+    for table, indexes in HOT_QUERY_INDEXES.items():
+        present = {index['name'] for index in inspector.get_indexes(table)}
+        assert set(indexes) <= present
+    # A second run finds everything in place
+    ensure_schema_consistency()
+
+
+@pytest.mark.parametrize('build_query, index', [
+    (lambda: overlapping_bookings('v1', datetime(2026, 5, 1), datetime(2026, 5, 3)),
+     'ix_bookings_vehicle_dates_status'),
+    (lambda: Booking.query.filter_by(customer_id='c1').order_by(Booking.start_date.desc()),
+     'ix_bookings_customer_start'),
+    (lambda: Booking.query.filter(Booking.agency_id == 'a1', Booking.payment_status == 'completed',
+                                  Booking.start_date >= datetime(2026, 1, 1)),
+     'ix_bookings_agency_payment_start'),
+    (lambda: Vehicle.query.filter_by(is_available=True).order_by(Vehicle.created_at.desc()),
+     'ix_vehicles_available_created'),
+])
+def test_hot_queries_use_their_index(db, make_vehicle, make_booking, build_query, index):
+    vehicle = make_vehicle()
+    start = datetime(2026, 5, 1)
+    for n in range(20):
+        make_booking(vehicle, start=start + timedelta(days=3 * n))
+    assert index in _plan(db, build_query())
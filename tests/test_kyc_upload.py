@@ -0,0 +1,34 @@
+import io
+import logging
+
+PNG = b'\x89PNG\r\n\x1a\n' + b'\x00' * 64
+
+
+def _upload(client, headers, doc_type):
+    return client.post('/api/kyc/upload', headers=headers, content_type='multipart/form-data', data={
+        'docType': doc_type, 'file': (io.BytesIO(PNG + doc_type.encode()), f'{doc_type}.png'),
+    })
+
+
+def test_upload_reports_progress_without_document_urls(client, db, make_user, auth_headers, capsys, caplog):
+    headers = auth_headers(make_user().id)
+    caplog.set_level(logging.DEBUG)
+
+    progress = []
+    for doc_type in ('aadhaar', 'dl', 'selfie'):
+        response = _upload(client, headers, doc_type)
+        assert response.status_code == 200
+        body = response.get_json()
+        assert 'debug' not in body
+        assert body['documentUrl'].startswith('/uploads/kyc/')
+        progress.append((body['progress'], body['documentsUploaded']))
+
+    assert progress == [
+        ({'aadhaar': True, 'dl': False, 'selfie': False}, False),
+        ({'aadhaar': True, 'dl': True, 'selfie': False}, False),
+        ({'aadhaar': True, 'dl': True, 'selfie': True}, True),
+    ]
+    # Document URLs stay out of stdout and the log
+    assert 'kyc/' not in capsys.readouterr().out
+    assert 'kyc/' not in caplog.text
+    assert 'stored selfie' in caplog.text
@@ -0,0 +1,78 @@
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.models.outbox import OutboxEmail
+from app.utils.mail import send_otp_email
+from app.utils.mail_queue import process_outbox
+
+
+@pytest.fixture
+def zeptomail(app, db, fake_service, monkeypatch):
+    monkeypatch.setitem(app.config, 'ZEPTOMAIL_API_URL', f'{fake_service.url}/v1.1/email')
+    monkeypatch.setitem(app.config, 'ZEPTOMAIL_API_KEY', 'Zoho-enczapikey test-key')
+    return fake_service
+
+
+def _only_message():
+    db_messages = OutboxEmail.query.all()
+    assert len(db_messages) == 1
+    return db_messages[0]
+
+
+def test_queued_mail_is_posted_to_zeptomail(zeptomail):
+    assert send_otp_email('rider@example.com', '123456')
+    assert zeptomail.requests == []
+
+    assert process_outbox() == 1
+    request = zeptomail.requests[0]
+    assert request['path'] == '/v1.1/email'
+    assert request['headers']['Authorization'] == 'Zoho-enczapikey test-key'
+    body = json.loads(request['body'])
+    assert body['to'][0]['email_address']['address'] == 'rider@example.com'
+    assert '123456' in body['htmlbody']
+    message = _only_message()
+    assert (message.status, message.attempts) == ('sent', 1)
+
+
+def test_server_errors_are_retried_and_client_errors_dead_letter(zeptomail):
+    zeptomail.reply(503, {'error': 'busy'})
+    send_otp_email('rider@example.com', '123456')
+    process_outbox()
+    message = _only_message()
+    assert (message.status, message.attempts) == ('pending', 1)
+    assert message.next_attempt_at > datetime.utcnow()
+
+    zeptomail.reply(422, {'error': 'bad address'})
+    message.next_attempt_at = datetime.utcnow()
+    OutboxEmail.query.session.commit()
+    process_outbox()
+    message = _only_message()
+    assert (message.status, message.attempts) == ('dead', 2)
+    assert message.last_error.startswith('422')
+
+
+def test_crashed_deliveries_count_as_attempts(zeptomail, app):
+    send_otp_email('rider@example.com', '123456')
+    message = _only_message()
+    message.max_attempts = 3
+    stale = datetime.utcnow() - timedelta(seconds=app.config['MAIL_LOCK_TIMEOUT_SECONDS'] + 1)
+
+    # A crash counts as attempt 1; the message is claimed again at once and fails attempt 2
+    zeptomail.reply(503)
+    message.status, message.locked_at = 'sending', stale
+    OutboxEmail.query.session.commit()
+    assert process_outbox() == 1
+    message = _only_message()
+    assert (message.status, message.attempts) == ('pending', 2)
+
+    # Crashing on the last attempt dead-letters it without calling the provider again
+    message.status, message.locked_at = 'sending', stale
+    OutboxEmail.query.session.commit()
+    calls = len(zeptomail.requests)
+    assert process_outbox() == 0
+    message = _only_message()
+    assert (message.status, message.attempts) == ('dead', 3)
+    assert message.last_error == 'Worker stopped during delivery'
+    assert len(zeptomail.requests) == calls
@@ -0,0 +1,82 @@
+import random
+
+import pytest
+
+from app.utils.geo import haversine_km
+
+CENTER = (12.9716, 77.5946)
+KM_PER_DEGREE_LAT = 111.195
+
+
+def _place(db, vehicle, lat, lng):
+    vehicle.latitude, vehicle.longitude = lat, lng
+    vehicle.refresh_geohash()
+    db.session.commit()
+    return vehicle
+
+
+def _north_of_center(db, make_vehicle, km, **fields):
+    return _place(db, make_vehicle(**fields), CENTER[0] + km / KM_PER_DEGREE_LAT, CENTER[1])
+
+
+def _near(client, radius_km=10, **params):
+    params = dict(near=f'{CENTER[0]},{CENTER[1]}', radius_km=radius_km, **params)
+    return client.get('/api/vehicles', query_string=params)
+
+
+def test_results_are_nearest_first_within_the_radius(client, db, make_vehicle):
+    far = _north_of_center(db, make_vehicle, 5)
+    near = _north_of_center(db, make_vehicle, 0.5)
+    middle = _north_of_center(db, make_vehicle, 2)
+    _north_of_center(db, make_vehicle, 10.5)
+    make_vehicle()  # no coordinates
+
+    body = _near(client).get_json()
+    assert [v['id'] for v in body['vehicles']] == [near.id, middle.id, far.id]
+    assert [v['distanceKm'] for v in body['vehicles']] == [0.5, 2.0, 5.0]
+    assert body['pagination']['total'] == 3
+
+    assert [v['id'] for v in _near(client, radius_km=3).get_json()['vehicles']] == [near.id, middle.id]
+
+
+def test_pages_follow_distance_order(client, db, make_vehicle):
+    ids = [_north_of_center(db, make_vehicle, km).id for km in (1, 2, 3, 4, 5)]
+
+    pages = [_near(client, page=page, per_page=2).get_json() for page in (1, 2, 3)]
+    assert [v['id'] for body in pages for v in body['vehicles']] == ids
+    assert pages[0]['pagination'] == {'page': 1, 'per_page': 2, 'total': 5, 'pages': 3}
+
+
+def test_other_filters_apply_before_distance(client, db, make_vehicle):
+    car = _north_of_center(db, make_vehicle, 3, vehicle_type='car', model='Swift')
+    _north_of_center(db, make_vehicle, 1, vehicle_type='bike', model='Activa')
+    _north_of_center(db, make_vehicle, 2, vehicle_type='car', model='Swift', is_available=False)
+
+    assert [v['id'] for v in _near(client, type='car').get_json()['vehicles']] == [car.id]
+    assert [v['id'] for v in _near(client, q='swift').get_json()['vehicles']] == [car.id]
+    assert [v['id'] for v in _near(client, wheelers='4').get_json()['vehicles']] == [car.id]
+
+
+def test_matches_a_full_scan(client, db, make_vehicle):
+    rng = random.Random(3)
+    vehicles = [
+        _place(db, make_vehicle(), CENTER[0] + rng.uniform(-0.3, 0.3), CENTER[1] + rng.uniform(-0.3, 0.3))
+        for _ in range(60)
+    ]
+    for radius_km in (2, 7.5, 20):
+        expected = sorted(
+            (haversine_km(*CENTER, v.latitude, v.longitude), v.id) for v in vehicles
+            if haversine_km(*CENTER, v.latitude, v.longitude) <= radius_km
+        )
+        body = _near(client, radius_km=radius_km, per_page=100).get_json()
+        assert [v['id'] for v in body['vehicles']] == [vehicle_id for _, vehicle_id in expected]
+
+
+@pytest.mark.parametrize('params', [
+    {'page': 0}, {'page': -1}, {'per_page': 0}, {'per_page': -5},
+    {'radius_km': 0}, {'radius_km': 1000}, {'cursor': ''},
+])
+def test_invalid_near_parameters_are_rejected(client, db, make_vehicle, params):
+    _north_of_center(db, make_vehicle, 1)
+    params = dict({'radius_km': 10}, **params)
+    assert _near(client, **params).status_code == 400
@@ -0,0 +1,25 @@
+import pytest
+from werkzeug.security import generate_password_hash
+
+from app.utils.password_hashing import hash_password, needs_rehash, verify_password
+
+
+@pytest.mark.parametrize('configured, stored, expected', [
+    ('pbkdf2', 'pbkdf2', False),
+    ('pbkdf2', 'pbkdf2:sha256:1000', True),
+    ('pbkdf2:sha256:1000', 'pbkdf2:sha256:1000', False),
+    ('scrypt', 'scrypt:32768:8:1', False),
+    ('scrypt:32768:8:1', 'scrypt', False),
+    ('scrypt:16384:8:1', 'scrypt', True),
+    ('scrypt', 'pbkdf2', True),
+])
+def test_needs_rehash_compares_expanded_parameters(app, monkeypatch, configured, stored, expected):
+    monkeypatch.setitem(app.config, 'PASSWORD_HASH_METHOD', configured)
+    assert needs_rehash(generate_password_hash('secret', stored)) is expected
+
+
+def test_new_hashes_do_not_need_rehash(app, monkeypatch):
+    monkeypatch.setitem(app.config, 'PASSWORD_HASH_METHOD', 'pbkdf2')
+    pwhash = hash_password('secret')
+    assert verify_password(pwhash, 'secret')
+    assert not needs_rehash(pwhash)
@@ -0,0 +1,98 @@
+import json
+import threading
+import time
+
+import pytest
+
+from app.models.payment import Payment
+from app.routes import bookings as bookings_routes
+
+
+@pytest.fixture
+def razorpay(fake_service, monkeypatch):
+    """fake_service as the Razorpay orders API, answering every call with one order."""
+    monkeypatch.setattr(bookings_routes, 'RAZORPAY_API_URL', fake_service.url)
+    fake_service.default = (200, {'id': 'order_1', 'amount': 100000, 'currency': 'INR', 'status': 'created',
+                                  'notes': {}}, {})
+    return fake_service
+
+
+@pytest.fixture
+def booking(make_vehicle, make_booking):
+    return make_booking(make_vehicle(), total_amount=1000)
+
+
+def _order(client, headers, booking, **fields):
+    return client.post('/api/bookings/payment/order', json=dict(bookingId=booking.id, **fields), headers=headers)
+
+
+def _order_calls(razorpay):
+    return [r for r in razorpay.requests if r['method'] == 'POST' and r['path'].endswith('/orders')]
+
+
+def test_concurrent_requests_share_one_upstream_order(app, db, auth_headers, razorpay, booking):
+    razorpay.delay = 0.5
+    headers = auth_headers(booking.customer_id)
+    start = threading.Barrier(4)
+    responses = []
+
+    def place():
+        client = app.test_client()
+        start.wait()
+        responses.append(_order(client, headers, booking))
+
+    threads = [threading.Thread(target=place) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert [r.status_code for r in responses] == [200] * 4
+    assert {r.get_json()['order']['id'] for r in responses} == {'order_1'}
+    assert len(_order_calls(razorpay)) == 1
+    payment = Payment.query.filter_by(booking_id=booking.id).one()
+    assert (payment.razorpay_order_id, payment.status) == ('order_1', 'created')
+    assert json.loads(_order_calls(razorpay)[0]['body'])['amount'] == 100000
+
+
+def test_unexpired_order_is_reused(client, db, auth_headers, razorpay, booking):
+    headers = auth_headers(booking.customer_id)
+    first = _order(client, headers, booking)
+    second = _order(client, headers, booking)
+
+    assert first.status_code == second.status_code == 200
+    assert second.get_json()['order'] == first.get_json()['order']
+    assert len(_order_calls(razorpay)) == 1
+    assert Payment.query.filter_by(booking_id=booking.id).count() == 1
+
+
+def test_same_key_with_another_amount_conflicts(client, db, auth_headers, razorpay, booking):
+    headers = dict(auth_headers(booking.customer_id), **{'Idempotency-Key': 'checkout-1'})
+    assert _order(client, headers, booking, amountPaise=100000).status_code == 200
+
+    response = _order(client, headers, booking, amountPaise=90000)
+    assert response.status_code == 409
+    assert 'different payment order' in response.get_json()['error']
+    assert len(_order_calls(razorpay)) == 1
+
+
+def test_order_created_after_timeout_is_recorded(app, client, db, auth_headers, razorpay, booking, monkeypatch):
+    monkeypatch.setitem(app.config, 'RAZORPAY_ORDER_TIMEOUT_SECONDS', 0.1)
+    razorpay.default = (200, {'id': 'order_late', 'currency': 'INR', 'status': 'created', 'notes': {}}, {})
+    razorpay.delay = 0.5
+
+    response = _order(client, auth_headers(booking.customer_id), booking)
+    assert response.status_code == 500
+    payment = Payment.query.filter_by(booking_id=booking.id).one()
+    assert payment.status == 'failed'
+
+    deadline = time.monotonic() + 5
+    while time.monotonic() < deadline:
+        db.session.rollback()
+        if db.session.get(Payment, payment.id).razorpay_order_id:
+            break
+        time.sleep(0.05)
+    payment = db.session.get(Payment, payment.id)
+    assert payment.razorpay_order_id == 'order_late'
+    assert payment.status == 'expired'
+    assert payment.idempotency_key is None
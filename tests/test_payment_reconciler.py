@@ -0,0 +1,73 @@
+import json
+from datetime import datetime, timedelta
+
+from app.models.payment import Payment
+from app.utils import payment_reconciler
+from app.utils.payment_reconciler import process_webhook_events, record_webhook_event, sweep_stale_payments
+
+
+def _order(db, booking, order_id):
+    payment = Payment(booking_id=booking.id, razorpay_order_id=order_id, amount=100000, status='created')
+    db.session.add(payment)
+    db.session.commit()
+    return payment
+
+
+def _deliver(event_id, event, order_id):
+    payload = {'event': event, 'payload': {'payment': {'entity': {'id': f'pay_{event_id}', 'order_id': order_id}}}}
+    assert record_webhook_event(event_id, event, json.dumps(payload))
+    while process_webhook_events():
+        pass
+
+
+def test_capture_after_failure_confirms_when_slot_is_free(db, make_vehicle, make_booking):
+    vehicle = make_vehicle()
+    booking = make_booking(vehicle)
+    payment = _order(db, booking, 'order_free')
+
+    _deliver('evt_1', 'payment.failed', 'order_free')
+    assert booking.status == 'cancelled'
+
+    _deliver('evt_2', 'payment.captured', 'order_free')
+    assert booking.status == 'confirmed'
+    assert booking.payment_status == 'completed'
+    assert payment.status == 'paid'
+
+
+def test_capture_after_failure_does_not_double_book(db, make_vehicle, make_booking):
+    vehicle = make_vehicle()
+    first = make_booking(vehicle)
+    payment = _order(db, first, 'order_late')
+
+    _deliver('evt_1', 'payment.failed', 'order_late')
+    assert first.status == 'cancelled'
+
+    # The freed slot is taken by another customer before the late capture arrives
+    second = make_booking(vehicle, start=first.start_date, status='confirmed', payment_status='completed')
+
+    _deliver('evt_2', 'payment.captured', 'order_late')
+    assert first.status == 'cancelled'
+    assert first.payment_status == 'refund_pending'
+    assert payment.status == 'refund_pending'
+    assert second.status == 'confirmed'
+
+    # A redelivered failure must not undo the refund flag
+    _deliver('evt_3', 'payment.failed', 'order_late')
+    assert payment.status == 'refund_pending'
+
+
+def test_sweep_finalizes_expired_order_that_was_paid(db, make_vehicle, make_booking, monkeypatch):
+    booking = make_booking(make_vehicle())
+    payment = _order(db, booking, 'order_orphan')
+    # Stored by the done-callback after its creator timed out
+    payment.status = 'expired'
+    payment.created_at = datetime.utcnow() - timedelta(hours=1)
+    db.session.commit()
+    monkeypatch.setattr(payment_reconciler, '_list_orders',
+                        lambda start, end: {'order_orphan': {'id': 'order_orphan', 'status': 'paid'}})
+    monkeypatch.setattr(payment_reconciler, '_captured_payment',
+                        lambda order_id: {'id': 'pay_orphan', 'status': 'captured'})
+
+    assert sweep_stale_payments() == 1
+    assert payment.status == 'paid'
+    assert booking.payment_status == 'completed'
@@ -0,0 +1,91 @@
+import threading
+
+import pytest
+
+from app.models.user import User
+from app.models.vehicle import VehicleImage
+from app.utils.listing_cache import backfill_vehicle_listing_cache
+from app.utils.query_counter import assert_max_queries, count_queries
+
+
+def _query_count(response):
+    assert response.status_code == 200, response.get_data(as_text=True)
+    return int(response.headers['X-Query-Count'])
+
+
+def test_counters_only_see_their_own_thread(app, db, make_user):
+    make_user()
+    started = threading.Event()
+    finished = threading.Event()
+
+    def other_thread():
+        with app.app_context():
+            started.set()
+            for _ in range(20):
+                User.query.count()
+        finished.set()
+
+    with count_queries() as outer:
+        worker = threading.Thread(target=other_thread)
+        worker.start()
+        started.wait()
+        with count_queries() as inner:
+            User.query.count()
+        finished.wait()
+        worker.join()
+    assert len(inner) == 1
+    assert len(outer) == 1
+    with pytest.raises(AssertionError, match='at most 0 queries, got 1'):
+        with assert_max_queries(0):
+            User.query.count()
+
+
+def _vehicles_with_images(db, make_vehicle, count):
+    vehicles = [make_vehicle() for _ in range(count)]
+    for vehicle in vehicles:
+        db.session.add(VehicleImage(vehicle_id=vehicle.id, image_url=f'/uploads/{vehicle.id}.png', is_primary=True))
+    db.session.commit()
+    return vehicles
+
+
+@pytest.mark.parametrize('path', ['/api/vehicles?per_page=50', '/api/vehicles?per_page=50&cursor='])
+def test_vehicle_listing_query_count_is_flat(client, db, make_vehicle, path):
+    _vehicles_with_images(db, make_vehicle, 2)
+    few = _query_count(client.get(path))
+    _vehicles_with_images(db, make_vehicle, 8)
+    assert _query_count(client.get(path)) == few
+
+
+def test_agency_listing_query_count_is_flat(client, make_vehicle):
+    make_vehicle()
+    few = _query_count(client.get('/api/agencies?per_page=50'))
+    for _ in range(6):
+        make_vehicle()
+    assert _query_count(client.get('/api/agencies?per_page=50')) == few
+
+
+def test_booking_listing_query_count_is_flat(client, make_user, make_vehicle, make_booking, auth_headers):
+    customer = make_user()
+    headers = auth_headers(customer.id)
+    make_booking(make_vehicle(), customer=customer)
+    few = _query_count(client.get('/api/bookings', headers=headers))
+    for _ in range(6):
+        make_booking(make_vehicle(), customer=customer)
+    assert _query_count(client.get('/api/bookings', headers=headers)) == few
+
+
+
+def test_vehicles_without_images_are_not_looked_up_again(client, db, make_user, make_vehicle):
+    owner = make_user()
+    pictured = _vehicles_with_images(db, make_vehicle, 1)[0]
+    bare = make_vehicle(owner=owner)
+    assert backfill_vehicle_listing_cache() == 2
+    assert bare.primary_image_url == ''
+
+    with count_queries() as statements:
+        cards = {v['id']: v['imageUrl'] for v in client.get('/api/vehicles').get_json()['vehicles']}
+        owned = client.get(f'/api/vehicles/owner/{owner.id}').get_json()['vehicles']
+    assert not [sql for sql in statements if 'FROM vehicle_images' in sql]
+    assert cards[pictured.id].endswith(f'/uploads/{pictured.id}.png')
+    assert cards[bare.id] is None
+    assert [v['imageUrl'] for v in owned] == [None]
@@ -0,0 +1,140 @@
+import uuid
+
+import pytest
+
+from app.models import City
+from app.models.user import Profile
+from app.routes import uploads
+from app.utils.response_cache import response_cache
+from app.utils.seed_catalog import seed_catalogs
+from app.utils.seed_cities import seed_cities
+
+
+@pytest.fixture(autouse=True)
+def fresh_cache(app):
+    # The fake backend lives as long as the app, across tests
+    response_cache.backend.clear()
+    response_cache.reset_stats()
+
+
+def _detail(client, vehicle):
+    response = client.get(f'/api/vehicles/{vehicle.id}')
+    assert response.status_code == 200
+    return response
+
+
+def test_etag_answers_if_none_match_with_304(client, db):
+    db.session.add(City(name='Mysuru'))
+    db.session.commit()
+
+    first = client.get('/api/cities')
+    assert first.headers['X-Cache'] == 'MISS'
+    etag = first.headers['ETag']
+
+    second = client.get('/api/cities')
+    assert second.headers['X-Cache'] == 'HIT'
+    assert second.headers['ETag'] == etag
+    assert second.get_data() == first.get_data()
+
+    revalidated = client.get('/api/cities', headers={'If-None-Match': etag})
+    assert revalidated.status_code == 304
+    assert revalidated.get_data() == b''
+    assert revalidated.headers['ETag'] == etag
+
+    stale = client.get('/api/cities', headers={'If-None-Match': '"something-else"'})
+    assert stale.status_code == 200
+
+
+def test_query_strings_are_cached_apart(client, db):
+    db.session.add_all([City(name='Mysuru'), City(name='Mangaluru')])
+    db.session.commit()
+
+    assert len(client.get('/api/cities?q=mys').get_json()['cities']) == 1
+    assert len(client.get('/api/cities').get_json()['cities']) == 2
+    assert client.get('/api/cities?q=mys').headers['X-Cache'] == 'HIT'
+
+
+def test_stats_count_hits_misses_and_304s(client, db):
+    etag = client.get('/api/cities').headers['ETag']
+    client.get('/api/cities')
+    client.get('/api/cities', headers={'If-None-Match': etag})
+    client.get('/api/catalog/brands')
+
+    stats = client.get('/api/health/cache').get_json()
+    assert stats['backend'] == 'fake'
+    assert (stats['hits'], stats['misses'], stats['not_modified']) == (1, 2, 1)
+    assert stats['namespaces']['cities'] == {'hits': 1, 'misses': 1, 'not_modified': 1}
+    assert stats['namespaces']['catalog'] == {'hits': 0, 'misses': 1, 'not_modified': 0}
+
+
+def test_seeders_invalidate_their_namespace(client, db):
+    assert client.get('/api/cities').get_json()['cities'] == []
+    assert client.get('/api/catalog/brands').get_json()['brands'] == []
+
+    seed_cities()
+    seed_catalogs()
+
+    cities = client.get('/api/cities')
+    assert cities.headers['X-Cache'] == 'MISS'
+    assert cities.get_json()['cities']
+    brands = client.get('/api/catalog/brands')
+    assert brands.headers['X-Cache'] == 'MISS'
+    assert brands.get_json()['brands']
+
+
+def test_vehicle_update_drops_only_that_vehicle(client, db, auth_headers, make_vehicle):
+    vehicle, other = make_vehicle(), make_vehicle()
+    _detail(client, vehicle)
+    _detail(client, other)
+
+    response = client.put(f'/api/vehicles/{vehicle.id}', json={'color': 'Teal'},
+                          headers=auth_headers(vehicle.owner_id))
+    assert response.status_code == 200
+
+    updated = _detail(client, vehicle)
+    assert updated.headers['X-Cache'] == 'MISS'
+    assert updated.get_json()['vehicle']['color'] == 'Teal'
+    assert _detail(client, other).headers['X-Cache'] == 'HIT'
+
+
+def test_vehicle_delete_drops_its_detail(client, db, auth_headers, make_vehicle):
+    vehicle = make_vehicle()
+    _detail(client, vehicle)
+
+    client.delete(f'/api/vehicles/{vehicle.id}', headers=auth_headers(vehicle.owner_id))
+    assert client.get(f'/api/vehicles/{vehicle.id}').status_code == 404
+
+
+def test_agency_and_owner_profile_updates_drop_vehicle_details(client, db, auth_headers, make_vehicle):
+    vehicle = make_vehicle()
+    headers = auth_headers(vehicle.owner_id)
+    _detail(client, vehicle)
+
+    assert client.put('/api/agencies/me', json={'agencyName': 'Renamed'}, headers=headers).status_code == 200
+    renamed = _detail(client, vehicle)
+    assert renamed.headers['X-Cache'] == 'MISS'
+    assert renamed.get_json()['vehicle']['agency']['name'] == 'Renamed'
+
+    db.session.add(Profile(user_id=vehicle.owner_id))
+    db.session.commit()
+    assert client.put('/api/users/profile', json={'fullName': 'Ravi K'}, headers=headers).status_code == 200
+    assert _detail(client, vehicle).get_json()['vehicle']['owner']['name'] == 'Ravi K'
+
+
+def test_completed_image_upload_drops_the_vehicle_detail(client, db, auth_headers, make_vehicle, monkeypatch):
+    vehicle = make_vehicle()
+    object_path = f'vehicles/{vehicle.owner_id}/vehicleImage_{uuid.uuid4().hex}.jpg'
+    url = f'https://storage.example/{object_path}'
+    # The bucket check is GCS-only; stand in for an uploaded JPEG
+    monkeypatch.setattr(uploads, '_storage_error', lambda: None)
+    monkeypatch.setattr(uploads, 'get_object_info', lambda path: (1024, 'image/jpeg', b'\xff\xd8\xff\xe0', url))
+    assert _detail(client, vehicle).get_json()['vehicle']['images'] == []
+
+    response = client.post('/api/uploads/complete', headers=auth_headers(vehicle.owner_id), json={
+        'docType': 'vehicleImage', 'objectPath': object_path, 'vehicleId': vehicle.id,
+    })
+    assert response.status_code == 201
+
+    detail = _detail(client, vehicle)
+    assert detail.headers['X-Cache'] == 'MISS'
+    assert [image['imageUrl'] for image in detail.get_json()['vehicle']['images']] == [url]
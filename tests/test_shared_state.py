@@ -0,0 +1,117 @@
+from datetime import datetime, timedelta
+
+import pytest
+from flask import Flask
+
+from app.utils import otp_store, response_cache
+from app.utils.otp_store import MemoryBackend
+
+UNREACHABLE = 'redis://127.0.0.1:1/0'
+
+
+def _app(**config):
+    app = Flask(__name__)
+    app.config.update(config)
+    return app
+
+
+def test_otp_store_redis_refuses_to_fall_back():
+    app = _app(OTP_STORE_BACKEND='redis', OTP_STORE_REDIS_URL=UNREACHABLE)
+    with pytest.raises(RuntimeError, match='OTP_STORE_BACKEND'):
+        otp_store._build_backend(app)
+
+
+def test_response_cache_redis_refuses_to_fall_back():
+    app = _app(RESPONSE_CACHE_BACKEND='redis', RESPONSE_CACHE_REDIS_URL=UNREACHABLE)
+    with pytest.raises(RuntimeError, match='RESPONSE_CACHE_BACKEND'):
+        response_cache._build_backend(app)
+
+
+def test_memory_backends_stay_the_default():
+    app = _app()
+    assert otp_store._build_backend(app).name == 'memory'
+    assert response_cache._build_backend(app).name == 'memory'
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Stand-in for time.monotonic in otp_store; advance it with clock.now += seconds."""
+    class Clock:
+        now = 1000.0
+    clock = Clock()
+    monkeypatch.setattr(otp_store.time, 'monotonic', lambda: clock.now)
+    return clock
+
+
+def test_memory_backend_evicts_expired_entries_on_write(clock):
+    backend = MemoryBackend()
+    backend.set('short', 'a', 5)
+    backend.set('long', 'b', 100)
+    assert backend.incr('attempts', 5) == 1
+
+    clock.now += 6
+    assert backend.get('short') is None
+    # Nobody reads the counter again; the next write still drops it
+    backend.set('other', 'c', 100)
+    assert len(backend) == 2
+    assert backend.incr('attempts', 5) == 1
+    assert backend.get('long') == 'b'
+
+
+def test_memory_backend_overwrite_moves_the_expiry(clock):
+    backend = MemoryBackend()
+    backend.set('key', 'old', 5)
+    backend.set('key', 'new', 100)
+    clock.now += 6
+    backend.set('other', 'x', 100)
+    assert backend.get('key') == 'new'
+
+
+def test_memory_backend_cap_drops_the_oldest_writes(clock):
+    backend = otp_store._build_backend(_app(OTP_STORE_MAX_ENTRIES=3))
+    for key in ('a', 'b', 'c'):
+        backend.set(key, key, 100)
+    # Rewriting 'a' makes it the newest, so 'b' goes first
+    backend.set('a', 'a2', 100)
+    backend.set('d', 'd', 100)
+    backend.set('e', 'e', 100)
+
+    assert len(backend) == 3
+    assert [backend.get(key) for key in 'abcde'] == ['a2', None, None, 'd', 'e']
+
+
+@pytest.fixture
+def otps(app, monkeypatch):
+    # A fresh store per test; the app and its fake backend live for the whole session
+    monkeypatch.setitem(app.extensions, 'otp_store', MemoryBackend())
+    with app.app_context():
+        yield otp_store.otp_store
+
+
+def _verify(client, otp, email='rider@example.com'):
+    return client.post('/api/auth/verify-email-otp', json={'email': email, 'otp': otp})
+
+
+def test_wrong_guesses_lock_the_otp_with_429(app, client, otps):
+    otps.issue('rider@example.com', '123456')
+
+    for _ in range(app.config['OTP_MAX_ATTEMPTS'] - 1):
+        assert _verify(client, '000000').status_code == 400
+    locked = _verify(client, '000000')
+    assert locked.status_code == 429
+    # The code is gone, even the right one no longer works
+    assert 'No OTP found' in _verify(client, '123456').get_json()['error']
+
+    otps.issue('rider@example.com', '654321')
+    assert _verify(client, '000000').status_code == 400
+    assert _verify(client, '654321').status_code == 200
+
+
+def test_expired_otp_is_reported_then_dropped(client, otps):
+    otps.issue('rider@example.com', '123456')
+    # Past OTP_EXPIRY_MINUTES but still inside the grace period the entry is kept for
+    entry = otps.backend.get('code:rider@example.com')
+    otps.backend.set('code:rider@example.com', dict(entry, expires_at=datetime.utcnow() - timedelta(seconds=1)), 60)
+
+    assert 'expired' in _verify(client, '123456').get_json()['error']
+    assert 'No OTP found' in _verify(client, '123456').get_json()['error']
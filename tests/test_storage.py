@@ -0,0 +1,128 @@
+import io
+import os
+
+import pytest
+
+from app.utils.storage import GCSBackend, file_storage
+
+
+@pytest.fixture
+def gcs_backend(app, tmp_path, monkeypatch):
+    backend = GCSBackend('bucket', legacy_root=str(tmp_path))
+    monkeypatch.setattr(backend, 'url', lambda key: backend.url_prefix + key)
+    monkeypatch.setitem(app.extensions, 'file_storage', backend)
+    return backend
+
+
+def test_gcs_serves_unmigrated_files_from_disk(client, gcs_backend, tmp_path):
+    (tmp_path / 'vehicles').mkdir()
+    (tmp_path / 'vehicles' / 'old.png').write_bytes(b'local bytes')
+
+    response = client.get('/uploads/vehicles/old.png')
+    assert response.status_code == 200
+    assert response.data == b'local bytes'
+    response.close()
+
+
+def test_gcs_redirects_temporarily_to_the_bucket(client, gcs_backend):
+    response = client.get('/uploads/vehicles/new.png')
+    assert response.status_code == 302
+    assert response.headers['Location'] == 'https://storage.googleapis.com/bucket/vehicles/new.png'
+
+
+def test_migrate_local_copies_every_file_once(app, tmp_path):
+    (tmp_path / 'agencies').mkdir()
+    (tmp_path / 'agencies' / 'logo.png').write_bytes(b'logo')
+    (tmp_path / 'agencies' / '.upload-partial').write_bytes(b'half')
+    (tmp_path / 'top.pdf').write_bytes(b'%PDF-')
+    backend = file_storage.backend
+    backend.objects.clear()
+
+    assert file_storage.migrate_local(str(tmp_path), batch_size=1) == 2
+    assert backend.objects['agencies/logo.png'] == (b'logo', 'image/png')
+    assert backend.objects['top.pdf'] == (b'%PDF-', 'application/pdf')
+    assert not any(key.endswith('.upload-partial') for key in backend.objects)
+
+    # Already stored keys are not overwritten on a second run
+    backend.write('top.pdf', io.BytesIO(b'newer'), 'application/pdf')
+    file_storage.migrate_local(str(tmp_path))
+    assert backend.read('top.pdf') == b'newer'
+    assert os.path.exists(tmp_path / 'top.pdf')
+
+
+class _FakeBlob:
+    def __init__(self, bucket, name):
+        self.bucket = bucket
+        self.name = name
+        self.public_url = f'https://storage.googleapis.com/bucket/{name}'
+
+    def exists(self):
+        return False
+
+    def upload_from_file(self, stream, size=None, content_type=None, predefined_acl=None):
+        self.bucket.uploads[self.name] = predefined_acl
+
+    def generate_signed_url(self, **kwargs):
+        self.bucket.signed.append((self.name, kwargs))
+        return f'{self.public_url}?signed={len(self.bucket.signed)}'
+
+
+class _FakeBucket:
+    def __init__(self):
+        self.uploads = {}
+        self.signed = []
+
+    def blob(self, name, chunk_size=None):
+        return _FakeBlob(self, name)
+
+
+@pytest.fixture
+def fake_bucket(monkeypatch):
+    from app.utils import gcs
+    bucket = _FakeBucket()
+    monkeypatch.setattr(gcs, 'get_bucket', lambda: bucket)
+    monkeypatch.setattr(gcs, '_signing_kwargs', lambda: {})
+    return bucket
+
+
+def test_kyc_objects_are_uploaded_private(app, fake_bucket):
+    from app.utils import gcs
+    gcs.upload_files([
+        ('kyc/u1/aadhaar/a.png', io.BytesIO(b'a'), 'image/png'),
+        ('vehicles/u1/images/b.png', io.BytesIO(b'b'), 'image/png'),
+    ])
+    assert fake_bucket.uploads == {'kyc/u1/aadhaar/a.png': 'private', 'vehicles/u1/images/b.png': 'publicRead'}
+
+    _, headers, _ = gcs.generate_upload_url('kyc/u1/aadhaar_x.png', 'image/png', 100)
+    assert headers['x-goog-acl'] == 'private'
+    _, headers, _ = gcs.generate_upload_url('vehicles/u1/vehicleImage_x.png', 'image/png', 100)
+    assert headers['x-goog-acl'] == 'public-read'
+
+
+def test_kyc_urls_are_handed_out_signed(app, client, fake_bucket, gcs_backend):
+    public = 'https://storage.googleapis.com/bucket/vehicles/u1/images/b.png'
+    private = 'https://storage.googleapis.com/bucket/kyc/u1/aadhaar/a.png'
+
+    assert file_storage.access_url(public) == public
+    signed = file_storage.access_url(private)
+    assert signed.startswith(private + '?signed=')
+    assert fake_bucket.signed[0][1]['method'] == 'GET'
+    # Reused while more than half its lifetime is left
+    assert file_storage.access_url(private) == signed
+    assert len(fake_bucket.signed) == 1
+
+    assert client.get('/uploads/kyc/u1/aadhaar/a.png').status_code == 404
+
+
+def test_kyc_status_returns_signed_urls(app, client, auth_headers, make_user, fake_bucket, gcs_backend):
+    from app import db
+    from app.models.kyc import KYCVerification
+    user = make_user()
+    db.session.add(KYCVerification(
+        user_id=user.id, aadhaar_document_url='https://storage.googleapis.com/bucket/kyc/u/aadhaar/a.png'
+    ))
+    db.session.commit()
+
+    response = client.get('/api/kyc/status', headers=auth_headers(user.id))
+    assert response.status_code == 200
+    assert '?signed=' in response.get_json()['kyc']['aadhaarDocumentUrl']
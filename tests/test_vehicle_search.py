@@ -0,0 +1,114 @@
+import random
+
+import pytest
+from sqlalchemy import or_
+
+from app.models.catalog import CatalogBrand, CatalogModel
+from app.models.vehicle import Vehicle
+from app.utils.vehicle_search import FIELDS, VehicleSearchIndex
+
+MAKES = ('Honda', 'Hero', 'Royal Enfield', 'TVS', 'Maruti Suzuki', 'Bajaj')
+MODELS = ('Activa 6G', 'Splendor Plus', 'Classic 350', 'Jupiter', 'Swift Dzire', 'Pulsar NS200', 'Apache')
+LOCATIONS = ('Bangalore', 'Koramangala, Bangalore', 'Mysuru', 'HSR Layout', 'Chennai', None)
+
+
+def _built(index):
+    index.match('warm')
+    index.wait()
+    return index
+
+
+def test_first_search_falls_back_to_ilike_until_built(db, make_vehicle):
+    vehicle = make_vehicle(model='Activa')
+    index = VehicleSearchIndex()
+    assert index.match('activa') is None
+    index.wait()
+    assert index.match('activa') == {vehicle.id}
+
+
+def test_update_during_rebuild_is_not_lost(app, db, make_vehicle):
+    vehicle = make_vehicle(model='Activa')
+    index = _built(VehicleSearchIndex())
+
+    # A rebuild is running and has not read the rename (it is not committed yet)
+    index._replay = {}
+    vehicle.model = 'Jupiter'
+    index.update(vehicle)
+    index._rebuild(app)
+
+    assert index.match('jupiter') == {vehicle.id}
+    assert index.match('activa') == set()
+
+
+def test_writes_reach_other_processes(db, make_vehicle):
+    vehicle = make_vehicle(model='Activa')
+    writer, reader = _built(VehicleSearchIndex()), _built(VehicleSearchIndex())
+
+    vehicle.model = 'Jupiter'
+    db.session.commit()
+    writer.update(vehicle)
+
+    assert reader.match('jupiter') == {vehicle.id}
+    assert reader.match('activa') == set()
+
+
+def _ilike_ids(term, fields=FIELDS):
+    like = f'%{term}%'
+    rows = Vehicle.query.filter(or_(*(getattr(Vehicle, field).ilike(like) for field in fields)))
+    return {vehicle.id for vehicle in rows}
+
+
+def test_match_returns_the_ilike_rows(db, make_vehicle):
+    rng = random.Random(3)
+    for _ in range(40):
+        make_vehicle(make=rng.choice(MAKES), model=rng.choice(MODELS), location=rng.choice(LOCATIONS))
+    index = _built(VehicleSearchIndex())
+
+    terms = ['hon', 'HONDA', 'enfield', 'al e', 'ssic 35', 'ns200', 'bangalore', 'gala, b', 'lay', 'pur', 'qqq']
+    for term in terms:
+        assert index.match(term) == _ilike_ids(term), term
+        assert index.match(term, fields=('location',)) == _ilike_ids(term, ('location',)), term
+
+
+@pytest.mark.parametrize('term', ['', 'ac', 'a%v', 'act_va'])
+def test_short_and_wildcard_terms_fall_back_to_ilike(db, make_vehicle, term):
+    make_vehicle(model='Activa')
+    index = _built(VehicleSearchIndex())
+    assert index.match(term) is None
+
+
+def test_broad_terms_fall_back_to_ilike(app, db, make_vehicle, monkeypatch):
+    vehicles = [make_vehicle(model='Activa') for _ in range(3)]
+    index = _built(VehicleSearchIndex())
+    monkeypatch.setitem(app.config, 'VEHICLE_SEARCH_MAX_IDS', 2)
+    assert index.match('activa') is None
+
+    monkeypatch.setitem(app.config, 'VEHICLE_SEARCH_MAX_IDS', 3)
+    assert index.match('activa') == {v.id for v in vehicles}
+
+
+def test_suggest_corrects_a_typo_to_a_catalog_name(db):
+    brand = CatalogBrand(name='Royal Enfield', vehicle_type='bike')
+    brand.models.append(CatalogModel(name='Classic 350'))
+    db.session.add(brand)
+    db.session.commit()
+    index = _built(VehicleSearchIndex())
+
+    assert index.suggest('royal enfeild') == 'Royal Enfield'
+    assert index.suggest('Clasic 350') == 'Classic 350'
+    assert index.suggest('scooty') is None
+    assert index.suggest('ro') is None
+
+
+def test_listing_retries_a_typo_with_the_suggestion(client, db, make_vehicle, monkeypatch):
+    from app.routes import vehicles as vehicles_routes
+
+    db.session.add(CatalogBrand(name='Honda', vehicle_type='bike'))
+    db.session.commit()
+    vehicle = make_vehicle(make='Honda')
+    make_vehicle(make='Bajaj')
+    monkeypatch.setattr(vehicles_routes, 'vehicle_search_index', _built(VehicleSearchIndex()))
+
+    body = client.get('/api/vehicles?q=Hondda').get_json()
+    assert body['correctedQuery'] == 'Honda'
+    assert [v['id'] for v in body['vehicles']] == [vehicle.id]